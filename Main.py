@@ -4,136 +4,468 @@
 # Credits: Threes / 2048 concept inspired by Gabriele Cirulli
 
 # --- Importing Libraries for 2048 Game --- 
+import sys
+import time 
+
+# --- Time to first frame is measured from here --- 
+STARTED = time.perf_counter() 
+
+# python Main.py selfplay|server ... runs headless and never imports tkinter 
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1] in ("selfplay", "server"): 
+    import importlib 
+    sys.exit(importlib.import_module(sys.argv[1]).main(sys.argv[2:])) 
+
 from tkinter import * 
-import random 
+from tkinter import font as tkfont
 import os
-import json 
-import time 
+import random 
+from collections import deque
+
+import boards
+import engine
+import history
+import persistence
+import profiler
+import render
+import replay
+import styles
 
 # --- Creating Animation Class --- 
+# Runs on a monotonic clock and times every frame. The next frame is scheduled 
+# for what is left of the frame budget, and late frames are counted as dropped. 
+# Animations with the same key coalesce: the running one is fast forwarded to 
+# its last frame before the new one starts. 
 class AnimationManager: 
-    def __init__(self, master, fps=60):
+    def __init__(self, master, fps=60, history=600):
         self.master = master 
         self.fps = fps 
         self._tick_delay = max(1, int(1000 / fps)) 
         self.animations = [] 
         self.running = False 
 
-    def add_animation(self, func, duration=200, steps=10, on_complete=None): 
+        self.frame_times = deque(maxlen=history) 
+        self.frames = 0 
+        self.dropped_frames = 0 
+        self.fast_forwarded = 0 
+        self._last_tick = None 
+
+    def add_animation(self, func, duration=200, steps=10, on_complete=None, key=None): 
+        if key is not None: 
+            for anim in [a for a in self.animations if a["key"] == key]: 
+                self.animations.remove(anim) 
+                self._finish(anim) 
 
         anim = {
             "func": func, 
             "duration": max(1, int(duration)), 
-            "start": time.time(), 
-            "on_complete": on_complete
+            "steps": steps, 
+            "start": time.perf_counter(), 
+            "last": None, 
+            "on_complete": on_complete, 
+            "key": key 
         }
         self.animations.append(anim) 
         if not self.running: 
             self.running = True 
+            self._last_tick = None 
             self.master.after(0, self._tick) 
 
-    def _tick(self): 
-        now = time.time() 
-        still_active = [] 
+    # --- True while an animation with this key (or any, without a key) runs --- 
+    def busy(self, key=None): 
+        if key is None: 
+            return bool(self.animations) 
+        return any(anim["key"] == key for anim in self.animations) 
 
-        for anim in self.animations: 
+    def _tick(self): 
+        now = time.perf_counter() 
+        budget = self._tick_delay / 1000.0 
+        if self._last_tick is not None and now - self._last_tick > budget * 1.5: 
+            self.dropped_frames += int((now - self._last_tick) / budget) - 1 
+        self._last_tick = now 
+
+        # Loop over a copy, an on_complete may start or coalesce animations 
+        for anim in list(self.animations): 
+            if anim not in self.animations: 
+                continue 
             elapsed_ms = (now - anim["start"]) * 1000.0
             progress = min(elapsed_ms / anim["duration"], 1.0)
-            try: 
-                anim["func"](progress) 
-            except Exception as e: 
-                print("Animation func error:", e) 
-            if progress < 1.0: 
-                still_active.append(anim)
-            else: 
+            if anim["steps"] and progress < 1.0: 
+                # Only redraw when the animation reaches its next step 
+                progress = int(progress * anim["steps"]) / anim["steps"] 
+            if progress != anim["last"]: 
+                anim["last"] = progress 
+                try: 
+                    anim["func"](progress) 
+                except Exception as e: 
+                    profiler.PROFILER.count("animation_errors") 
+                    print("Animation func error:", e) 
+            if progress >= 1.0: 
+                self.animations.remove(anim) 
                 if anim["on_complete"]: 
                     try:
                         anim["on_complete"]()
                     except Exception as e: 
+                        profiler.PROFILER.count("animation_errors") 
                         print("Animation on_complete error:", e)
 
-        self.animations = still_active 
+        cost_ms = (time.perf_counter() - now) * 1000.0 
+        self.frame_times.append(cost_ms) 
+        self.frames += 1 
+        if profiler.PROFILER.enabled: 
+            profiler.PROFILER.sample("frame_ms", cost_ms) 
+            profiler.PROFILER.mark("canvas_ops", "canvas_ops/frame") 
+
         if self.animations: 
-            self.master.after(self._tick_delay, self._tick)
+            self.master.after(max(1, int(self._tick_delay - cost_ms)), self._tick)
         else: 
             self.running = False
 
+    def _finish(self, anim): 
+        self.fast_forwarded += 1 
+        try: 
+            anim["func"](1.0) 
+            if anim["on_complete"]: 
+                anim["on_complete"]() 
+        except Exception as e: 
+            profiler.PROFILER.count("animation_errors") 
+            print("Animation finish error:", e) 
+
+    # --- Jump every running animation to its last frame, including the ones 
+    # started by an on_complete along the way --- 
+    def finish_all(self): 
+        while self.animations: 
+            pending, self.animations = self.animations, [] 
+            for anim in pending: 
+                self._finish(anim) 
+
+    # --- Frame timing for profiling --- 
+    def stats(self): 
+        times = sorted(self.frame_times) 
+
+        def pick(p): 
+            if not times: 
+                return 0.0 
+            return times[min(len(times) - 1, int(len(times) * p / 100.0))] 
+
+        return { 
+            "frames": self.frames, 
+            "frame_ms_p50": pick(50), 
+            "frame_ms_p99": pick(99), 
+            "frame_ms_max": times[-1] if times else 0.0, 
+            "dropped_frames": self.dropped_frames, 
+            "fast_forwarded": self.fast_forwarded, 
+        } 
+
+# --- Creating Renderer Class --- 
+# Retained mode: the board background, the empty slots and one pooled
+# shadow/tile/text triple per cell are created once. Drawing a board only
+# reconfigures the cells whose value or highlight changed since the last draw.
+# Any board size works, rules is engine or a boards.rules_for() engine.
+# Cells are tracked by exponent, fill, text and font come from styles.py and
+# the font objects are created once per renderer. This is the Tk backend of
+# render.draw_board(), the geometry is render.Layout like the headless SVG and
+# raster backends. Its rect/text primitives reconfigure the item built for the
+# key and leave the coordinates alone, the animations always finish on them. 
+class BoardRenderer(render.Backend): 
+    def __init__(self, app, canvas, cell_size=100, padding=10, rules=engine):
+        self.app = app 
+        self.canvas = canvas 
+        self.cell_size = cell_size 
+        self.padding = padding 
+        self.rules = rules 
+        self.layout = render.Layout(rules.ROWS, rules.COLS, cell_size, padding) 
+        self.width = self.layout.width 
+        self.height = self.layout.height 
+        self.fonts = [app.make_font("Arial", size) for size in styles.font_sizes(cell_size)] 
+        self.slots = {} 
+        self.items = {} 
+        self.parts = {} 
+        self.configured = {} 
+        self.points = {} 
+        self.centers = {} 
+        self.drawn = {} 
+        self.visible = True 
+        self.built = False 
+
+    # --- Create every canvas item the board will ever need --- 
+    def build(self): 
+        self.canvas.create_rectangle(0, 0, self.width, self.height, fill=styles.BOARD_COLOR, outline="", tags="board_bg") 
+        radius = self.cell_size // 4 
+
+        # All slots first so a sliding tile never passes under a later slot 
+        for cell, (x1, y1, x2, y2) in self.layout.boxes.items(): 
+            self.slots[cell] = self.app.create_rounded_rectangle(x1, y1, x2, y2, radius=self.layout.radius, fill=styles.EMPTY_COLOR, tags=("rect", "tile")) 
+            self.points[cell] = self.app.rounded_points(x1, y1, x2, y2, radius) 
+            self.centers[cell] = self.layout.center(cell) 
+            self.drawn[cell] = (0, False) 
+
+        for cell, (cx, cy) in self.centers.items(): 
+            tags = ("tile", self.cell_tag(cell)) 
+            half = (self.cell_size - self.padding) / 2 
+            shadow_id = self.canvas.create_rectangle(cx-half+3, cy-half+3, cx+half+3, cy+half+3, fill=styles.SHADOW_COLOR, outline="", state="hidden", tags=tags) 
+            tile_id = self.canvas.create_polygon(self.points[cell], smooth=True, fill=styles.TILE_COLORS[1], outline="", state="hidden", tags=tags) 
+            text_id = self.canvas.create_text(cx, cy, text="", state="hidden", tags=tags) 
+            self.items[cell] = (shadow_id, tile_id, text_id) 
+            self.parts.update({(cell, "slot"): self.slots[cell], (cell, "shadow"): shadow_id, (cell, "tile"): tile_id, (cell, "text"): text_id}) 
+
+        self.built = True 
+
+    def cell_tag(self, cell): 
+        return "cell%d%d" % cell 
+
+    # --- Offset in pixels between two cells --- 
+    def offset(self, src, dst): 
+        return ((dst[1] - src[1]) * self.cell_size, (dst[0] - src[0]) * self.cell_size) 
+
+    # --- Draw a packed board, touching only the cells that changed --- 
+    # --- Only `cells` are looked at when given, e.g. the precomputed diff of a move --- 
+    def draw(self, board, spawned=None, force=(), cells=None): 
+        if not self.built: 
+            self.build() 
+
+        changed = [] 
+        get_exponent = self.rules.get_exponent 
+        for cell in self.items if cells is None else cells: 
+            e = get_exponent(board, *cell) 
+            state = (e, e != 0 and cell == spawned) 
+            if self.drawn[cell] != state or cell in force: 
+                self.drawn[cell] = state 
+                changed.append(cell) 
+        render.draw_board(self, self.layout, self.rules, board, spawned, cells=changed) 
+        return changed 
+
+    # --- Backend primitives, each an itemconfigure skipped when nothing changes --- 
+    def configure(self, item, **options): 
+        if self.configured.get(item) != options: 
+            self.configured[item] = options 
+            self.canvas.itemconfigure(item, **options) 
+
+    def clear(self, color): 
+        self.configure("board_bg", fill=color) 
+
+    def rect(self, key, box, fill, radius=0): 
+        self.configure(self.parts[key], fill=fill, state="normal" if self.visible else "hidden") 
+
+    def text(self, key, x, y, label, color, font_class): 
+        self.configure(self.parts[key], text=label, fill=color, font=self.fonts[font_class], state="normal" if self.visible else "hidden") 
+
+    def hide(self, key): 
+        self.configure(self.parts[key], state="hidden") 
+
+    # --- Hide or show the whole board for the overlays --- 
+    def set_visible(self, visible): 
+        self.visible = visible 
+        self.configured.clear() 
+        if not visible: 
+            self.canvas.itemconfigure("tile", state="hidden") 
+            return 
+        boxes, radius = self.layout.boxes, self.layout.radius 
+        for cell, (exponent, is_new) in self.drawn.items(): 
+            render.draw_tile(self, cell, boxes[cell], radius, exponent, is_new) 
+
 # --- Creating Main Class ---
 class play_2048 (Tk): 
 
-    game_board = [] 
-    new_random_tiles = [2, 2, 2, 2, 2, 2, 4]
-    score = 0 
+    new_random_tiles = engine.NEW_RANDOM_TILES
     high_score = 0 
     game_score = 0 
     highest_score = 0 
     CELL_SIZE = 100 
     CELL_PADDING = 10
-
-    def __init__(self, *args, **kwargs): 
+    BOARD_PIXELS = 400
+    SIZES = ("3x3", "4x4", "5x5", "6x6", "7x7", "8x8", "4x6", "6x4")
+    INPUT_BURST = 3
+    PROFILE_PHASES = ("move", "engine", "spawn", "animation", "render", "save", "frame_ms", "canvas_ops/frame", "first_frame_ms", "startup_ms")
+    STARTUP_FALLBACK_MS = 500 
+    ADVISOR_POLL_MS = 16 
+    AUTOPLAY_BUDGET = 0.004 
+
+    def __init__(self, *args, session=None, **kwargs): 
         Tk.__init__(self, *args, **kwargs) 
+        self.session = session 
+
+        self.fonts = {} 
 
-        self.last_spawned_tile = None  
+        self.game = engine.Game()
 
         self.game_score = StringVar(self)
         self.game_score.set("0")
         self.highest_score = StringVar(self)
         self.highest_score.set("0")
 
-        self.score = 0
         self.high_score = 0
-        self.game_board = [[0]*4 for _ in range(4)]
 
         self.button_frame = Frame(self)
         self.button_frame.pack(side="top", fill="x", pady=5)
 
         Button(self.button_frame, text="New Game", font=("times new roman", 15), command=self.new_game).pack(side="left", padx=4)
+        Button(self.button_frame, text="Undo", font=("times new roman", 15), command=self.undo).pack(side="left", padx=4)
+        Button(self.button_frame, text="Redo", font=("times new roman", 15), command=self.redo).pack(side="left", padx=4)
+        Button(self.button_frame, text="AI Hint", font=("times new roman", 15), command=self.toggle_ai_hint).pack(side="left", padx=4) 
+        Button(self.button_frame, text="Autoplay", font=("times new roman", 15), command=self.toggle_autoplay).pack(side="left", padx=4) 
         Label(self.button_frame, text="Score:", font=("times new roman", 15)).pack(side="left", padx=4)
         Label(self.button_frame, textvariable=self.game_score, font=("times new roman", 15)).pack(side="left", padx=4)
         Label(self.button_frame, text="Record:", font=("times new roman", 15)).pack(side="left", padx=4)
         Label(self.button_frame, textvariable=self.highest_score, font=("times new roman", 15)).pack(side="left", padx=4)
- 
-        self.debug_frame = Frame(self.button_frame) 
 
-        Button(self.debug_frame, text="DBG: Win", command=self.force_win).pack(side="left", padx=4)
-        Button(self.debug_frame, text="DBG: Game Over", command=self.force_game_over).pack(side="left", padx=4) 
+        self.board_size = StringVar(self) 
+        self.board_size.set("4x4") 
+        OptionMenu(self.button_frame, self.board_size, *self.SIZES, command=self.change_size).pack(side="left", padx=4) 
 
+        self.hint = StringVar(self) 
+        Label(self.button_frame, textvariable=self.hint, font=("times new roman", 12)).pack(side="left", padx=4) 
+ 
+        # The debug buttons are built the first time the menu is shown 
+        self.debug_frame = None 
+        self.profile_text = StringVar(self) 
         self.debug_visible = False 
 
         self.bind_all("<Control-Shift-D>", self.toggle_debug_menu) 
+        self.bind_all("<Control-z>", self.undo) 
+        self.bind_all("<Control-y>", self.redo) 
+        self.bind_all("<Control-Shift-H>", self.toggle_ai_hint) 
+        self.bind_all("<Control-Shift-A>", self.toggle_autoplay) 
 
         self.canvas = Canvas(self, width=410, height=410, borderwidth=5, highlightthickness=0)
         self.canvas.pack(side="top", fill="both", expand="false")  
 
-        self.canvas.create_rectangle(0, 0, 410, 410, fill="#bbada0")
-
         self.animations = AnimationManager(self) 
-
+        self.input_queue = deque() 
+        self._processing_input = False 
+        self.speculation = None 
+        self.speculation_pending = False 
+        self.advisor = None 
+        self.ai_mode = None 
+        self.ai_board = None 
+        self.advisor_polling = False 
+        self.autoplay_moves = deque() 
+        self.autoplay_done = False 
+        self.overlay_kind = history.NO_OVERLAY 
+
+        # Keys stay bound for the whole session, moves() ignores them while an 
+        # overlay is up and queues them until the startup has finished 
+        self.loading = True 
         self.bind_all('<Key>', self.moves)
 
-        if self.load_game_state():
+        path = self.get_game_state_path() 
+        print("Game state path =", path) # So that the User knows what file to delete
+        self.store = persistence.GameStateStore(path, binary=bool(self.session)) 
+        self.replay_log = None 
+        self.stats = None 
+
+        # --- First frame: the last saved board, as it is in the file --- 
+        # The backup fallback, replay log, statistics, history and hint wait 
+        # for finish_startup, which runs once the canvas has been painted. 
+        self.snapshot = self.store.peek() 
+        board = self.snapshot["board"] if self.snapshot else None 
+        self.set_board_size(*((len(board), len(board[0])) if board else (engine.ROWS, engine.COLS))) 
+        if board: 
+            self.game_board = board 
+            self.game_score.set(str(self.snapshot["score"])) 
+            self.highest_score.set(str(self.snapshot["high_score"])) 
+        self.renderer.draw(self.game.board) 
+        self.canvas.bind("<Expose>", self.first_frame) 
+        self.startup_timer = self.after(self.STARTUP_FALLBACK_MS, self.first_frame) 
+
+        self.protocol("WM_DELETE_WINDOW", self.on_exit)
+
+    # --- Deferred startup --- 
+    # The canvas' first Expose (or the fallback timer, for a window that starts 
+    # hidden) schedules the rest behind the paint that is already queued. 
+    def first_frame(self, event=None): 
+        self.canvas.unbind("<Expose>") 
+        self.after_cancel(self.startup_timer) 
+        self.after_idle(self.finish_startup) 
+
+    def finish_startup(self): 
+        profiler.PROFILER.sample("first_frame_ms", (time.perf_counter() - STARTED) * 1000.0) 
+        self.replay_log = self.open_replay_log() 
+        self.stats = self.open_stats() 
+        self.game.recorder = self.replay_log if self.game.rules is engine else None 
+
+        snapshot, self.snapshot = self.snapshot, None 
+        if self.load_game_state(snapshot):
             self.game_score.set(str(self.score))
             self.highest_score.set(str(self.high_score))
+            self.game.resume() 
             self.show_board()  
+            self.record_history() 
         else:
             self.new_game()    
-        
-        self.protocol("WM_DELETE_WINDOW", self.on_exit)
-    
+
+        self.loading = False 
+        profiler.PROFILER.sample("startup_ms", (time.perf_counter() - STARTED) * 1000.0) 
+        self.process_input() 
+
+    # --- Board, score and last tile are owned by the engine ---
+    @property
+    def game_board(self):
+        return self.game.grid()
+
+    @game_board.setter
+    def game_board(self, grid):
+        self.game.board = self.game.rules.pack(grid)
+
+    # --- Switch the engine, renderer and history to another board size --- 
+    # Cells shrink so the board always fits in BOARD_PIXELS. Only 4x4 games 
+    # are written to the replay log, its records hold 64-bit boards. 
+    def set_board_size(self, rows, columns): 
+        rules = boards.rules_for(rows, columns) 
+        cell_size = min(self.CELL_SIZE, self.BOARD_PIXELS // max(rows, columns)) 
+        padding = max(4, self.CELL_PADDING * cell_size // self.CELL_SIZE) 
+
+        self.game.rules = rules 
+        self.game.recorder = self.replay_log if rules is engine else None 
+        self.board_size.set("%dx%d" % (rows, columns)) 
+        self.history = history.History(board_bits=rules.BOARD_BITS) 
+
+        self.canvas.delete("all") 
+        self.renderer = BoardRenderer(self, self.canvas, cell_size, padding, rules) 
+        self.canvas.config(width=self.renderer.width, height=self.renderer.height) 
+        self.square = {} 
+
+    def change_size(self, value): 
+        rows, columns = boards.parse_size(value) 
+        if (rows, columns) == (self.game.rules.ROWS, self.game.rules.COLS): 
+            return 
+        self.input_queue.clear() 
+        self.animations.finish_all() 
+        self.set_board_size(rows, columns) 
+        self.new_game() 
+
+    @property
+    def score(self):
+        return self.game.score
+
+    @score.setter
+    def score(self, value):
+        self.game.score = value
+
+    @property
+    def last_spawned_tile(self):
+        return self.game.last_spawned_tile
+
+    @last_spawned_tile.setter
+    def last_spawned_tile(self, cell):
+        self.game.last_spawned_tile = cell
+
     # --- Animate Tile Spawning --- 
-    def animate_spawn(self, item):
+    def animate_spawn(self, item, row=None, column=None):
 
         if isinstance(item, (tuple, list)): 
             rect_id, text_id = item[0], (item[1] if len(item) > 1 else None) 
         else: 
             rect_id, text_id = item, None
 
-        bbox = self.canvas.bbox(rect_id) 
-        if not bbox: 
-            return 
-        x1, y1, x2, y2 = bbox
-        cx = (x1 + x2)/2
-        cy = (y1 + y2)/2
+        if row is not None and column is not None: 
+            points = self.renderer.points[row, column] 
+            cx, cy = self.renderer.centers[row, column] 
+        else: 
+            points = self.canvas.coords(rect_id) 
+            if not points: 
+                return 
+            cx = sum(points[::2]) / len(points[::2]) 
+            cy = sum(points[1::2]) / len(points[1::2]) 
 
         duration = 200
         steps = 10
@@ -143,42 +475,29 @@ class play_2048 (Tk):
         def step(progress):  
             scale = initial_scale + (final_scale - initial_scale) * progress
             new_coords = [] 
-            for x, y in zip([x1, x2, x2, x1], [y1, y1, y2, y2]): 
-                new_x = cx + (x - cx) * scale 
-                new_y = cy + (y - cy) * scale 
-                new_coords.append(new_x) 
-                new_coords.append(new_y) 
+            for x, y in zip(points[::2], points[1::2]): 
+                new_coords.append(cx + (x - cx) * scale) 
+                new_coords.append(cy + (y - cy) * scale) 
             
             self.canvas.coords(rect_id, *new_coords) 
 
-            if text_id: 
-                self.canvas.coords(text_id, cx, cy)
-
-        self.animations.add_animation(step, duration, steps)
+        self.animations.add_animation(step, duration, steps, key=("pop", row, column))
 
     # --- Animate Tile Merging --- 
     def animate_merge(self, item, row=None, column=None):
         rect_id, text_id = item if isinstance(item, (tuple, list)) else (item, None)
-         
-        try: 
-            bbox = self.canvas.bbox(rect_id)
-        except Exception:
-            bbox = None 
-            if not bbox: 
-                return
-
-        original_coords = self.canvas.coords(rect_id)
-        if not original_coords: 
-            return
-        xs = original_coords[::2]
-        ys = original_coords[1::2]
 
         if row is not None and column is not None:
-            cx = self.CELL_PADDING + column * (self.CELL_SIZE + self.CELL_PADDING) + self.CELL_SIZE / 2
-            cy = self.CELL_PADDING + row * (self.CELL_SIZE + self.CELL_PADDING) + self.CELL_SIZE / 2
+            original_coords = self.renderer.points[row, column]
+            cx, cy = self.renderer.centers[row, column]
         else:
-            cx = sum(xs) / len(xs)
-            cy = sum(ys) / len(ys)
+            original_coords = self.canvas.coords(rect_id)
+            if not original_coords: 
+                return
+            cx = sum(original_coords[::2]) / len(original_coords[::2])
+            cy = sum(original_coords[1::2]) / len(original_coords[1::2])
+        xs = original_coords[::2]
+        ys = original_coords[1::2]
 
         duration = 120
         pulse_scale = 0.3
@@ -196,35 +515,55 @@ class play_2048 (Tk):
                 new_coords.extend([new_x, new_y])
             self.canvas.coords(rect_id, *new_coords)
 
-            bbox = self.canvas.bbox(rect_id)
-            if text_id and bbox:
-                x1, y1, x2, y2 = bbox
-                self.canvas.coords(text_id, (x1 + x2) / 2, (y1 + y2) / 2)
-
             if progress >= 1.0:
                 self.canvas.coords(rect_id, *original_coords)
-                if text_id:
-                    bbox = self.canvas.bbox(rect_id)
-                    if bbox:
-                        x1, y1, x2, y2 = bbox
-                        self.canvas.coords(text_id, (x1 + x2) / 2, (y1 + y2) / 2)
 
-        self.animations.add_animation(step, duration)
+        self.animations.add_animation(step, duration, key=("pop", row, column))
 
-    # --- Add new Tiles with 2 or 4 --- 
-    def new_tiles(self): 
-        index = random.randint(0, 6) 
-        
-        while not self.full(): 
-            x = random.randint(0, 3) 
-            y = random.randint(0, 3) 
+    # --- Animate Tiles Sliding --- 
+    # Tiles are grouped by how far they travel, each group shares one canvas 
+    # tag so a frame costs one canvas.move per distance, not one per tile. 
+    def animate_slide(self, plan, on_complete=None): 
+        groups = {} 
+        for src, dst, merged in plan: 
+            if src != dst: 
+                groups.setdefault(self.renderer.offset(src, dst), []).append(src) 
 
-            if self.game_board[x][y] == 0: 
-                self.game_board[x][y] = self.new_random_tiles[index] 
-                self.last_spawned_tile = (x, y) 
+        if not groups: 
+            if on_complete: 
+                on_complete() 
+            return 
 
-                self.show_board() 
-                break
+        tags = [] 
+        for i, (offset, cells) in enumerate(groups.items()): 
+            tag = "slide%d" % i 
+            for cell in cells: 
+                self.canvas.addtag_withtag(tag, self.renderer.cell_tag(cell)) 
+            self.canvas.tag_raise(tag) 
+            tags.append((tag, offset)) 
+
+        duration = 100 
+        moved = [0.0] 
+
+        def step(progress): 
+            eased = 1 - (1 - progress) ** 2 
+            delta = eased - moved[0] 
+            moved[0] = eased 
+            for tag, (dx, dy) in tags: 
+                self.canvas.move(tag, dx * delta, dy * delta) 
+
+        def done(): 
+            for tag, (dx, dy) in tags: 
+                self.canvas.move(tag, -dx, -dy) 
+                self.canvas.dtag(tag) 
+            if on_complete: 
+                on_complete() 
+
+        self.animations.add_animation(step, duration, on_complete=done, key="slide") 
+
+    # --- Add new Tiles with 2 or 4 --- 
+    def new_tiles(self):
+        return self.game.spawn()
             
     # --- Make the tiles rounded with mathematics --- 
     def create_rounded_rectangle(self, x1, y1, x2, y2, radius=15, **kwargs):
@@ -254,111 +593,49 @@ class play_2048 (Tk):
 
     # --- Draws the rounded tiles --- 
     def rounded_rectangle(self, x1, y1, x2, y2, r=25, color="#eee4da"):
-        points = [
-            x1+r, y1, 
-            x2-r, y1, 
-            x2, y1, x2, y1+r, 
-            x2, y2-r, 
-            x2, y2, x2-r, y2, 
-            x1+r, y2, 
-            x1, y2, x1, y2-r, 
-            x1, y1+r, 
-            x1, y1
-        ]
+        points = self.rounded_points(x1, y1, x2, y2, r)
         return self.canvas.create_polygon(points, smooth=True, fill=color, outline="")
 
+    # --- Point list of the rounded tiles, also used to reset animated tiles --- 
+    def rounded_points(self, x1, y1, x2, y2, r=25):
+        return render.rounded_points(x1, y1, x2, y2, r) 
+
     # --- Shows game board ---    
-    def show_board(self):
-        cellwidth = 100
-        cellheight = 100 
-        padding = 10
-        self.square = {}  
-
-        self.canvas.delete("board_bg") 
-        self.canvas.create_rectangle(0, 0, 410, 410, fill="#bbada0", outline="", tags="board_bg")  
-
-        self.canvas.delete("tile")
-
-        for column in range(4): 
-            for row in range(4):  
-                x1 = column * cellwidth + padding
-                y1 = row * cellheight + padding 
-                x2 = x1 + cellwidth - padding
-                y2 = y1 + cellheight - padding
-                num = self.game_board[row][column]
-                if num == 0 : 
-                    self.show_number0(row, column, x1, y1, x2, y2) 
-                else: 
-                    is_new = (self.last_spawned_tile == (row, column)) 
-                    self.show_number(row, column, x1, y1, x2, y2, num, is_new=is_new) 
+    def show_board(self, force=(), cells=None):
+        with profiler.PROFILER.phase("render"): 
+            changed = self.renderer.draw(self.game.board, self.last_spawned_tile, force, cells) 
+            if not self.square: 
+                self.square = {cell: items[1:] for cell, items in self.renderer.items.items()} 
+
+            spawned = self.last_spawned_tile 
+            if spawned in changed and self.renderer.drawn[spawned][1]: 
+                self.animate_spawn(self.square[spawned], *spawned) 
+        self.update_hint() 
+        self.schedule_speculation() 
+        return changed
 
     # --- Check if Board is Full --- 
     def full(self):
-        for i in range(0, 4): 
-            for j in range(0, 4): 
-                if (self.game_board[i][j] == 0): 
-                    return False
-        return True
-
-    # --- Shows color of grid when there are no numbers --- 
-    def show_number0(self, row, column, a, b, c, d): 
-        tile_id = self.create_rounded_rectangle(a, b, c, d, fill="#cdc1b4", tags=("rect", "tile")) 
-
-        self.square[row, column] = (tile_id, None)
-
-    # --- Shows color of grid and respective numbers --- 
-    def show_number(self, row, column, a, b, c, d, num, is_new=False): 
-        if is_new and num == 2:
-            fill_color = "#e0f2f8" 
-            text_color = "#f78a8a" 
-        elif is_new and num == 4:
-            fill_color = "#b8dbe5" 
-            text_color = "#f78a8a"
-        else: 
-            bg_color = {
-                '2': '#eee4da', '4': '#ede0c8', '8': '#f2b179', '16': '#f59563',
-                '32': '#f67c5f', '64': '#f65e3b', '128': '#edcf72', '256': '#edcc61',
-                '512': '#f2b179', '1024': '#f59563', '2048': '#edc22e'
-            }
-            text_color_dict = {
-                '2': '#776e65', '4': '#776e65', '8': '#f9f6f2', '16': '#f9f6f2',
-                '32': '#f9f6f2', '64': '#f9f6f2', '128': '#f9f6f2', '256': '#f9f6f2',
-                '512': '#f9f6f2', '1024': '#f9f6f2', '2048': '#f9f6f2'
-            }
-            fill_color = bg_color.get(str(num), "#3c3a32")
-            text_color = text_color_dict.get(str(num), "#f9f6f2") 
-
-        shadow_id = self.canvas.create_rectangle(a+3, b+3, c+3, d+3, fill="#b3a396", outline="", tags=("tile")) 
-
-        tile_id = self.rounded_rectangle(a, b, c, d, color=fill_color) 
-        self.canvas.addtag_withtag("tile", tile_id)
-
-        font_size = 36 if num < 1024 else 28 
-        text_id = self.canvas.create_text((a + c)/2, (b + d)/2, text=str(num), fill=text_color, font=("Arial", font_size)) 
-        self.canvas.addtag_withtag("tile", text_id) 
-
-        self.canvas.tag_raise(text_id, tile_id)
-
-        self.square[row, column] = (tile_id, text_id) 
+        return self.game.full()
 
-        if is_new: 
-            self.animate_spawn(self.square[row, column])  
+    # --- Colors of a tile, new tiles get their own highlight --- 
+    def tile_colors(self, num, is_new=False): 
+        return styles.tile_style(num.bit_length() - 1 if num else 0, is_new)[:2] 
 
-    # --- Get Tile background color --- 
+    # --- Get Tile text color --- 
     def get_text_color(self, num): 
-        if num in (2, 4): 
-            return '#776e65' 
-        return '#f9f6f2'
+        return self.tile_colors(num)[1] 
     
-    # --- Helper Function for animations --- 
+    # --- Get Tile background color --- 
     def get_color(self, num):       
-        bg_color = {
-            2: '#eee4da', 4: '#ede0c8', 8: '#f2b179',
-            16: '#f59563', 32: '#f67c5f', 64: '#f65e3b',
-            128: '#edcf72', 256: '#edcc61', 512: '#f2b179',
-            1024: '#f59563', 2048: '#edc22e'
-        }
-        return bg_color.get(num, "#3c3a32")
+        return self.tile_colors(num)[0] 
+
+    # --- Fonts are resolved once and handed to the canvas as objects --- 
+    def make_font(self, family, size, weight="normal"): 
+        key = (family, size, weight) 
+        if key not in self.fonts: 
+            self.fonts[key] = tkfont.Font(self, family=family, size=size, weight=weight) 
+        return self.fonts[key] 
 
     # --- Accepts different events given by user --- 
     def moves(self, event):
@@ -366,135 +643,157 @@ class play_2048 (Tk):
             return
 
         direction = event.keysym
-        merge_positions = []
-
-        def process_line(line, line_index, reverse=False, is_col=False):
-            new_line = []
-            compact = [v for v in line if v != 0]
-            j = 0
-            while j < len(compact):
-                if j + 1 < len(compact) and compact[j] == compact[j + 1]:
-                    merged_val = compact[j] * 2
-                    new_line.append(merged_val)
-
-                    if is_col:
-                        r, c = (j if not reverse else 3-j, line_index)
-                    else:
-                        r, c = (line_index, j if not reverse else 3-j)
-                    merge_positions.append((r, c))
-
-                    self.score += merged_val
-                    j += 2
-                else:
-                    new_line.append(compact[j])
-                    j += 1
-
-            while len(new_line) < 4:
-                new_line.append(0)
-
-            if reverse:
-                new_line = new_line[::-1]
-            return new_line
-
-        old_board = [row[:] for row in self.game_board]
-
-        if direction == "Left":
-            for i in range(4):
-                self.game_board[i] = process_line(self.game_board[i], i, reverse=False, is_col=False)
-        elif direction == "Right":
-            for i in range(4):
-                self.game_board[i] = process_line(self.game_board[i], i, reverse=True, is_col=False)
-        elif direction == "Up":
-            for j in range(4):
-                col = [self.game_board[i][j] for i in range(4)]
-                new_col = process_line(col, j, reverse=False, is_col=True)
-                for i in range(4):
-                    self.game_board[i][j] = new_col[i]
-        elif direction == "Down":
-            for j in range(4):
-                col = [self.game_board[i][j] for i in range(4)]
-                new_col = process_line(col, j, reverse=True, is_col=True)
-                for i in range(4):
-                    self.game_board[i][j] = new_col[i]
-
-        if self.game_board != old_board:
-            self.new_tiles()  
-            self.show_board()  
-
-            for r, c in merge_positions:
-                if (r, c) in self.square and old_board[r][c] != 0:
-                    self.animate_merge(self.square[r, c], r, c)
-
-
-        self.game_score.set(str(self.score))
-        if self.score > self.high_score:
-            self.high_score = self.score
-            self.highest_score.set(str(self.high_score))
+        if direction not in engine.DIRECTIONS:
+            return
+        if self.ai_mode == "autoplay": 
+            self.set_ai_mode(None) 
+
+        self.input_queue.append(direction) 
+        if not self.loading: 
+            self.process_input() 
+
+    # --- Apply queued keys in order --- 
+    # A key that arrives during a slide waits for it to finish. Once more than 
+    # INPUT_BURST keys are waiting (key held down) the running animations are 
+    # fast forwarded instead, so the queue stays bounded and nothing is dropped. 
+    # Keys pressed while the game is still loading all wait in the queue, 
+    # finish_startup() plays them in order once the board is up. 
+    def process_input(self): 
+        if self._processing_input: 
+            return 
+        self._processing_input = True 
+        try: 
+            while self.input_queue: 
+                if getattr(self, "overlay_active", False): 
+                    self.input_queue.clear() 
+                    break 
+                if self.animations.busy("slide") and len(self.input_queue) < self.INPUT_BURST: 
+                    break 
+                self.animations.finish_all() 
+                self.apply_move(self.input_queue.popleft()) 
+        finally: 
+            self._processing_input = False 
+
+    # --- Speculative moves --- 
+    # Once a board is on screen, Tk's idle time works out all four moves from 
+    # it: the engine's successor, the slide plan and the cells the move changes 
+    # on the canvas. A keypress then commits one of them and redraws only those 
+    # cells, and a direction that doesn't move the board costs a dict lookup. 
+    def schedule_speculation(self): 
+        if not self.speculation_pending: 
+            self.speculation_pending = True 
+            self.after_idle(self.speculate) 
+
+    def speculate(self): 
+        self.speculation_pending = False 
+        self.successors() 
+
+    # --- {direction: (successor, plan, changed cells) or None}, cached per board --- 
+    def successors(self): 
+        key = (self.game.rules, self.game.board) 
+        if self.speculation is not None and self.speculation[0] == key: 
+            return self.speculation[1] 
+
+        rules, board = key 
+        get_exponent = rules.get_exponent 
+        cells = [(r, c) for r in range(rules.ROWS) for c in range(rules.COLS)] 
+        results = {} 
+        for direction, successor in self.game.successors().items(): 
+            if successor is not None: 
+                new_board = successor[0] 
+                changed = [cell for cell in cells if get_exponent(board, *cell) != get_exponent(new_board, *cell)] 
+                successor = (successor, rules.move_plan(board, direction), changed) 
+            results[direction] = successor 
+        self.speculation = (key, results) 
+        return results 
+
+    # --- Move the board in one direction --- 
+    # Every phase is timed when profiling is on (debug frame), see profiler.py 
+    def apply_move(self, direction): 
+        phase = profiler.PROFILER.phase 
+        with phase("move"): 
+            with phase("engine"): 
+                move = self.successors()[direction] 
+                if move is None: 
+                    return 
+                successor, plan, changed = move 
+                previous = self.last_spawned_tile 
+                merge_positions = self.game.commit(direction, successor) 
+
+            with phase("spawn"): 
+                spawned = self.new_tiles()  
+            # The diff, the new tile and the old one losing its highlight 
+            cells = changed + [cell for cell in (spawned, previous) if cell is not None and cell not in changed] 
+            with phase("animation"): 
+                self.animate_slide(plan, on_complete=lambda: self.finish_move(merge_positions, spawned, cells)) 
 
-        self.game_over()
-        self.save_game_state()
+            self.game_score.set(str(self.score))
+            if self.score > self.high_score:
+                self.high_score = self.score
+                self.highest_score.set(str(self.high_score))
+
+            with phase("overlay"): 
+                self.game_over()
+                self.update_hint() 
+            with phase("history"): 
+                self.record_history() 
+            self.save_game_state()
+        if profiler.PROFILER.enabled: 
+            profiler.PROFILER.count("moves") 
+            self.show_profile() 
     
+    # --- Redraw after the slide and pop the merged tiles --- 
+    def finish_move(self, merge_positions, spawned, cells=None): 
+        self.show_board(force=[spawned] if spawned else (), cells=cells) 
+        for r, c in merge_positions: 
+            self.animate_merge(self.square[r, c], r, c) 
+        self.process_input() 
+
     # --- Creates new Game for User --- 
     def new_game(self):   
+        if self.ai_mode == "autoplay": 
+            self.set_ai_mode(None) 
 
         self.reset_overlay()
         self.canvas.delete("overlay")
-        self.canvas.itemconfigure("tile", state="normal")
+        self.renderer.set_visible(True)
 
-        self.score = 0 
+        self.game.new_game()
         self.game_score.set("0") 
-
-        self.game_board = [[0] * 4 for _ in range(4)]
-
-        for _ in range(2): 
-            while True: 
-                x = random.randint(0, 3) 
-                y = random.randint(0, 3) 
-                if self.game_board[x][y] == 0: 
-                    self.game_board[x][y] = 2
-                    self.last_spawned_tile = (x, y) 
-                    break 
+        if self.stats is not None: 
+            self.stats.refresh() 
                    
         self.show_board() 
-
-        self.bind_all('<Key>', self.moves)
+        self.history.clear() 
+        self.record_history() 
 
     # --- Testing with overlay --- 
     def show_overlay(self, title, color): 
 
         self.canvas.delete("overlay") 
 
+        width, height = self.renderer.width, self.renderer.height 
+        cx, cy = width / 2, height / 2 
+        half = min(145, cx - 10) 
+
         for i in range(5): 
-            self.canvas.create_rectangle(0, 0, 410, 410, fill="#000000", outline="", stipple="gray25" if i % 2 == 0 else "gray50", tags="overlay")
+            self.canvas.create_rectangle(0, 0, width, height, fill="#000000", outline="", stipple="gray25" if i % 2 == 0 else "gray50", tags="overlay")
         
-        self.canvas.create_rectangle(60, 160, 350, 250, fill="#faf8ef", outline=color, width=4, tags="overlay") 
+        self.canvas.create_rectangle(cx - half, cy - 45, cx + half, cy + 45, fill="#faf8ef", outline=color, width=4, tags="overlay") 
 
-        self.canvas.create_text(205, 205, text=title, font=("Helvetica", 30, "bold"), fill=color, tags="overlay")
+        self.canvas.create_text(cx, cy, text=title, font=self.make_font("Helvetica", 30 if half == 145 else 20, "bold"), fill=color, tags="overlay")
 
         self.canvas.tag_raise("overlay")
 
     # --- Check if conditions for game over or win are met --- 
     def game_over(self):  
-        for i in range(4): 
-            for j in range(4): 
-                if self.game_board[i][j] == 2048: 
-                    self.game_won() 
-                    return True   
-         
-        for i in range(4): 
-            for j in range(4): 
-                if self.game_board[i][j] == 0: 
-                    return False
-                
-        for i in range(4): 
-            for j in range(3): 
-                if self.game_board[i][j] == self.game_board[i][j + 1]: 
-                    return False 
-                
-        for j in range(4): 
-            for i in range(3): 
-                if self.game_board[i][j] == self.game_board[i + 1][j]: 
-                    return False 
+        if self.game.won(): 
+            self.game_won() 
+            return True   
+
+        # A full board is over when none of its (precomputed) moves is legal 
+        if not self.game.full() or any(self.successors().values()): 
+            return False
                 
         self.show_game_over() 
         return True
@@ -504,91 +803,262 @@ class play_2048 (Tk):
         if getattr(self, "overlay_active", False): 
             return
         
-        self.canvas.itemconfigure("tile", state="hidden")
+        self.renderer.set_visible(False)
 
         self.overlay_active = True 
+        self.overlay_kind = history.GAME_OVER 
         self.show_overlay("Game Over", "#776e65")
-
-        self.unbind_all('<Key>')
                  
     # --- Shows the game won screen --- 
     def game_won(self):  
         if getattr(self, "overlay_active", False): 
             return
 
-        self.canvas.itemconfigure("tile", state="hidden")
+        self.renderer.set_visible(False)
 
         self.overlay_active = True 
+        self.overlay_kind = history.WON 
         self.show_overlay("You Win!", "#edc22e")
 
-        self.unbind_all('<Key>') 
-
     # --- Resets Overlay to avoid Stacking --- 
     def reset_overlay(self): 
         self.canvas.delete("overlay") 
         self.overlay_active = False
+        self.overlay_kind = history.NO_OVERLAY 
 
-    # --- Define file path and load/save game state ---
-    def get_game_state_path(self):
-        path = os.path.join(os.path.expanduser("~"), "gamestate.json")
-        print("Game state path =", path, type(path)) # So that the User knows what file to delete
-        return path
-
-    # --- Load and Save Game State --- 
-    def load_game_state(self): 
-        path = self.get_game_state_path()
+    # --- Undo/redo history --- 
+    # Every state after a move is pushed into a ring buffer of packed boards, 
+    # undo and redo just move its cursor and put that state back on screen. 
+    def record_history(self): 
+        self.history.push(self.game.board, self.score, self.high_score, 
+                          self.last_spawned_tile, self.overlay_kind) 
 
-        try:
-            with open(path, "r") as f: 
-                data = json.load(f)
-
-                self.high_score = data.get("high_score", 0) 
-                self.highest_score.set(str(self.high_score)) 
+    def undo(self, event=None): 
+        self.restore_state(self.history.undo()) 
 
-                self.score = data.get("score", 0)
-                self.game_score.set(str(self.score)) 
+    def redo(self, event=None): 
+        self.restore_state(self.history.redo()) 
 
-                last_tile = data.get("last_spawned_tile")
-                self.last_spawned_tile = tuple(data["last_spawned_tile"]) if data.get("last_spawned_tile") else None
+    def restore_state(self, state): 
+        if state is None: 
+            return 
+        if self.ai_mode == "autoplay": 
+            self.set_ai_mode(None) 
+        self.input_queue.clear() 
+        self.animations.finish_all() 
+
+        self.game.board = state["board"] 
+        self.score = state["score"] 
+        self.last_spawned_tile = state["last_spawned_tile"] 
+        self.high_score = state["high_score"] 
+        self.game_score.set(str(self.score)) 
+        self.highest_score.set(str(self.high_score)) 
+        self.game.resume() 
+
+        self.reset_overlay() 
+        self.renderer.set_visible(True) 
+        self.show_board() 
 
-                board = data.get("board") 
+        if state["overlay"] == history.WON: 
+            self.game_won() 
+        elif state["overlay"] == history.GAME_OVER: 
+            self.show_game_over() 
+        self.save_game_state() 
 
-                if board and isinstance(board, list) and len(board) == 4: 
-                    self.game_board = board 
-                else: 
-                    self.game_board = [[0]*4 for _ in range(4)] 
-                return True 
-        except FileNotFoundError: 
+    # --- Define file path and load/save game state ---
+    # --- python Main.py --session NAME plays ~/2048-sessions/NAME.bin, the server's file for that session --- 
+    def get_game_state_path(self):
+        if self.session: 
+            os.makedirs(persistence.SESSIONS_DIR, exist_ok=True) 
+            return persistence.session_path(self.session, binary=True) 
+        return os.path.join(os.path.expanduser("~"), "gamestate.json")
+
+    # --- Every game is recorded next to the game state --- 
+    def open_replay_log(self): 
+        path = os.path.join(os.path.expanduser("~"), "2048-replay.log") 
+        try: 
+            return replay.ReplayWriter(path) 
+        except Exception as e: 
+            print(f"ERROR: Failed to open replay log! {e}") 
+            return None 
+
+    # --- Board statistics for the hint, built with python statsdb.py collect --- 
+    def open_stats(self): 
+        import statsdb 
+        path = os.path.join(os.path.expanduser("~"), "2048-stats") 
+        if not os.path.exists(os.path.join(path, statsdb.META_FILE)): 
+            return None 
+        try: 
+            return statsdb.StatsDB(path) 
+        except statsdb.StatsError as e: 
+            print(f"ERROR: Failed to open board statistics! {e}") 
+            return None 
+
+    # --- Best move and expected final score, a binary search in the mapped shards --- 
+    def update_hint(self): 
+        if self.ai_mode is not None: 
+            self.update_ai_hint() 
+            return 
+        if self.stats is None or self.game.rules is not engine: 
+            self.hint.set("") 
+            return 
+        best = self.stats.best_move(self.game.board) 
+        if best is None: 
+            self.hint.set("Hint: -") 
+        else: 
+            direction, mean, games = best 
+            self.hint.set(f"Hint: {direction} ~{mean:,.0f} ({games} games)") 
+
+    # --- AI hint and autoplay (advisor.py) --- 
+    # The search runs in a worker process, poll_advisor picks up its results 
+    # once a frame with after(), so neither mode blocks the event loop or the 
+    # animations. Autoplay replays the worker's moves for AUTOPLAY_BUDGET 
+    # seconds per poll and draws the board once, whatever the number of moves. 
+    def toggle_ai_hint(self, event=None): 
+        self.set_ai_mode(None if self.ai_mode == "hint" else "hint") 
+
+    def toggle_autoplay(self, event=None): 
+        self.set_ai_mode(None if self.ai_mode == "autoplay" else "autoplay") 
+
+    def set_ai_mode(self, mode): 
+        if mode == "autoplay" and (getattr(self, "overlay_active", False) or self.game.rules is not engine): 
+            mode = None 
+        self.ai_mode = mode 
+        self.ai_board = None 
+        self.autoplay_moves.clear() 
+        self.autoplay_done = False 
+        if self.advisor is not None: 
+            self.advisor.cancel() 
+        if mode == "autoplay": 
+            self.input_queue.clear() 
+            self.animations.finish_all() 
+            # The worker picks the spawns, so they go into the log as a segment of 
+            # their own instead of being checked against the game's seed, and the 
+            # game's seeded generator is left alone 
+            self.game.resume() 
+            self.start_advisor().autoplay(self.game.board, self.score, random.getrandbits(63)) 
+            self.autoplay_started = time.perf_counter() 
+            self.autoplay_played = 0 
+        self.update_hint() 
+
+    # --- The worker starts with the first request and then stays up until exit --- 
+    def start_advisor(self): 
+        if self.advisor is None: 
+            import advisor 
+            self.advisor = advisor.Advisor() 
+        if not self.advisor_polling: 
+            self.advisor_polling = True 
+            self.after(self.ADVISOR_POLL_MS, self.poll_advisor) 
+        return self.advisor 
+
+    # --- A new search whenever the board changed, the old one is cancelled --- 
+    def update_ai_hint(self): 
+        if self.game.rules is not engine: 
+            self.hint.set("AI: 4x4 only") 
+        elif self.ai_mode == "hint" and self.game.board != self.ai_board: 
+            self.ai_board = self.game.board 
+            self.start_advisor().hint(self.ai_board) 
+            self.hint.set("AI: thinking...") 
+
+    def poll_advisor(self): 
+        for result in self.advisor.poll(): 
+            if result[0] == "hint" and self.ai_mode == "hint": 
+                depth, direction = result[2], result[3] 
+                self.hint.set(f"AI: {direction} (depth {depth})") 
+            elif result[0] == "moves" and self.ai_mode == "autoplay": 
+                self.autoplay_moves.extend(result[2]) 
+            elif result[0] == "done" and self.ai_mode == "autoplay": 
+                self.autoplay_done = True 
+        if self.ai_mode == "autoplay": 
+            self.play_autoplay_moves() 
+        if self.ai_mode is None: 
+            self.advisor_polling = False 
+        else: 
+            self.after(self.ADVISOR_POLL_MS, self.poll_advisor) 
+
+    def play_autoplay_moves(self): 
+        deadline = time.perf_counter() + self.AUTOPLAY_BUDGET 
+        moves = self.autoplay_moves 
+        played = 0 
+        while moves and time.perf_counter() < deadline: 
+            direction, cell, value = moves.popleft() 
+            if self.game.move(direction) is None: 
+                # Only happens if the board was changed behind the worker's back 
+                moves.clear() 
+                self.autoplay_done = True 
+                break 
+            self.game.place(cell, value) 
+            self.record_history() 
+            played += 1 
+
+        if played: 
+            self.game_score.set(str(self.score)) 
+            if self.score > self.high_score: 
+                self.high_score = self.score 
+                self.highest_score.set(str(self.high_score)) 
+            self.show_board() 
+            self.game_over() 
+            self.save_game_state() 
+            self.autoplay_played += played 
+            elapsed = time.perf_counter() - self.autoplay_started 
+            rate = self.autoplay_played / elapsed if elapsed > 0 else 0.0 
+            self.hint.set(f"Autoplay: {rate:,.0f} moves/s") 
+        if getattr(self, "overlay_active", False) or (self.autoplay_done and not moves): 
+            self.set_ai_mode(None) 
+
+    # --- Load and Save Game State, the startup hands in the snapshot it drew --- 
+    def load_game_state(self, state=None): 
+        if state is None: 
+            state = self.store.load()
+
+        if state is None: 
+            if self.store.exists(): 
+                print("ERROR: Failed to load game state! No valid snapshot found")
             self.high_score = 0 
             self.highest_score.set("0") 
             self.score = 0 
             self.game_score.set("0")
-            self.game_board = [[0]*4 for _ in range(4)] 
+            self.game_board = [[0]*self.game.rules.COLS for _ in range(self.game.rules.ROWS)] 
             return False
-        except Exception as e: 
-            print(f"ERROR: Failed to load game state! {e}")
-            return False 
-       
-    # --- Save Game State --- 
-    def save_game_state(self): 
-        path = self.get_game_state_path() 
 
-        data = {
-            "high_score": self.high_score,
-            "score": self.score,
-            "last_spawned_tile": list(self.last_spawned_tile) if self.last_spawned_tile else None,
-            "board": self.game_board
-        }
+        board = state["board"] 
+        if (len(board), len(board[0])) != (self.game.rules.ROWS, self.game.rules.COLS): 
+            self.set_board_size(len(board), len(board[0])) 
 
-        try:
-            with open(path, "w") as f:
-                json.dump(data, f) 
-        except Exception as e: 
-            print(f"DEBUG: Error saving high score: {type(e).__name__}: {e}")
+        self.high_score = state["high_score"] 
+        self.highest_score.set(str(self.high_score)) 
+
+        self.score = state["score"]
+        self.game_score.set(str(self.score)) 
+
+        self.last_spawned_tile = state["last_spawned_tile"]
+        self.game_board = state["board"] 
+        return True 
+       
+    # --- Save Game State, written by the store's background thread --- 
+    def save_game_state(self): 
+        with profiler.PROFILER.phase("save"): 
+            if self.game.recorder is not None: 
+                self.game.recorder.flush() 
+            self.store.save({
+                "high_score": self.high_score,
+                "score": self.score,
+                "last_spawned_tile": self.last_spawned_tile,
+                "board": self.game_board
+            })
 
     # --- Handle application exit ---
     def on_exit(self):
-        self.save_game_state() 
+        # Nothing was loaded yet, so there is nothing new to save either 
+        if not self.loading: 
+            self.save_game_state() 
+        self.store.close() 
+        if self.replay_log is not None: 
+            self.replay_log.close() 
+        if self.stats is not None: 
+            self.stats.close() 
+        if self.advisor is not None: 
+            self.advisor.close() 
         self.destroy() 
 
     # --- Toggle Debug Menu --- 
@@ -598,48 +1068,99 @@ class play_2048 (Tk):
             self.debug_visible = False 
             print("DEBUG: Debug Menu was hidden") 
         else:
+            if self.debug_frame is None: 
+                self.build_debug_menu() 
             self.debug_frame.pack(side="bottom", pady=4) 
             self.debug_visible = True
             print("DEBUG: Debug Menu is visible") 
 
+    def build_debug_menu(self): 
+        self.debug_frame = Frame(self.button_frame) 
+
+        Button(self.debug_frame, text="DBG: Win", command=self.force_win).pack(side="left", padx=4)
+        Button(self.debug_frame, text="DBG: Game Over", command=self.force_game_over).pack(side="left", padx=4) 
+        Button(self.debug_frame, text="DBG: Frame Stats", command=self.print_frame_stats).pack(side="left", padx=4) 
+        Button(self.debug_frame, text="DBG: Profile", command=self.toggle_profiling).pack(side="left", padx=4) 
+        Button(self.debug_frame, text="DBG: Export Profile", command=self.export_profile).pack(side="left", padx=4) 
+        Label(self.debug_frame, textvariable=self.profile_text, font=("courier", 10)).pack(side="left", padx=4) 
+
+    # --- DEBUG function prints animation frame timings --- 
+    def print_frame_stats(self): 
+        print("DEBUG: Frame stats", self.animations.stats()) 
+
+    # --- DEBUG profiling of the move phases and canvas calls --- 
+    # While it is on the canvas is reached through a CallCounter, so every 
+    # canvas call is counted and sampled per animation frame. 
+    def toggle_profiling(self): 
+        prof = profiler.PROFILER 
+        if prof.enabled: 
+            prof.disable() 
+            self.canvas = self.canvas.target 
+            print("DEBUG: Profiling off") 
+        else: 
+            prof.reset() 
+            prof.enable() 
+            self.canvas = profiler.CallCounter(self.canvas, prof, "canvas_ops") 
+            print("DEBUG: Profiling on") 
+        self.renderer.canvas = self.canvas 
+        self.show_profile() 
+
+    def show_profile(self): 
+        prof = profiler.PROFILER 
+        if not prof.enabled: 
+            self.profile_text.set("") 
+            return 
+        self.profile_text.set("ms p50/p99  " + prof.summary(self.PROFILE_PHASES)) 
+
+    def export_profile(self): 
+        base = os.path.join(os.path.expanduser("~"), "2048-profile") 
+        try: 
+            profiler.PROFILER.export_json(base + ".json") 
+            profiler.PROFILER.export_pstats(base + ".prof") 
+            print(f"DEBUG: Profile written to {base}.json and {base}.prof") 
+        except OSError as e: 
+            print(f"ERROR: Failed to write profile! {e}") 
+
     # --- DEBUG console function forces win --- 
     def force_win(self):  
  
         self.canvas.delete("overlay") 
 
-        self.canvas.itemconfigure("tile", state="normal")
+        self.renderer.set_visible(True)
 
-        self.game_board = [
-            [0, 0, 0, 0], 
-            [0, 0, 0, 0], 
-            [0, 0, 0, 0],
-            [0, 0, 0, 2048] 
-        ]
+        rows, columns = self.game.rules.ROWS, self.game.rules.COLS 
+        self.game_board = [[2048 if (r, c) == (rows - 1, columns - 1) else 0 for c in range(columns)] for r in range(rows)] 
         self.score = 0 
+        self.game.resume() 
         self.show_board() 
         self.game_won() 
+        self.record_history() 
 
     # --- DEBUG function forces loose --- 
     def force_game_over(self):
         
         self.canvas.delete("overlay") 
 
-        self.canvas.itemconfigure("tile", state="normal")
+        self.renderer.set_visible(True)
 
-        self.game_board = [
-            [2, 4, 8, 16],
-            [32, 64, 128, 256],
-            [512, 1024, 2, 4],
-            [8, 16, 32, 64]
-    ]
+        # Same pattern as the old fixed 4x4 board, no two neighbours are equal 
+        columns = self.game.rules.COLS 
+        self.game_board = [[2 ** (1 + (r * columns + c) % 10) for c in range(columns)] for r in range(self.game.rules.ROWS)] 
         self.score = 0
+        self.game.resume()
         self.show_board()
         self.game_over()
+        self.record_history()
    
 # --- Run the App --- 
 if __name__ == "__main__": 
-    app = play_2048()
-    app.bind_all('<Key>', app.moves)
+    session = None 
+    if len(sys.argv) > 2 and sys.argv[1] == "--session": 
+        session = sys.argv[2] 
+        if not persistence.valid_session(session): 
+            sys.exit(f"ERROR: Bad session name {session!r}, use letters, digits, - and _") 
+
+    app = play_2048(session=session)
     app.wm_title("2048")
     app.minsize(430, 470)
     app.mainloop()                                     
\ No newline at end of file
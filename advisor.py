@@ -0,0 +1,126 @@
+# --- Background AI for the window's hint and autoplay ---
+# The expectimax search from ai.py runs in a worker process, so it never holds
+# the GIL the Tk event loop and its animations run on. Every request carries a
+# generation number. The window bumps a shared counter whenever the board
+# changes, the search polls it at its chance nodes and drops out as soon as it
+# no longer matches, and results of older generations are never handed out.
+#
+# A hint deepens one level at a time and posts every finished level, so the
+# longer the board stays the same the deeper the hint gets. Autoplay plays the
+# game on in the worker with a shallow search and posts its moves in batches of
+# (direction, spawned cell, spawned tile), the window replays them through its
+# own engine.Game (replay log, history) and draws once per frame.
+# Nothing here imports tkinter, the worker starts as a fresh interpreter.
+
+import multiprocessing
+import queue
+import random
+import time
+
+import ai
+import engine
+
+HINT_MAX_DEPTH = 6
+AUTOPLAY_DEPTH = 1
+BATCH_SECONDS = 0.01
+
+
+class Advisor:
+    def __init__(self, hint_depth=HINT_MAX_DEPTH):
+        self.hint_depth = hint_depth
+        context = multiprocessing.get_context("spawn")
+        self.generation = context.RawValue("Q", 0)
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_worker, args=(self.requests, self.results, self.generation),
+                                       name="2048-advisor", daemon=True)
+        self.process.start()
+
+    # --- Stops whatever the worker is doing, returns the new generation ---
+    def cancel(self):
+        self.generation.value += 1
+        return self.generation.value
+
+    def hint(self, board):
+        generation = self.cancel()
+        self.requests.put(("hint", generation, board, self.hint_depth))
+        return generation
+
+    def autoplay(self, board, score, seed, depth=AUTOPLAY_DEPTH):
+        generation = self.cancel()
+        self.requests.put(("autoplay", generation, board, score, seed, depth))
+        return generation
+
+    # --- Results posted for the current generation so far, never blocks ---
+    # ("hint", generation, depth, direction, value) per finished level,
+    # ("moves", generation, [(direction, cell, value), ...]) and ("done", generation).
+    def poll(self):
+        results = []
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            if result[1] == self.generation.value:
+                results.append(result)
+
+    def close(self):
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout=1.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+# --- Worker process ---
+def _worker(requests, results, generation):
+    heuristic = ai.TableHeuristic().build()
+    while True:
+        request = requests.get()
+        # Only the newest request matters, older ones were cancelled by it
+        while request is not None:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+        if request is None:
+            return
+        kind, current = request[0], request[1]
+        if current != generation.value:
+            continue
+
+        def stop():
+            return generation.value != current
+
+        if kind == "hint":
+            _hint(results, current, stop, heuristic, *request[2:])
+        elif kind == "autoplay":
+            _autoplay(results, current, stop, heuristic, *request[2:])
+
+
+def _hint(results, current, stop, heuristic, board, max_depth):
+    searcher = ai.ExpectimaxAI(heuristic=heuristic, max_depth=max_depth)
+    for depth, direction, value in searcher.deepen(board, stop):
+        results.put(("hint", current, depth, direction, value))
+
+
+def _autoplay(results, current, stop, heuristic, board, score, seed, depth):
+    game = engine.Game(board, score, random.Random(seed))
+    searcher = ai.ExpectimaxAI(heuristic=heuristic, depth=depth)
+    batch = []
+    posted = time.perf_counter()
+    while not stop() and not game.won():
+        direction = searcher.best_move(game.board)
+        if direction is None:
+            break
+        game.move(direction)
+        cell = game.spawn()
+        row, column = cell
+        batch.append((direction, cell, engine.get_tile(game.board, row, column)))
+        if time.perf_counter() - posted > BATCH_SECONDS:
+            results.put(("moves", current, batch))
+            batch = []
+            posted = time.perf_counter()
+    if batch:
+        results.put(("moves", current, batch))
+    results.put(("done", current))
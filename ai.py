@@ -0,0 +1,279 @@
+# --- 2048 expectimax AI ---
+# Searches the player's moves (max nodes) and the tile spawns (chance nodes,
+# a 2 with 6/7 and a 4 with 1/7 on every empty cell, like new_tiles) on the
+# packed boards from engine.py. Heuristics are per row lookup tables, so a
+# board evaluation is eight table lookups.
+
+import time
+from collections import OrderedDict
+
+import engine
+import profiler
+
+SPAWN_TWO_PROBABILITY = engine.NEW_RANDOM_TILES.count(2) / len(engine.NEW_RANDOM_TILES)
+SPAWN_FOUR_PROBABILITY = 1.0 - SPAWN_TWO_PROBABILITY
+
+
+# --- Heuristic built from a 65536 entry row table ---
+# The board value is the sum over its four rows and four columns. Any callable
+# that takes a packed board and returns a float can be used instead.
+class TableHeuristic:
+    def __init__(self, empty=270.0, merges=700.0, monotonicity=47.0, smoothness=0.0,
+                 tile_sum=11.0, monotonicity_power=4.0, sum_power=3.5, lost_penalty=200000.0):
+        self.weights = {
+            "empty": empty,
+            "merges": merges,
+            "monotonicity": monotonicity,
+            "smoothness": smoothness,
+            "tile_sum": tile_sum,
+            "monotonicity_power": monotonicity_power,
+            "sum_power": sum_power,
+            "lost_penalty": lost_penalty,
+        }
+        self.table = None
+
+    def build(self):
+        w = self.weights
+        table = [0.0] * 65536
+        for row in range(65536):
+            line = [(row >> (4 * i)) & 0xF for i in range(4)]
+
+            empty = line.count(0)
+            tile_sum = sum(e ** w["sum_power"] for e in line)
+
+            merges = 0
+            prev = 0
+            counter = 0
+            for e in line:
+                if e == 0:
+                    continue
+                if prev == e:
+                    counter += 1
+                elif counter > 0:
+                    merges += 1 + counter
+                    counter = 0
+                prev = e
+            if counter > 0:
+                merges += 1 + counter
+
+            mono_left = 0.0
+            mono_right = 0.0
+            smooth = 0
+            for i in range(3):
+                a = line[i] ** w["monotonicity_power"]
+                b = line[i + 1] ** w["monotonicity_power"]
+                if line[i] > line[i + 1]:
+                    mono_left += a - b
+                else:
+                    mono_right += b - a
+                if line[i] and line[i + 1]:
+                    smooth += abs(line[i] - line[i + 1])
+
+            table[row] = (w["lost_penalty"] / 8.0
+                          + w["empty"] * empty
+                          + w["merges"] * merges
+                          - w["monotonicity"] * min(mono_left, mono_right)
+                          - w["smoothness"] * smooth
+                          - w["tile_sum"] * tile_sum)
+        self.table = table
+        return self
+
+    def __call__(self, board):
+        table = self.table
+        if table is None:
+            table = self.build().table
+        t = engine.transpose(board)
+        mask = engine.ROW_MASK
+        return (table[board & mask] + table[(board >> 16) & mask]
+                + table[(board >> 32) & mask] + table[(board >> 48) & mask]
+                + table[t & mask] + table[(t >> 16) & mask]
+                + table[(t >> 32) & mask] + table[(t >> 48) & mask])
+
+
+# --- Bounded transposition table with LRU eviction ---
+# Entries are keyed on the packed board and remember the depth they were
+# searched to, a lookup only hits if that depth is deep enough.
+class TranspositionTable:
+    def __init__(self, capacity=200000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def get(self, board, depth):
+        self.lookups += 1
+        entry = self.entries.get(board)
+        if entry is None or entry[0] < depth:
+            return None
+        self.entries.move_to_end(board)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, board, depth, value):
+        entries = self.entries
+        entries[board] = (depth, value)
+        entries.move_to_end(board)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.lookups = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+# --- Expectimax search ---
+# depth counts player moves. With time_limit (seconds) the search deepens one
+# level at a time and returns the best move of the deepest finished level.
+class ExpectimaxAI:
+    def __init__(self, heuristic=None, depth=3, time_limit=None, prob_cutoff=0.0001,
+                 table_size=200000, max_depth=8):
+        self.heuristic = heuristic if heuristic is not None else TableHeuristic()
+        self.depth = depth
+        self.time_limit = time_limit
+        self.prob_cutoff = prob_cutoff
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_size)
+        self.stats = {}
+        self._nodes = 0
+        self._deadline = None
+        self._stop = None
+
+    # --- Counted and timed as "search" when profiling is on ---
+    def best_move(self, board, depth=None, time_limit=None):
+        with profiler.PROFILER.phase("search"):
+            move = self._search(board, depth, time_limit)
+        if profiler.PROFILER.enabled:
+            profiler.PROFILER.count("searches")
+            profiler.PROFILER.count("nodes", self._nodes)
+        return move
+
+    def _search(self, board, depth, time_limit):
+        if time_limit is None and depth is None:
+            time_limit = self.time_limit
+        self.table.reset_stats()
+        self._nodes = 0
+        start = time.perf_counter()
+
+        if time_limit is None:
+            self._deadline = None
+            move, value = self._root(board, depth or self.depth)
+            reached = depth or self.depth
+        else:
+            self._deadline = start + time_limit
+            move, value, reached = None, 0.0, 0
+            for d in range(1, self.max_depth + 1):
+                try:
+                    result = self._root(board, d)
+                except _OutOfTime:
+                    break
+                move, value = result
+                reached = d
+                if move is None:
+                    break
+            if move is None:
+                # Not even depth 1 finished, fall back to the first legal move
+                legal = engine.legal_moves(board)
+                move = legal[0] if legal else None
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            "depth": reached,
+            "nodes": self._nodes,
+            "seconds": elapsed,
+            "nodes_per_sec": self._nodes / elapsed if elapsed > 0 else 0.0,
+            "table_hit_rate": self.table.hit_rate,
+            "table_size": len(self.table.entries),
+            "value": value,
+        }
+        return move
+
+    # --- Yields (depth, move, value) for every finished level, deepest last ---
+    # stop() is polled at the chance nodes like the deadline, the level it
+    # interrupts is dropped. The table carries over from one level to the next.
+    def deepen(self, board, stop, max_depth=None):
+        self.table.reset_stats()
+        self._deadline = None
+        self._stop = stop
+        try:
+            for depth in range(1, (max_depth or self.max_depth) + 1):
+                self._nodes = 0
+                try:
+                    move, value = self._root(board, depth)
+                except _OutOfTime:
+                    return
+                if move is None:
+                    return
+                yield depth, move, value
+        finally:
+            self._stop = None
+
+    def _root(self, board, depth):
+        best_move, best_value = None, float("-inf")
+        for direction in engine.DIRECTIONS:
+            new_board = engine.move(board, direction)[0]
+            if new_board == board:
+                continue
+            value = self._chance(new_board, depth - 1, 1.0)
+            if value > best_value:
+                best_move, best_value = direction, value
+        return best_move, best_value
+
+    def _max(self, board, depth, prob):
+        self._nodes += 1
+        best = 0.0
+        for direction in engine.DIRECTIONS:
+            new_board = engine.move(board, direction)[0]
+            if new_board != board:
+                value = self._chance(new_board, depth - 1, prob)
+                if value > best:
+                    best = value
+        return best
+
+    def _chance(self, board, depth, prob):
+        if depth <= 0 or prob < self.prob_cutoff:
+            # Leaves count too, or a depth 1 search would report no nodes at all
+            self._nodes += 1
+            return self.heuristic(board)
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _OutOfTime()
+        if self._stop is not None and self._stop():
+            raise _OutOfTime()
+
+        cached = self.table.get(board, depth)
+        if cached is not None:
+            return cached
+
+        self._nodes += 1
+        mask = engine.empty_mask(board)
+        empty = engine.popcount(mask)
+        prob /= empty
+        two_prob = prob * SPAWN_TWO_PROBABILITY
+        four_prob = prob * SPAWN_FOUR_PROBABILITY
+
+        # The low bit of an empty nibble is exactly a 2 there, shifted once a 4
+        total = 0.0
+        while mask:
+            low = mask & -mask
+            total += SPAWN_TWO_PROBABILITY * self._max(board | low, depth, two_prob)
+            total += SPAWN_FOUR_PROBABILITY * self._max(board | (low << 1), depth, four_prob)
+            mask ^= low
+        value = total / empty
+
+        self.table.put(board, depth, value)
+        return value
+
+
+# --- Convenience wrapper for one off calls ---
+def best_move(board, depth=3, time_limit=None):
+    return ExpectimaxAI(depth=depth, time_limit=time_limit).best_move(board)
@@ -0,0 +1,211 @@
+# --- 2048 batch engine ---
+# Holds N packed boards in a uint64 NumPy array and moves all of them in one
+# call using the same row tables as engine.py. Vertical moves are handled by
+# transposing the boards, so a per-board direction vector needs no Python loop.
+
+import numpy as np
+
+import engine
+
+# --- Direction indices match engine.DIRECTIONS ---
+UP, RIGHT, DOWN, LEFT = range(4)
+SPAWN_FOUR_PROBABILITY = engine.NEW_RANDOM_TILES.count(4) / len(engine.NEW_RANDOM_TILES)
+
+_U = np.uint64
+_BOARD = np.dtype("<u8")
+_ROW = np.dtype("<u2")
+
+# Left rows in the first half, right rows in the second half
+_MOVE_TABLE = np.array(engine.ROW_LEFT + engine.ROW_RIGHT, dtype=_ROW)
+_MERGE_TABLE = np.array(engine.ROW_LEFT_MERGES + engine.ROW_RIGHT_MERGES, dtype=np.uint16)
+_SCORE_TABLE = np.array(engine.ROW_SCORE + engine.ROW_SCORE, dtype=np.uint32)
+_EMPTY_TABLE = np.array(engine.ROW_EMPTY, dtype=np.uint8)
+_PAIR_TABLE = np.array(engine.ROW_HAS_PAIR, dtype=bool)
+
+# 4 bit mask of the empty cells of a row, popcount and select for 16 bit masks
+# (all built with array operations, a Python loop over 65536 values per table
+# would dominate the import)
+_VALUES = np.arange(65536, dtype=np.uint32)
+_ROW_EMPTY_MASK = np.zeros(65536, dtype=np.uint16)
+for _i in range(4):
+    _ROW_EMPTY_MASK |= (((_VALUES >> (4 * _i)) & 0xF) == 0).astype(np.uint16) << _i
+_POPCOUNT = np.zeros(65536, dtype=np.uint8)
+for _bit in range(16):
+    _POPCOUNT += ((_VALUES >> _bit) & 1).astype(np.uint8)
+_SELECT = np.zeros((65536, 16), dtype=np.uint8)
+for _bit in range(16):
+    _below = _POPCOUNT[_VALUES & ((1 << _bit) - 1)]
+    _has = (_VALUES >> _bit) & 1 == 1
+    _SELECT[_has, _below[_has]] = _bit
+_SELECT = _SELECT.reshape(-1)
+
+# Transposes a 16 bit cell mask, used for the merges of vertical moves
+_MASK_TRANSPOSE = np.zeros(65536, dtype=np.uint16)
+for _bit in range(16):
+    _MASK_TRANSPOSE |= ((_VALUES >> _bit) & 1).astype(np.uint16) << ((_bit & 3) * 4 + (_bit >> 2))
+del _i, _bit, _below, _has, _VALUES
+_NIBBLE_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+# Boards are processed in blocks so the temporaries stay in cache
+_CHUNK = 16384
+
+
+# --- Vectorized transpose, same bit trick as engine.transpose ---
+def transpose(boards):
+    a = boards & _U(0xF0F00F0FF0F00F0F)
+    t = boards & _U(0x0000F0F00000F0F0)
+    t <<= _U(12)
+    a |= t
+    np.bitwise_and(boards, _U(0x0F0F00000F0F0000), out=t)
+    t >>= _U(12)
+    a |= t
+    b = a & _U(0xFF00FF0000FF00FF)
+    np.bitwise_and(a, _U(0x00FF00FF00000000), out=t)
+    t >>= _U(24)
+    b |= t
+    np.bitwise_and(a, _U(0x00000000FF00FF00), out=t)
+    t <<= _U(24)
+    b |= t
+    return b
+
+
+# --- View each board as its four 16 bit rows, no copy ---
+def _rows(boards):
+    return np.ascontiguousarray(boards, dtype=_BOARD).view(_ROW).reshape(-1, 4)
+
+
+# --- Move every board, direction is one index or an array of indices ---
+# Returns (new_boards, score_deltas, merge_masks, moved), merge masks use the
+# engine cell numbering (bit row*4 + column).
+def move(boards, direction):
+    boards = np.ascontiguousarray(boards, dtype=_BOARD)
+    direction = np.asarray(direction)
+    n = boards.shape[0]
+    new_boards = np.empty_like(boards)
+    score = np.empty(n, dtype=np.uint32)
+    merges = np.empty(n, dtype=np.uint16)
+
+    if direction.ndim == 0:
+        _move_block(boards, int(direction), new_boards, score, merges)
+        return new_boards, score, merges, new_boards != boards
+
+    # Move each direction's boards as one block and scatter them back
+    for d in range(4):
+        index = np.flatnonzero(direction == d)
+        if index.size == 0:
+            continue
+        block_boards = np.empty(index.size, dtype=_BOARD)
+        block_score = np.empty(index.size, dtype=np.uint32)
+        block_merges = np.empty(index.size, dtype=np.uint16)
+        _move_block(boards[index], d, block_boards, block_score, block_merges)
+        new_boards[index] = block_boards
+        score[index] = block_score
+        merges[index] = block_merges
+    return new_boards, score, merges, new_boards != boards
+
+
+def _move_block(boards, d, out_boards, out_score, out_merges):
+    vertical = d in (UP, DOWN)
+    offset = 65536 if d in (RIGHT, DOWN) else 0
+
+    for lo in range(0, boards.shape[0], _CHUNK):
+        hi = lo + _CHUNK
+        chunk = boards[lo:hi]
+        rows = _rows(transpose(chunk) if vertical else chunk)
+        if offset:
+            rows = rows.astype(np.intp) + offset
+
+        moved_rows = _MOVE_TABLE[rows].view(_BOARD).reshape(-1)
+        row_scores = _SCORE_TABLE[rows]
+        out_score[lo:hi] = row_scores[:, 0] + row_scores[:, 1] + row_scores[:, 2] + row_scores[:, 3]
+        row_merges = _MERGE_TABLE[rows]
+        merges = row_merges[:, 0] | (row_merges[:, 1] << 4) | (row_merges[:, 2] << 8) | (row_merges[:, 3] << 12)
+
+        if vertical:
+            out_boards[lo:hi] = transpose(moved_rows)
+            out_merges[lo:hi] = _MASK_TRANSPOSE[merges]
+        else:
+            out_boards[lo:hi] = moved_rows
+            out_merges[lo:hi] = merges
+
+
+# --- 16 bit mask of the empty cells per board, bit row*4 + column ---
+def empty_masks(boards):
+    masks = _ROW_EMPTY_MASK[_rows(boards)]
+    return masks[:, 0] | (masks[:, 1] << 4) | (masks[:, 2] << 8) | (masks[:, 3] << 12)
+
+
+# --- Count empty cells per board ---
+def count_empty(boards):
+    counts = _EMPTY_TABLE[_rows(boards)]
+    return counts[:, 0] + counts[:, 1] + counts[:, 2] + counts[:, 3]
+
+
+# --- Legal move mask with shape (N, 4) in DIRECTIONS order ---
+def legal_moves(boards):
+    boards = np.ascontiguousarray(boards, dtype=_BOARD)
+    return np.stack([move(boards, d)[3] for d in range(4)], axis=1)
+
+
+# --- A board is over when it is full and no row or column has a pair ---
+# Only the full boards get the pair lookups. empty can be passed in when the
+# caller already has the masks.
+def is_game_over(boards, empty=None):
+    boards = np.ascontiguousarray(boards, dtype=_BOARD)
+    if empty is None:
+        empty = empty_masks(boards)
+    over = np.zeros(boards.shape[0], dtype=bool)
+    full = np.flatnonzero(empty == 0)
+    if full.size:
+        full_boards = boards[full]
+        pairs = _PAIR_TABLE[_rows(full_boards)].any(axis=1) | _PAIR_TABLE[_rows(transpose(full_boards))].any(axis=1)
+        over[full] = ~pairs
+    return over
+
+
+# --- Spawn one tile on every board that has room ---
+# Same distribution as new_random_tiles: a 2 six times out of seven, a 4
+# otherwise, on a uniformly chosen empty cell. Returns (boards, cells) where
+# cells is the spawned cell index (row*4 + column) or -1 for full boards.
+# The cell is the pick-th set bit of the empty mask, looked up in _SELECT.
+def spawn(boards, rng=None, empty=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    boards = np.ascontiguousarray(boards, dtype=_BOARD)
+    n = boards.shape[0]
+    if empty is None:
+        empty = empty_masks(boards)
+
+    masks = empty.astype(np.intp)
+    counts = _POPCOUNT[masks]
+    has_room = counts > 0
+
+    pick = (rng.random(n) * counts).astype(np.intp)
+    cells = _SELECT[masks * 16 + pick].astype(np.uint64)
+    exponents = (rng.random(n) < SPAWN_FOUR_PROBABILITY).astype(np.uint64) + _U(1)
+
+    spawned = boards | (exponents << (cells * _U(4)))
+    return np.where(has_room, spawned, boards), np.where(has_room, cells.astype(np.int64), -1)
+
+
+# --- Fresh boards with two 2 tiles, like new_game ---
+def new_boards(n, rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    boards = np.zeros(n, dtype=np.uint64)
+    for _ in range(2):
+        empty = ((boards[:, None] >> _NIBBLE_SHIFTS) & _U(0xF)) == 0
+        pick = (rng.random(n) * empty.sum(axis=1)).astype(np.int64)
+        cells = np.argmax(np.cumsum(empty, axis=1) > pick[:, None], axis=1)
+        boards |= _U(1) << (cells.astype(np.uint64) * _U(4))
+    return boards
+
+
+# --- Helpers to move between the batch and packed Python ints ---
+def from_ints(boards):
+    return np.array(boards, dtype=np.uint64)
+
+
+def to_ints(boards):
+    return [int(b) for b in boards]
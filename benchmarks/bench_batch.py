@@ -0,0 +1,86 @@
+# --- Batch engine benchmark ---
+# Checks batch.move against engine.reference_move (the process_line rules) on
+# random boards, then times board-moves per second.
+# Run from the repo root: python -m benchmarks.bench_batch
+
+import argparse
+import time
+
+import numpy as np
+
+import batch
+import engine
+
+
+# --- Random boards with a realistic spread of tiles ---
+def random_boards(n, rng):
+    exponents = rng.choice(np.arange(12), size=(n, 16), p=[0.3] + [0.7 / 11] * 11).astype(np.uint64)
+    return (exponents << batch._NIBBLE_SHIFTS).sum(axis=1, dtype=np.uint64)
+
+
+# --- Compare every direction against the scalar reference ---
+def check(n, seed):
+    rng = np.random.default_rng(seed)
+    boards = random_boards(n, rng)
+    directions = rng.integers(0, 4, size=n)
+
+    for label, d in [("per-board", directions)] + [(name, i) for i, name in enumerate(engine.DIRECTIONS)]:
+        new_boards, scores, merges, moved = batch.move(boards, d)
+        for k in range(n):
+            direction = engine.DIRECTIONS[int(directions[k]) if np.ndim(d) else d]
+            grid = engine.unpack(int(boards[k]))
+            expected, expected_score, expected_merges = engine.reference_move(grid, direction, engine.MAX_TILE)
+            assert engine.unpack(int(new_boards[k])) == expected, (label, grid)
+            assert int(scores[k]) == expected_score, (label, grid)
+            assert engine.mask_cells(int(merges[k])) == expected_merges, (label, grid)
+            assert bool(moved[k]) == (expected != grid), (label, grid)
+
+    spawned, cells = batch.spawn(boards, rng)
+    for k in range(n):
+        grid = engine.unpack(int(boards[k]))
+        after = engine.unpack(int(spawned[k]))
+        if cells[k] < 0:
+            assert after == grid
+            continue
+        r, c = divmod(int(cells[k]), 4)
+        assert grid[r][c] == 0 and after[r][c] in (2, 4)
+        after[r][c] = 0
+        assert after == grid
+    print(f"check: {n} boards x 5 direction sets match reference_move")
+
+
+# --- Time moves on N boards ---
+def bench(n, repeats, seed):
+    rng = np.random.default_rng(seed)
+    boards = random_boards(n, rng)
+    directions = rng.integers(0, 4, size=n)
+
+    for label, d in (("one direction per call", None), ("per-board directions", directions)):
+        batch.move(boards, directions)
+        start = time.perf_counter()
+        for i in range(repeats):
+            batch.move(boards, i % 4 if d is None else d)
+        elapsed = time.perf_counter() - start
+        print(f"{label}: {n * repeats / elapsed / 1e6:.1f}M board-moves/s (N={n})")
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        batch.spawn(boards, rng)
+    elapsed = time.perf_counter() - start
+    print(f"spawn: {n * repeats / elapsed / 1e6:.1f}M spawns/s (N={n})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch 2048 engine")
+    parser.add_argument("--boards", type=int, default=100000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--check", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=2048)
+    args = parser.parse_args()
+
+    check(args.check, args.seed)
+    bench(args.boards, args.repeats, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# --- Environment benchmark ---
+# Times VecEnv.step with random actions for a few batch sizes and every
+# observation type, and the single game Env for comparison.
+# Run from the repo root: python -m benchmarks.bench_env
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+import env
+
+
+def bench_vec(num_envs, steps, observation, seed):
+    vec = env.VecEnv(num_envs, seed=seed, observation=observation)
+    vec.reset()
+    rng = np.random.default_rng(seed)
+    actions = [rng.integers(0, 4, size=num_envs) for _ in range(steps)]
+    vec.step(actions[0])
+
+    start = time.perf_counter()
+    for a in actions:
+        vec.step(a)
+    return num_envs * steps / (time.perf_counter() - start)
+
+
+def bench_single(steps, seed):
+    game = env.Env(seed=seed)
+    game.reset()
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for _ in range(steps):
+        _, _, done, _ = game.step(rng.randrange(4))
+        if done:
+            game.reset()
+    return steps / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the 2048 RL environments")
+    parser.add_argument("--envs", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=2048)
+    args = parser.parse_args()
+
+    print(f"{'envs':>8}  {'observation':<12} {'steps/s':>14}")
+    for n in args.envs:
+        for observation in env.OBSERVATIONS:
+            rate = bench_vec(n, args.steps, observation, args.seed)
+            print(f"{n:>8}  {observation:<12} {rate:>14,.0f}")
+    print(f"{'Env':>8}  {'packed':<12} {bench_single(20000, args.seed):>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
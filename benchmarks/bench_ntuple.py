@@ -0,0 +1,52 @@
+# --- N-tuple evaluation benchmark ---
+# Times NTupleNetwork evaluations on positions from random games: one board at
+# a time (what the search uses) and evaluate_batch over many boards.
+# Run from the repo root: python -m benchmarks.bench_ntuple --tuples small
+
+import argparse
+import time
+
+import numpy as np
+
+import env
+import ntuple
+
+
+def sample_boards(n, steps, seed):
+    vec = env.VecEnv(n, seed=seed)
+    vec.reset()
+    rng = np.random.default_rng(seed)
+    for _ in range(steps):
+        vec.step(rng.integers(0, 4, size=n))
+    return vec.boards.copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark n-tuple network evaluation")
+    parser.add_argument("--tuples", choices=sorted(ntuple.TUPLE_SETS), default="default")
+    parser.add_argument("--weights", help="weight file to map instead of random weights")
+    parser.add_argument("--boards", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=2048)
+    args = parser.parse_args()
+
+    if args.weights:
+        network = ntuple.NTupleNetwork.open(args.weights)
+    else:
+        network = ntuple.NTupleNetwork(ntuple.TUPLE_SETS[args.tuples])
+        network.weights()[:] = np.random.default_rng(args.seed).standard_normal(network.size, dtype=np.float32)
+    boards = sample_boards(args.boards, 300, args.seed)
+
+    scalar = [int(b) for b in boards[:20000]]
+    start = time.perf_counter()
+    for b in scalar:
+        network(b)
+    print(f"scalar: {len(scalar) / (time.perf_counter() - start):,.0f} evaluations/s")
+
+    network.evaluate_batch(boards[:1000])
+    start = time.perf_counter()
+    network.evaluate_batch(boards)
+    print(f"batch:  {len(boards) / (time.perf_counter() - start):,.0f} evaluations/s (N={len(boards)})")
+
+
+if __name__ == "__main__":
+    main()
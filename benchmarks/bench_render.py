@@ -0,0 +1,59 @@
+# --- Headless rendering benchmark ---
+# Frames per second of the SVG and raster backends on boards from greedy
+# games, drawn once (every board new) and through FrameCache over a replay
+# that repeats every position a few times.
+# Run from the repo root: python -m benchmarks.bench_render --cell-size 40
+
+import argparse
+import time
+
+import engine
+import render
+import selfplay
+
+
+def sample_boards(games, seed):
+    samples = []
+    for s in range(seed, seed + games):
+        game = engine.Game()
+        game.new_game(s)
+        choose = selfplay.make_policy("greedy", s)
+        while not game.over():
+            game.move(choose(game.board))
+            game.spawn()
+            samples.append(game.board)
+    return samples
+
+
+def rate(draw, boards):
+    start = time.perf_counter()
+    for board in boards:
+        draw(board)
+    return len(boards) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark headless 2048 rendering")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=2048)
+    parser.add_argument("--cell-size", type=int, default=100)
+    args = parser.parse_args()
+
+    boards = sample_boards(args.games, args.seed)
+    padding = max(2, args.cell_size // 10)
+    svg = render.SVGBackend(engine, args.cell_size, padding)
+    raster = render.RasterBackend(engine, args.cell_size, padding)
+
+    print(f"{len(boards)} boards, {args.cell_size}px cells")
+    print(f"  svg         {rate(svg.draw, boards):>10,.0f} frames/s")
+    print(f"  raster rgb  {rate(raster.draw, boards):>10,.0f} frames/s")
+    print(f"  raster png  {rate(raster.png, boards):>10,.0f} frames/s")
+
+    replayed = boards * 4
+    for fmt in render.FORMATS:
+        cache = render.frame_cache(fmt, engine, args.cell_size, padding)
+        print(f"  {fmt + ' cached':<11} {rate(cache.get, replayed):>10,.0f} frames/s ({cache.hits} hits, {cache.misses} drawn)")
+
+
+if __name__ == "__main__":
+    main()
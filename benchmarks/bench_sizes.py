@@ -0,0 +1,81 @@
+# --- Board size benchmark ---
+# Checks the engine for every board size against engine.reference_move, then
+# times moves per second per size on positions taken from random games.
+# Run from the repo root: python -m benchmarks.bench_sizes --sizes 3x3 4x4 8x8
+
+import argparse
+import random
+import time
+
+import boards
+import engine
+
+DEFAULT_SIZES = ("3x3", "4x4", "5x5", "6x6", "7x7", "8x8", "4x6", "6x4")
+
+
+# --- Positions from random games, so tables see realistic lines ---
+def sample_boards(rules, n, rng):
+    samples = []
+    game = engine.Game(rules=rules)
+    while len(samples) < n:
+        game.new_game(rng.getrandbits(32))
+        while not game.over() and len(samples) < n:
+            samples.append(game.board)
+            legal = rules.legal_moves(game.board)
+            game.move(rng.choice(legal))
+            game.spawn()
+    return samples
+
+
+# --- Compare every direction against the list based reference ---
+def check(rules, samples):
+    # Only the nibble board has a largest tile, the byte per cell engines don't
+    limit = engine.MAX_TILE if rules is engine else None
+    for board in samples:
+        grid = rules.unpack(board)
+        for direction in engine.DIRECTIONS:
+            expected, expected_score, expected_merges = engine.reference_move(grid, direction, limit)
+            new_board, score, merges = rules.move_with_merges(board, direction)
+            assert rules.unpack(new_board) == expected, (direction, grid)
+            assert score == expected_score, (direction, grid)
+            assert sorted(rules.mask_cells(merges)) == expected_merges, (direction, grid)
+
+
+def bench(rules, samples, repeats):
+    move = rules.move
+    for board in samples:
+        for direction in engine.DIRECTIONS:
+            move(board, direction)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for direction in engine.DIRECTIONS:
+            for board in samples:
+                move(board, direction)
+    elapsed = time.perf_counter() - start
+    return len(samples) * 4 * repeats / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark 2048 moves for every board size")
+    parser.add_argument("--sizes", nargs="*", default=DEFAULT_SIZES)
+    parser.add_argument("--boards", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--check", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=2048)
+    args = parser.parse_args()
+
+    print(f"{'size':>6}  {'engine':<12} {'moves/s':>12}")
+    for size in args.sizes:
+        rows, columns = boards.parse_size(size)
+        rules = boards.rules_for(rows, columns)
+        rng = random.Random(f"{args.seed}:{size}")
+        samples = sample_boards(rules, args.boards, rng)
+        check(rules, samples[:args.check])
+        rate = bench(rules, samples, args.repeats)
+        kind = "bitboard" if rules is engine else "line tables"
+        print(f"{size:>6}  {kind:<12} {rate:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
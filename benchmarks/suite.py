@@ -0,0 +1,504 @@
+# --- Benchmark suite ---
+# Fixed-seed workloads over the engine, the persistence layer and (with a
+# display) the Tk renderer, written as JSON so runs can be compared:
+#
+#   move_latency   engine.move per direction on an empty, a start, a mid-game
+#                  and the force_game_over dead board
+#   random_play    whole random games on engine.Game, moves and games per second
+#   game_over      is_game_over on dead, full, nearly full and mid-game boards
+#   spawn          engine.spawn with 1, 2, 4 and 16 empty cells
+#   persistence    JSON and binary encode/decode, atomic file save/load, store
+#                  save + flush
+#   canvas         BoardRenderer.draw on a real Tk canvas, skipped without a display
+#   startup        headless imports in a fresh interpreter (which must not load
+#                  tkinter) and, with a display, the window's time to first frame
+#   check          differential check of the bitboard engine, the 4x4 line engine
+#                  and batch.py against engine.reference_move (process_line rules)
+#
+# Run from the repo root:
+#   python -m benchmarks.suite --out results.json
+#   python -m benchmarks.suite --quick --compare results.json
+#   python -m benchmarks.suite --only check --check 5000000
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import boards
+import engine
+import persistence
+import selfplay
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEAD_BOARD = engine.pack([[2 ** (1 + (r * engine.COLS + c) % 10) for c in range(engine.COLS)] for r in range(engine.ROWS)])
+
+
+# --- Nanoseconds per call, best of `repeats` runs of `number` calls ---
+def time_ns(func, args_list, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for args in args_list:
+            func(*args)
+        elapsed = (time.perf_counter_ns() - start) / len(args_list)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def game_board(seed, moves):
+    game = engine.Game()
+    game.new_game(seed)
+    choose = selfplay.make_policy("greedy", seed)
+    for _ in range(moves):
+        if game.over():
+            break
+        game.move(choose(game.board))
+        game.spawn()
+    return game.board
+
+
+# --- A live position: played until a `tile` with `empty` free cells, next seed if the game ends first ---
+def mid_game_board(seed, tile=256, empty=4):
+    for attempt in range(seed, seed + 100):
+        game = engine.Game()
+        game.new_game(attempt)
+        choose = selfplay.make_policy("greedy", attempt)
+        while not game.over():
+            if engine.max_tile(game.board) >= tile and engine.count_empty(game.board) >= empty:
+                assert not engine.is_game_over(game.board)
+                return game.board
+            game.move(choose(game.board))
+            game.spawn()
+    raise RuntimeError(f"no game from seed {seed} reached {tile} with {empty} empty cells")
+
+
+def with_empty_cells(seed, empty):
+    rng = random.Random(seed)
+    cells = rng.sample(range(16), 16 - empty)
+    return sum(rng.randint(1, 11) << (4 * c) for c in cells)
+
+
+# --- Workloads, each returns a dict of numbers ---
+def bench_move_latency(args):
+    positions = {
+        "empty": 0,
+        "start": game_board(args.seed, 0),
+        "mid_game": mid_game_board(args.seed),
+        "dead": DEAD_BOARD,
+    }
+    number = 2000 if args.quick else 20000
+    result = {}
+    for name, board in positions.items():
+        per_direction = {d: time_ns(engine.move, [(board, d)] * number) for d in engine.DIRECTIONS}
+        grid = engine.unpack(board)
+        result[name] = {
+            "board": hex(board),
+            "ns": per_direction,
+            "mean_ns": sum(per_direction.values()) / 4,
+            "reference_ns": time_ns(engine.reference_move, [(grid, d) for d in engine.DIRECTIONS] * (number // 40)),
+        }
+    return result
+
+
+def bench_random_play(args):
+    games = 20 if args.quick else 200
+    start = time.perf_counter()
+    moves = 0
+    for seed in range(args.seed, args.seed + games):
+        moves += selfplay.play_game(seed, "random")["moves"]
+    elapsed = time.perf_counter() - start
+    return {"games": games, "moves": moves, "seconds": elapsed,
+            "moves_per_sec": moves / elapsed, "games_per_sec": games / elapsed}
+
+
+def bench_game_over(args):
+    positions = {
+        "dead": DEAD_BOARD,
+        "full_with_pair": DEAD_BOARD ^ (DEAD_BOARD & 0xF) ^ ((DEAD_BOARD >> 4) & 0xF),
+        "one_empty": with_empty_cells(args.seed, 1),
+        "mid_game": mid_game_board(args.seed),
+    }
+    number = 5000 if args.quick else 50000
+    result = {name: {"board": hex(board), "ns": time_ns(engine.is_game_over, [(board,)] * number)}
+              for name, board in positions.items()}
+    game = engine.Game(DEAD_BOARD)
+    result["game_over_method_ns"] = time_ns(game.over, [()] * number)
+    return result
+
+
+def bench_spawn(args):
+    rng = random.Random(args.seed)
+    number = 5000 if args.quick else 50000
+    result = {}
+    for empty in (1, 2, 4, 16):
+        board = with_empty_cells(args.seed + empty, empty)
+        result[f"empty_{empty}"] = {"board": hex(board), "ns": time_ns(engine.spawn, [(board, rng)] * number)}
+    return result
+
+
+def bench_persistence(args):
+    state = {"high_score": 123456, "score": 65432, "last_spawned_tile": (1, 2),
+             "board": engine.unpack(game_board(args.seed, 300))}
+    number = 500 if args.quick else 5000
+
+    def json_round_trip():
+        persistence.decode(persistence.encode_json(state))
+
+    def binary_round_trip():
+        persistence.decode(persistence.encode_binary(state))
+
+    result = {
+        "json_bytes": len(persistence.encode_json(state)),
+        "json_round_trip_ns": time_ns(json_round_trip, [()] * number),
+        "binary_round_trip_ns": time_ns(binary_round_trip, [()] * number),
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "gamestate.json")
+        raw = persistence.encode_json(state)
+        files = 20 if args.quick else 200
+
+        def file_round_trip():
+            persistence.write_atomic(path, raw)
+            assert persistence.read_state(path) is not None
+
+        result["file_round_trip_ns"] = time_ns(file_round_trip, [()] * files, repeats=3)
+
+        store = persistence.GameStateStore(os.path.join(folder, "store.json"), delay=0.0)
+
+        def store_round_trip():
+            store.save(state)
+            store.flush()
+
+        result["store_save_flush_ns"] = time_ns(store_round_trip, [()] * files, repeats=3)
+        store.close()
+    return result
+
+
+# --- Redraw cost on a real canvas, needs a display (or Xvfb) ---
+def bench_canvas(args):
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        return {"skipped": "no display"}
+    try:
+        import tkinter
+        from tkinter import font as tkfont
+
+        import Main
+        import render
+
+        root = tkinter.Tk()
+    except Exception as e:
+        return {"skipped": f"{type(e).__name__}: {e}"}
+
+    try:
+        canvas = tkinter.Canvas(root, width=410, height=410)
+        canvas.pack()
+
+        class App:
+            pass
+
+        app = App()
+        app.canvas = canvas
+        app.make_font = lambda family, size, weight="normal": tkfont.Font(root, family=family, size=size, weight=weight)
+        app.create_rounded_rectangle = lambda *a, **kw: Main.play_2048.create_rounded_rectangle(app, *a, **kw)
+        app.rounded_points = render.rounded_points
+
+        game = engine.Game()
+        game.new_game(args.seed)
+        choose = selfplay.make_policy("greedy", args.seed)
+        frames = []
+        while not game.over() and len(frames) < (100 if args.quick else 1000):
+            game.move(choose(game.board))
+            game.spawn()
+            frames.append(game.board)
+
+        start = time.perf_counter()
+        renderer = Main.BoardRenderer(app, canvas)
+        renderer.draw(frames[0])
+        root.update_idletasks()
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for board in frames:
+            renderer.draw(board)
+            root.update_idletasks()
+        elapsed = time.perf_counter() - start
+        return {"frames": len(frames), "build_ns": build * 1e9, "redraw_ns": elapsed * 1e9 / len(frames),
+                "redraws_per_sec": len(frames) / elapsed}
+    finally:
+        root.destroy()
+
+
+# --- Startup in fresh interpreters, HOME points at an empty folder ---
+HEADLESS_MODULES = ("engine", "boards", "ai", "selfplay", "server", "statsdb", "dataset", "render")
+_IMPORT_CODE = ("import sys, time; start = time.perf_counter(); import {module}; "
+                "print(time.perf_counter() - start, 'tkinter' in sys.modules)")
+_WINDOW_CODE = """
+import Main, profiler
+app = Main.play_2048()
+def done():
+    if app.loading:
+        return app.after(1, done)
+    samples = profiler.PROFILER.histograms
+    print(samples["first_frame_ms"].samples[-1], samples["startup_ms"].samples[-1])
+    app.destroy()
+app.after(1, done)
+app.mainloop()
+"""
+
+
+def run_python(code, home):
+    env = dict(os.environ, HOME=home)
+    done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT, env=env, timeout=60)
+    if done.returncode != 0:
+        raise RuntimeError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else f"exit {done.returncode}")
+    return done.stdout.split()
+
+
+def bench_startup(args):
+    repeats = 3 if args.quick else 10
+    result = {"import_ns": {}, "pulls_tkinter": []}
+    with tempfile.TemporaryDirectory() as home:
+        # The first import after an engine change rebuilds the table cache
+        run_python(_IMPORT_CODE.format(module="engine"), home)
+        for module in HEADLESS_MODULES:
+            times = []
+            for _ in range(repeats):
+                seconds, tk = run_python(_IMPORT_CODE.format(module=module), home)
+                times.append(float(seconds))
+            if tk == "True":
+                result["pulls_tkinter"].append(module)
+            result["import_ns"][module] = min(times) * 1e9
+
+        if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+            result["window"] = {"skipped": "no display"}
+            return result
+        try:
+            frames = [run_python(_WINDOW_CODE, home) for _ in range(repeats)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            result["window"] = {"skipped": f"{type(e).__name__}: {e}"}
+            return result
+        result["window"] = {"first_frame_ns": min(float(f) for f, _ in frames) * 1e6,
+                            "startup_ns": min(float(s) for _, s in frames) * 1e6}
+    return result
+
+
+# --- Differential check ---
+def random_board(rng):
+    kind = rng.random()
+    if kind < 0.05:
+        return 0
+    if kind < 0.15:
+        # Full boards, with many equal neighbours
+        return sum(rng.randint(1, 4) << (4 * c) for c in range(16))
+    top = rng.randint(2, 15)
+    return sum((rng.randint(1, top) if rng.random() < 0.6 else 0) << (4 * c) for c in range(16))
+
+
+# --- Every possible line against process_line, in all four directions ---
+def check_lines():
+    errors = []
+    for row in range(65536):
+        line = [(1 << ((row >> (4 * i)) & 0xF)) if (row >> (4 * i)) & 0xF else 0 for i in range(4)]
+        expected, expected_score, _ = engine.process_line(line, engine.MAX_TILE)
+        expected_reversed, reversed_score, _ = engine.process_line(line[::-1], engine.MAX_TILE)
+        for direction, board, extract, want, score in (
+            ("Left", row, lambda b: b & 0xFFFF, expected, expected_score),
+            ("Right", row, lambda b: b & 0xFFFF, expected_reversed[::-1], reversed_score),
+            ("Up", engine.transpose(row), lambda b: engine.transpose(b) & 0xFFFF, expected, expected_score),
+            ("Down", engine.transpose(row), lambda b: engine.transpose(b) & 0xFFFF, expected_reversed[::-1], reversed_score),
+        ):
+            new_board, gained = engine.move(board, direction)
+            got = [engine.get_tile(extract(new_board), 0, i) for i in range(4)]
+            if got != want or gained != score:
+                errors.append(f"line {line} {direction}: {got} +{gained}, expected {want} +{score}")
+    return errors
+
+
+def _check_chunk(seed, count):
+    try:
+        import numpy as np
+
+        import batch
+    except ImportError:
+        np = batch = None
+    line_engine = boards.LineEngine(engine.ROWS, engine.COLS)
+    rng = random.Random(seed)
+    samples = [random_board(rng) for _ in range(count)]
+    errors = []
+
+    batched = {}
+    if batch is not None:
+        packed = np.array(samples, dtype=np.uint64)
+        for i, direction in enumerate(engine.DIRECTIONS):
+            new_boards, scores, merges, _ = batch.move(packed, i)
+            batched[direction] = (new_boards.tolist(), scores.tolist(), merges.tolist())
+
+    for k, board in enumerate(samples):
+        grid = engine.unpack(board)
+        line_board = line_engine.pack(grid)
+        for direction in engine.DIRECTIONS:
+            # The nibble boards stop at MAX_TILE, the byte per cell engine doesn't
+            expected, score, merges = engine.reference_move(grid, direction, engine.MAX_TILE)
+            expected_line, line_score, line_merges = engine.reference_move(grid, direction)
+            expected_board = engine.pack(expected)
+            results = [
+                ("engine", engine, expected_board, score, merges) + engine.move_with_merges(board, direction),
+                ("line", line_engine, line_engine.pack(expected_line), line_score, line_merges)
+                + line_engine.move_with_merges(line_board, direction),
+            ]
+            if batched:
+                new_boards, scores, masks = batched[direction]
+                results.append(("batch", engine, expected_board, score, merges, new_boards[k], scores[k], masks[k]))
+            for name, rules, want, score, merges, new_board, gained, mask in results:
+                if (new_board != want or gained != score
+                        or (mask or merges) and sorted(rules.mask_cells(mask)) != merges):
+                    errors.append(f"{name} {hex(board)} {direction}")
+    return count, errors, batch is not None
+
+
+def differential_check(count, seed, workers=None):
+    start = time.perf_counter()
+    errors = check_lines()
+    workers = workers or os.cpu_count() or 1
+    chunk = 20000
+    seeds = [(f"{seed}:{i}", min(chunk, count - i)) for i in range(0, count, chunk)]
+    checked = 0
+    with_batch = False
+    if workers == 1 or len(seeds) == 1:
+        results = [_check_chunk(s, n) for s, n in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_check_chunk, *zip(*seeds)))
+    for n, chunk_errors, used_batch in results:
+        checked += n
+        errors.extend(chunk_errors)
+        with_batch = with_batch or used_batch
+    elapsed = time.perf_counter() - start
+    return {"lines": 65536, "boards": checked, "engines": ["engine", "line"] + (["batch"] if with_batch else []),
+            "errors": len(errors), "first_errors": errors[:10], "seconds": elapsed,
+            "boards_per_sec": checked / elapsed if elapsed > 0 else 0.0}
+
+
+def bench_check(args):
+    return differential_check(args.check if args.check is not None else (20000 if args.quick else 1000000),
+                              args.seed, args.workers)
+
+
+WORKLOADS = {
+    "move_latency": bench_move_latency,
+    "random_play": bench_random_play,
+    "game_over": bench_game_over,
+    "spawn": bench_spawn,
+    "persistence": bench_persistence,
+    "canvas": bench_canvas,
+    "startup": bench_startup,
+    "check": bench_check,
+}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy_version,
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# --- Numbers only, keyed by dotted path, for comparing two runs ---
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+# --- Metrics that moved more than `threshold`, *_per_sec is better when higher ---
+def compare(old, new, threshold=0.1):
+    old_flat, new_flat = flatten(old), flatten(new)
+    rows = []
+    for name in sorted(set(old_flat) & set(new_flat)):
+        before, after = old_flat[name], new_flat[name]
+        if not (name.endswith("_ns") or name.endswith("_per_sec") or ".ns." in name) or before == 0:
+            continue
+        change = after / before - 1.0
+        if abs(change) >= threshold:
+            better = change > 0 if name.endswith("_per_sec") else change < 0
+            rows.append((name, before, after, change, better))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the 2048 benchmark suite")
+    parser.add_argument("--only", nargs="*", choices=sorted(WORKLOADS), help="workloads to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads, for a fast look")
+    parser.add_argument("--seed", type=int, default=2048)
+    parser.add_argument("--check", type=int, default=None, help="random boards for the differential check")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the differential check")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results JSON to compare with")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(), "quick": args.quick, "seed": args.seed, "results": {}}
+    failed = False
+    for name in args.only or WORKLOADS:
+        start = time.perf_counter()
+        result = WORKLOADS[name](args)
+        report["results"][name] = result
+        if result.get("skipped"):
+            print(f"{name:<14} skipped: {result['skipped']}")
+        else:
+            print(f"{name:<14} {time.perf_counter() - start:6.1f}s  " + json.dumps(flatten(result))[:160])
+        if name == "startup" and result["pulls_tkinter"]:
+            failed = True
+            print("ERROR: headless imports load tkinter: " + ", ".join(result["pulls_tkinter"]))
+        if name == "check" and result["errors"]:
+            failed = True
+            print("ERROR: engines disagree with the reference")
+            for error in result["first_errors"]:
+                print("  " + error)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        rows = compare(old["results"], report["results"])
+        print(f"\nChanges of 10% or more against {args.compare}")
+        for name, before, after, change, better in rows:
+            print(f"  {name:<44} {before:>14,.1f} -> {after:>14,.1f}  {change:+7.1%}  {'better' if better else 'WORSE'}")
+        if not rows:
+            print("  none")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
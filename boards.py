@@ -0,0 +1,260 @@
+# --- Board sizes other than 4x4 ---
+# rules_for(rows, columns) returns an object with the same functions as
+# engine.py (move, move_with_merges, move_plan, spawn, is_game_over, ...), so
+# engine.Game and the window can run any size from 3x3 up to 8x8.
+#
+# 4x4 keeps the 64-bit nibble board and its 65536 entry row tables. Every other
+# size packs one byte per cell (cell r*columns + c is byte r*columns + c of the
+# integer). A row is then a bytes slice and a column a strided slice, both
+# copied in C, and every line goes through a table keyed on the line bytes:
+# lines up to DENSE_WIDTH cells are filled completely up front, wider lines
+# are filled on first sight since a game only visits a tiny part of 16^width.
+
+import random
+
+import engine
+
+MIN_SIZE = 3
+MAX_SIZE = 8
+DENSE_WIDTH = 3
+
+_line_tables = {}
+_engines = {}
+
+
+# --- Slide a line of exponents towards index 0 ---
+# Returns (moved line, score, merged positions, plan) where the plan holds
+# (source, destination, merged) for every tile like engine._row_plan.
+def _slide(line):
+    out = []
+    plan = []
+    merged = []
+    score = 0
+    prev = 0
+    for src, e in enumerate(line):
+        if not e:
+            continue
+        if e == prev:
+            first_src, dst, _ = plan[-1]
+            plan[-1] = (first_src, dst, True)
+            plan.append((src, dst, True))
+            out[-1] = e + 1
+            score += 1 << (e + 1)
+            merged.append(dst)
+            prev = 0
+        else:
+            plan.append((src, len(out), False))
+            out.append(e)
+            prev = e
+    out.extend([0] * (len(line) - len(out)))
+    return bytes(out), score, tuple(merged), tuple(plan)
+
+
+class _LeftTable(dict):
+    def __missing__(self, line):
+        entry = self[line] = _slide(line)
+        return entry
+
+
+class _RightTable(dict):
+    def __init__(self, left, width):
+        super().__init__()
+        self.left = left
+        self.last = width - 1
+
+    def __missing__(self, line):
+        moved, score, merged, plan = self.left[line[::-1]]
+        last = self.last
+        entry = self[line] = (moved[::-1], score, tuple(last - i for i in merged),
+                              tuple((last - s, last - d, m) for s, d, m in plan))
+        return entry
+
+
+def line_tables(width):
+    tables = _line_tables.get(width)
+    if tables is None:
+        left = _LeftTable()
+        right = _RightTable(left, width)
+        if width <= DENSE_WIDTH:
+            for n in range(16 ** width):
+                line = bytes((n >> (4 * i)) & 0xF for i in range(width))
+                left[line]
+                right[line]
+        tables = _line_tables[width] = (left, right)
+    return tables
+
+
+# --- Rules for one board size, byte per cell ---
+class LineEngine:
+    DIRECTIONS = engine.DIRECTIONS
+    NEW_RANDOM_TILES = engine.NEW_RANDOM_TILES
+    WIN_EXPONENT = engine.WIN_EXPONENT
+
+    def __init__(self, rows, columns):
+        self.ROWS = rows
+        self.COLS = columns
+        self.CELLS = rows * columns
+        self.BOARD_BITS = 8 * self.CELLS
+        self.CELL_BITS = 8
+        self._ones = int.from_bytes(b"\x01" * self.CELLS, "little")
+        # With a 4 on every spawn the largest tile is 2^(cells + 1)
+        self.MAX_EXPONENT = max(engine.MAX_EXPONENT, self.CELLS + 1)
+
+        row_left, row_right = line_tables(columns)
+        col_left, col_right = line_tables(rows)
+        row_slices = [slice(r * columns, (r + 1) * columns) for r in range(rows)]
+        col_slices = [slice(c, None, columns) for c in range(columns)]
+        cells = range(self.CELLS)
+
+        # direction -> (line table, [(slice, cell indices of the line)])
+        self._lines = {
+            "Left": (row_left, [(s, cells[s]) for s in row_slices]),
+            "Right": (row_right, [(s, cells[s]) for s in row_slices]),
+            "Up": (col_left, [(s, cells[s]) for s in col_slices]),
+            "Down": (col_right, [(s, cells[s]) for s in col_slices]),
+        }
+
+    # --- Packing helpers ---
+    def pack(self, grid):
+        return int.from_bytes(bytes(v.bit_length() - 1 if v else 0 for row in grid for v in row), "little")
+
+    def unpack(self, board):
+        cells = board.to_bytes(self.CELLS, "little")
+        columns = self.COLS
+        return [[1 << e if e else 0 for e in cells[r * columns:(r + 1) * columns]] for r in range(self.ROWS)]
+
+    def get_exponent(self, board, row, column):
+        return (board >> (8 * (row * self.COLS + column))) & 0xFF
+
+    def get_tile(self, board, row, column):
+        e = (board >> (8 * (row * self.COLS + column))) & 0xFF
+        return 1 << e if e else 0
+
+    def set_tile(self, board, row, column, value):
+        shift = 8 * (row * self.COLS + column)
+        e = value.bit_length() - 1 if value else 0
+        return (board & ~(0xFF << shift)) | (e << shift)
+
+    # --- Moves ---
+    def move(self, board, direction):
+        lines = self._lines.get(direction)
+        if lines is None:
+            return board, 0
+        table, slices = lines
+        cells = board.to_bytes(self.CELLS, "little")
+        out = bytearray(self.CELLS)
+        score = 0
+        for s, _ in slices:
+            entry = table[cells[s]]
+            out[s] = entry[0]
+            score += entry[1]
+        return int.from_bytes(out, "little"), score
+
+    def move_with_merges(self, board, direction):
+        lines = self._lines.get(direction)
+        if lines is None:
+            return board, 0, 0
+        table, slices = lines
+        cells = board.to_bytes(self.CELLS, "little")
+        out = bytearray(self.CELLS)
+        score = 0
+        mask = 0
+        for s, index in slices:
+            moved, gained, merged, _ = table[cells[s]]
+            out[s] = moved
+            score += gained
+            for i in merged:
+                mask |= 1 << index[i]
+        return int.from_bytes(out, "little"), score, mask
+
+    def move_plan(self, board, direction):
+        table, slices = self._lines[direction]
+        cells = board.to_bytes(self.CELLS, "little")
+        columns = self.COLS
+        plan = []
+        for s, index in slices:
+            for src, dst, merged in table[cells[s]][3]:
+                plan.append((divmod(index[src], columns), divmod(index[dst], columns), merged))
+        return plan
+
+    def mask_cells(self, mask):
+        cells = []
+        while mask:
+            low = mask & -mask
+            cells.append(divmod(low.bit_length() - 1, self.COLS))
+            mask ^= low
+        return cells
+
+    # --- Legality and end of game checks ---
+    def can_move(self, board, direction):
+        return self.move(board, direction)[0] != board
+
+    def legal_moves(self, board):
+        return [d for d in self.DIRECTIONS if self.move(board, d)[0] != board]
+
+    # --- Empty cells as a mask with the low bit of every empty byte set ---
+    def empty_mask(self, board):
+        x = board | (board >> 1)
+        x |= x >> 2
+        x |= x >> 4
+        return ~x & self._ones
+
+    def select_cell(self, mask, k):
+        for _ in range(k):
+            mask &= mask - 1
+        return ((mask & -mask).bit_length() - 1) >> 3
+
+    def count_empty(self, board):
+        return board.to_bytes(self.CELLS, "little").count(0)
+
+    def is_game_over(self, board):
+        if self.empty_mask(board):
+            return False
+        # On a full board Left finds every row pair and Up every column pair
+        return self.move(board, "Left")[0] == board and self.move(board, "Up")[0] == board
+
+    def max_exponent(self, board):
+        return max(board.to_bytes(self.CELLS, "little"))
+
+    def max_tile(self, board):
+        e = self.max_exponent(board)
+        return 1 << e if e else 0
+
+    def is_won(self, board):
+        return self.max_exponent(board) >= self.WIN_EXPONENT
+
+    # --- Spawning, same draws as engine.spawn ---
+    def empty_cells(self, board):
+        columns = self.COLS
+        return [divmod(i, columns) for i, e in enumerate(board.to_bytes(self.CELLS, "little")) if not e]
+
+    def spawn(self, board, rng=random, value=None, empty=None):
+        if empty is None:
+            empty = self.empty_mask(board)
+        if not empty:
+            return board, None
+        if value is None:
+            value = self.NEW_RANDOM_TILES[rng.randint(0, len(self.NEW_RANDOM_TILES) - 1)]
+        i = self.select_cell(empty, rng.randint(0, engine.popcount(empty) - 1))
+        return board | (value.bit_length() - 1) << (8 * i), divmod(i, self.COLS)
+
+
+# --- Pick the rules for a board size, the engine module itself for 4x4 ---
+def rules_for(rows, columns=None):
+    columns = rows if columns is None else columns
+    if (rows, columns) == (engine.ROWS, engine.COLS):
+        return engine
+    if not (MIN_SIZE <= rows <= MAX_SIZE and MIN_SIZE <= columns <= MAX_SIZE):
+        raise ValueError(f"board size {rows}x{columns} is outside {MIN_SIZE}x{MIN_SIZE} .. {MAX_SIZE}x{MAX_SIZE}")
+    rules = _engines.get((rows, columns))
+    if rules is None:
+        rules = _engines[rows, columns] = LineEngine(rows, columns)
+    return rules
+
+
+# --- "5x6" -> (5, 6), "5" -> (5, 5) ---
+def parse_size(text):
+    rows, _, columns = text.lower().partition("x")
+    rows, columns = int(rows), int(columns or rows)
+    rules_for(rows, columns)
+    return rows, columns
@@ -0,0 +1,443 @@
+# --- 2048 training datasets ---
+# Turns headless games into columnar arrays for model training, one row per
+# move: the board before the move, the action (index into engine.DIRECTIONS),
+# the reward (the merge score it added) and the return from that step to the
+# end of the game (discounted by gamma, with gamma 1 the final score minus the
+# score before the move).
+#
+# A dataset is a folder of shard files plus meta.json. A shard holds a fixed
+# number of rows (the last one fewer) as one 64-byte header and one block per
+# column, every block 64-byte aligned, so a reader maps the file read-only and
+# gets each column as a NumPy view without copying. Boards are stored packed
+# (uint64, engine.pack) or as 16 uint8 exponents per board ("log2").
+#
+# The writer streams: games are buffered until the shard is full, written out
+# and dropped, so memory stays at one shard plus the game being added. With
+# augment every move is also stored in its seven other symmetries (the action
+# turned with it). With dedup a board that was already written is left out,
+# the keys of the written boards are kept in a sorted array, 8 bytes each.
+#
+# Dataset.batches() shuffles without loading the dataset: the shards are
+# visited in random order, a few of them at a time, and the rows of those are
+# shuffled together.
+#
+# python dataset.py export data --games 1000 --policy expectimax --augment --dedup
+# python dataset.py info data
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+import engine
+import ntuple
+import statsdb
+
+MAGIC = b"2048DST\x00"
+VERSION = 1
+META_FILE = "meta.json"
+SHARD_ROWS = 1 << 16
+LAYOUTS = ("packed", "log2")
+OBSERVATIONS = ("packed", "log2", "planes")
+PLANES = 16
+# Shards a reader keeps mapped, and shards shuffled together by batches()
+MAX_MAPPED = 64
+SHUFFLE_SHARDS = 4
+
+_HEADER = struct.Struct("<8sHBxQ")
+_HEADER_SIZE = 64
+_ALIGN = 64
+_COLUMNS = (("actions", np.dtype("u1"), ()), ("rewards", np.dtype("<f4"), ()), ("returns", np.dtype("<f4"), ()))
+_BOARD_COLUMNS = {"packed": (np.dtype("<u8"), ()), "log2": (np.dtype("u1"), (engine.SIZE * engine.SIZE,))}
+_NIBBLE_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+# Action indices in the frame of each symmetry, order of ntuple.symmetries
+_TO_SYMMETRY = np.array(statsdb._TO_SYMMETRY, dtype=np.uint8)
+
+
+class DatasetError(Exception):
+    pass
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _shard_name(index):
+    return f"shard-{index:06d}.dst"
+
+
+# --- (name, dtype, row shape, offset) of every column of a shard with `rows` rows ---
+def _layout(layout, rows):
+    columns = []
+    offset = _HEADER_SIZE
+    for name, dtype, shape in (("boards",) + _BOARD_COLUMNS[layout],) + _COLUMNS:
+        columns.append((name, dtype, shape, offset))
+        offset = _align(offset + rows * dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+    return columns, offset
+
+
+# --- Board conversions, packed boards are uint64 arrays ---
+def to_log2(boards):
+    return ((boards[:, None] >> _NIBBLE_SHIFTS) & np.uint64(0xF)).astype(np.uint8)
+
+
+def to_packed(exponents):
+    return np.bitwise_or.reduce(exponents.astype(np.uint64) << _NIBBLE_SHIFTS, axis=1)
+
+
+def observe(boards, layout, observation):
+    if observation not in OBSERVATIONS:
+        raise ValueError(f"Unknown observation {observation!r}, use one of {OBSERVATIONS}")
+    if observation == layout:
+        return boards
+    if observation == "packed":
+        return to_packed(boards)
+    exponents = to_log2(boards) if layout == "packed" else boards
+    if observation == "log2":
+        return exponents
+    return (exponents[:, :, None] == np.arange(PLANES, dtype=np.uint8)).astype(np.uint8)
+
+
+# --- Discounted return from every step to the end of the game ---
+def returns_to_go(rewards, gamma=1.0):
+    rewards = np.asarray(rewards, dtype=np.float64)
+    if gamma == 1.0:
+        return np.cumsum(rewards[::-1])[::-1]
+    returns = np.empty_like(rewards)
+    total = 0.0
+    for i in range(len(rewards) - 1, -1, -1):
+        total = rewards[i] + gamma * total
+        returns[i] = total
+    return returns
+
+
+# --- Writer ---
+class DatasetWriter:
+    def __init__(self, path, layout="packed", shard_rows=SHARD_ROWS, augment=False, dedup=False, gamma=1.0):
+        if layout not in LAYOUTS:
+            raise DatasetError(f"Unknown layout {layout!r}, use one of {LAYOUTS}")
+        if shard_rows < 1:
+            raise DatasetError("shards need at least one row")
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, META_FILE)):
+            raise DatasetError(f"{path} already holds a dataset")
+        self.path = path
+        self.layout = layout
+        self.shard_rows = shard_rows
+        self.augment = augment
+        self.dedup = dedup
+        self.gamma = gamma
+        self.shards = 0
+        self.rows = 0
+        self.games = 0
+        self.skipped = 0
+        self.seen = np.zeros(0, dtype=np.uint64)
+        self.pending_keys = set()
+        self.pending = []
+        self.pending_rows = 0
+        self._write_meta()
+
+    # --- One game: the packed boards before each move, the action indices and the rewards ---
+    def add_game(self, boards, actions, rewards):
+        boards = np.asarray(boards, dtype=np.uint64)
+        actions = np.asarray(actions, dtype=np.uint8)
+        rewards = np.asarray(rewards, dtype=np.float32)
+        if not (len(boards) == len(actions) == len(rewards)):
+            raise DatasetError("boards, actions and rewards differ in length")
+        returns = returns_to_go(rewards, self.gamma).astype(np.float32)
+        self.games += 1
+        if not len(boards):
+            return
+
+        if self.augment:
+            boards = np.concatenate(ntuple.symmetries_array(boards))
+            actions = _TO_SYMMETRY[:, actions].reshape(-1)
+            rewards = np.tile(rewards, 8)
+            returns = np.tile(returns, 8)
+        if self.dedup:
+            keep = self._new_boards(boards)
+            self.skipped += len(boards) - len(keep)
+            boards, actions, rewards, returns = boards[keep], actions[keep], rewards[keep], returns[keep]
+
+        # Fill the open shard, write every full one out
+        start = 0
+        while start < len(boards):
+            take = min(len(boards) - start, self.shard_rows - self.pending_rows)
+            part = slice(start, start + take)
+            self.pending.append((boards[part], actions[part], rewards[part], returns[part]))
+            self.pending_rows += take
+            start += take
+            if self.pending_rows == self.shard_rows:
+                self._flush()
+
+    # --- Indices of the boards not written yet, first of each repeated board ---
+    def _new_boards(self, boards):
+        _, first = np.unique(boards, return_index=True)
+        first.sort()
+        candidates = boards[first]
+        if len(self.seen):
+            at = np.searchsorted(self.seen, candidates).clip(max=len(self.seen) - 1)
+            first = first[self.seen[at] != candidates]
+        pending = self.pending_keys
+        keep = [i for i in first.tolist() if int(boards[i]) not in pending]
+        pending.update(int(boards[i]) for i in keep)
+        return np.array(keep, dtype=np.int64)
+
+    def _flush(self):
+        if not self.pending_rows:
+            return
+        boards, actions, rewards, returns = (np.concatenate(column) for column in zip(*self.pending))
+        if self.dedup:
+            # A game split over two shards already has its later boards pending
+            self.seen = np.union1d(self.seen, boards)
+            self.pending_keys.difference_update(boards.tolist())
+        if self.layout == "log2":
+            boards = to_log2(boards)
+        rows = len(actions)
+        columns, size = _layout(self.layout, rows)
+        data = {"boards": boards, "actions": actions, "rewards": rewards, "returns": returns}
+
+        target = os.path.join(self.path, _shard_name(self.shards))
+        temp = target + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, LAYOUTS.index(self.layout), rows).ljust(_HEADER_SIZE, b"\x00"))
+            for name, dtype, shape, offset in columns:
+                f.write(b"\x00" * (offset - f.tell()))
+                f.write(np.ascontiguousarray(data[name], dtype=dtype).tobytes())
+            f.write(b"\x00" * (size - f.tell()))
+        os.replace(temp, target)
+
+        self.shards += 1
+        self.rows += rows
+        self.pending = []
+        self.pending_rows = 0
+        self._write_meta()
+
+    # --- meta.json lists the finished shards only, so it is always readable ---
+    def _write_meta(self):
+        meta = {
+            "version": VERSION,
+            "layout": self.layout,
+            "shard_rows": self.shard_rows,
+            "shards": self.shards,
+            "rows": self.rows,
+            "games": self.games,
+            "augment": self.augment,
+            "dedup": self.dedup,
+            "gamma": self.gamma,
+        }
+        temp = os.path.join(self.path, META_FILE + ".tmp")
+        with open(temp, "w") as f:
+            json.dump(meta, f)
+        os.replace(temp, os.path.join(self.path, META_FILE))
+
+    def close(self):
+        self._flush()
+        self._write_meta()
+
+
+# --- One shard, mapped read-only, the columns are views on the mapping ---
+class Shard:
+    def __init__(self, path, layout):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise DatasetError(f"can't map {path}: {e}")
+        magic, version, layout_index, rows = _HEADER.unpack_from(self._map, 0)
+        columns, size = _layout(layout, rows)
+        if magic != MAGIC or version != VERSION or LAYOUTS[layout_index] != layout or len(self._map) != size:
+            self._map.close()
+            raise DatasetError(f"{path} is not a dataset shard")
+        self.rows = rows
+        self.columns = {}
+        for name, dtype, shape, offset in columns:
+            count = rows * int(np.prod(shape, dtype=np.int64))
+            self.columns[name] = np.frombuffer(self._map, dtype=dtype, count=count, offset=offset).reshape((rows,) + shape)
+
+    def close(self):
+        # The views have to go before the mapping can be closed
+        self.columns = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+
+# --- Reader ---
+class Dataset:
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError) as e:
+            raise DatasetError(f"{path} is not a dataset: {e}")
+        if self.meta.get("version") != VERSION or self.meta.get("layout") not in LAYOUTS:
+            raise DatasetError(f"{path} has an unsupported layout")
+        self.layout = self.meta["layout"]
+        self.shard_count = self.meta["shards"]
+        self._mapped = OrderedDict()
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    # --- Columns of shard i, mapped on first use, the least recently used are unmapped ---
+    def shard(self, index):
+        if not 0 <= index < self.shard_count:
+            raise IndexError(index)
+        shard = self._mapped.pop(index, None)
+        if shard is None:
+            shard = Shard(os.path.join(self.path, _shard_name(index)), self.layout)
+            if len(self._mapped) >= MAX_MAPPED:
+                self._mapped.popitem(last=False)[1].close()
+        self._mapped[index] = shard
+        return shard.columns
+
+    # --- Batches of rows as dicts of arrays, boards in the given observation ---
+    # With shuffle the shards come in random order and the rows of every
+    # `shuffle_shards` of them are shuffled together, memory stays at that many
+    # shards whatever the size of the dataset.
+    def batches(self, batch_size, shuffle=True, seed=None, observation="packed", drop_last=False,
+                shuffle_shards=SHUFFLE_SHARDS):
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(self.shard_count) if shuffle else np.arange(self.shard_count)
+        window = shuffle_shards if shuffle else 1
+        carry = None
+        for lo in range(0, len(order), window):
+            parts = [self.shard(int(i)) for i in order[lo:lo + window]]
+            columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+            if shuffle:
+                permutation = rng.permutation(len(columns["actions"]))
+                columns = {name: column[permutation] for name, column in columns.items()}
+            if carry is not None:
+                columns = {name: np.concatenate([carry[name], column]) for name, column in columns.items()}
+            rows = len(columns["actions"])
+            end = rows - rows % batch_size
+            for start in range(0, end, batch_size):
+                yield self._batch(columns, slice(start, start + batch_size), observation)
+            carry = {name: column[end:] for name, column in columns.items()} if end < rows else None
+        if carry is not None and not drop_last:
+            yield self._batch(carry, slice(None), observation)
+
+    def _batch(self, columns, rows, observation):
+        batch = {name: column[rows] for name, column in columns.items()}
+        batch["boards"] = observe(batch["boards"], self.layout, observation)
+        return batch
+
+    def close(self):
+        for shard in self._mapped.values():
+            shard.close()
+        self._mapped.clear()
+
+
+# --- Exporting self-play games ---
+def play_game(seed, policy="expectimax", depth=2, weights=None, max_moves=None):
+    import selfplay
+
+    game = engine.Game()
+    game.new_game(seed)
+    choose = selfplay.make_policy(policy, seed, depth, weights)
+    boards, actions, rewards = [], [], []
+    while not game.over():
+        if max_moves is not None and len(actions) >= max_moves:
+            break
+        board, score = game.board, game.score
+        direction = choose(board)
+        if direction is None or game.move(direction) is None:
+            break
+        boards.append(board)
+        actions.append(engine.DIRECTIONS.index(direction))
+        rewards.append(game.score - score)
+        game.spawn()
+    return np.array(boards, dtype=np.uint64), np.array(actions, dtype=np.uint8), np.array(rewards, dtype=np.float32)
+
+
+def _play_chunk(seeds, policy, depth, weights, max_moves):
+    return [play_game(seed, policy, depth, weights, max_moves) for seed in seeds]
+
+
+# --- Play the seeds over a process pool, games are written in seed order ---
+# At most 2 chunks per worker are in flight, so finished games never pile up
+# in memory while the writer is behind.
+def export(path, seeds, policy="expectimax", depth=2, weights=None, workers=None, max_moves=None, **options):
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    size = max(1, min(64, len(seeds) // (workers * 4) or 1))
+    chunks = [seeds[i:i + size] for i in range(0, len(seeds), size)]
+    args = (policy, depth, weights, max_moves)
+    writer = DatasetWriter(path, **options)
+    try:
+        if workers == 1:
+            results = (_play_chunk(chunk, *args) for chunk in chunks)
+            for games in results:
+                for game in games:
+                    writer.add_game(*game)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    if len(pending) == 2 * workers:
+                        for game in pending.popleft().result():
+                            writer.add_game(*game)
+                    pending.append(pool.submit(_play_chunk, chunk, *args))
+                while pending:
+                    for game in pending.popleft().result():
+                        writer.add_game(*game)
+    finally:
+        writer.close()
+    return writer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dataset", description="Columnar training data from 2048 self-play")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="play games and write them as dataset shards")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--games", type=int, default=1000)
+    export_parser.add_argument("--seed", type=int, default=0)
+    export_parser.add_argument("--policy", default="expectimax")
+    export_parser.add_argument("--depth", type=int, default=2)
+    export_parser.add_argument("--weights")
+    export_parser.add_argument("--workers", type=int, default=None)
+    export_parser.add_argument("--max-moves", type=int, default=None)
+    export_parser.add_argument("--layout", choices=LAYOUTS, default="packed")
+    export_parser.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    export_parser.add_argument("--augment", action="store_true", help="also store the 7 other symmetries of every move")
+    export_parser.add_argument("--dedup", action="store_true", help="leave out boards that were already written")
+    export_parser.add_argument("--gamma", type=float, default=1.0, help="discount of the returns")
+
+    info_parser = commands.add_parser("info", help="print the size of a dataset")
+    info_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "export":
+            start = time.perf_counter()
+            writer = export(args.path, range(args.seed, args.seed + args.games), args.policy, args.depth,
+                            args.weights, args.workers, args.max_moves, layout=args.layout,
+                            shard_rows=args.shard_rows, augment=args.augment, dedup=args.dedup, gamma=args.gamma)
+            print(f"{writer.games} games, {writer.rows} rows in {time.perf_counter() - start:.1f}s"
+                  + (f", {writer.skipped} repeated boards left out" if args.dedup else ""))
+        dataset = Dataset(args.path)
+        size = sum(os.path.getsize(os.path.join(args.path, _shard_name(i))) for i in range(dataset.shard_count))
+        meta = dataset.meta
+        print(f"{len(dataset)} rows from {meta['games']} games in {dataset.shard_count} shards, "
+              f"{meta['layout']} boards, {size / 2**20:.1f} MB")
+        dataset.close()
+    except DatasetError as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,548 @@
+# --- 2048 endgame tables ---
+# Exact values under optimal play, solved by retrograde analysis over every
+# reachable position of a small board (2x2, 3x3) or of a bigger one held to a
+# bounded set of tiles. Two objectives:
+#
+#   score   expected score still to be gained until the game is over
+#   reach   probability of ever making the target tile (a position that has it
+#           is worth 1 and not played on, a lost one 0)
+#
+# Positions are the boards with the player to move, one nibble per cell
+# holding the log2 of the tile (cell (r, c) at nibble r*columns + c, so 4x4
+# keys are engine.pack boards), stored under the smallest of their symmetries.
+# A move keeps the tile sum and a spawn adds 2 or 4 to it, so the positions
+# fall into layers by sum: the forward pass collects the layers reachable from
+# the start positions (two 2s, like engine.Game.new_game, or given boards), the
+# backward pass solves them from the biggest sum down, each layer only looking
+# at the two solved layers above it. Lines slide by engine.process_line and the
+# spawns follow engine.NEW_RANDOM_TILES. Every layer is split into chunks that
+# run in a process pool, the layers live in a work folder as .npy files.
+#
+# The finished table is one file: a header and an open addressing hash table
+# of keys and values, memory mapped read-only, so a lookup is a hash and a few
+# probes in the page cache whatever the size of the table.
+#
+# python endgame.py solve 3x3 3x3-score.egt
+# python endgame.py solve 3x3 3x3-512.egt --objective reach --target 512
+# python endgame.py solve 4x4 4x4-8.egt --objective reach --target 8
+#
+# The 4x4 state space outgrows memory quickly, from a new game only small
+# targets solve, bigger ones need --max-tile or a few --start boards.
+# python endgame.py query 3x3-score.egt "[[2, 4, 0], [0, 2, 0], [0, 0, 0]]"
+# python endgame.py info 3x3-score.egt
+
+import argparse
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import engine
+
+MAGIC = b"2048EGT\x00"
+VERSION = 1
+OBJECTIVES = ("score", "reach")
+SPAWN_TWO_PROBABILITY = engine.NEW_RANDOM_TILES.count(2) / len(engine.NEW_RANDOM_TILES)
+SPAWN_FOUR_PROBABILITY = 1.0 - SPAWN_TWO_PROBABILITY
+CHUNK = 1 << 20
+# magic, version, rows, columns, objective, target exponent, max exponent,
+# hash bits, positions, value of a new game, solve seconds
+_HEADER = struct.Struct("<8sHBBBBBBQdd")
+_HEADER_SIZE = 64
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+class EndgameError(Exception):
+    pass
+
+
+# --- Vectorised rules for one board size, 4 bits per cell ---
+# Every line of every direction is listed as its cells in sliding order, the
+# line tables map a packed line to the packed result and the score gained.
+class Rules:
+    def __init__(self, rows, columns):
+        if min(rows, columns) < 2 or rows * columns > 16:
+            raise EndgameError(f"{rows}x{columns} boards aren't supported, a key holds 2x2 up to 16 cells")
+        self.rows = rows
+        self.columns = columns
+        self.cells = rows * columns
+        self.shifts = [np.uint64(4 * i) for i in range(self.cells)]
+
+        grid = [[r * columns + c for c in range(columns)] for r in range(rows)]
+        by_columns = [list(column) for column in zip(*grid)]
+        self.lines = {
+            "Left": grid,
+            "Right": [row[::-1] for row in grid],
+            "Up": by_columns,
+            "Down": [column[::-1] for column in by_columns],
+        }
+        self.tables = {length: _line_table(length) for length in {rows, columns}}
+
+        flips = [lambda r, c: (r, c), lambda r, c: (r, columns - 1 - c),
+                 lambda r, c: (rows - 1 - r, c), lambda r, c: (rows - 1 - r, columns - 1 - c)]
+        if rows == columns:
+            flips += [lambda r, c, f=f: f(c, r) for f in flips]
+        self.symmetries = [[flip(i // columns, i % columns) for i in range(self.cells)] for flip in flips]
+        self._sources = [[(4 * (r * columns + c), 4 * i) for i, (r, c) in enumerate(cells)] for cells in self.symmetries]
+
+    def cell(self, keys, i):
+        return (keys >> self.shifts[i]) & np.uint64(0xF)
+
+    # --- New keys and score gained, for one direction ---
+    def move(self, keys, direction):
+        moved = np.zeros_like(keys)
+        gained = np.zeros(len(keys), dtype=np.float64)
+        for line in self.lines[direction]:
+            table, scores = self.tables[len(line)]
+            index = np.zeros(len(keys), dtype=np.int64)
+            for k, i in enumerate(line):
+                index |= self.cell(keys, i).astype(np.int64) << (4 * k)
+            result = table[index]
+            gained += scores[index]
+            for k, i in enumerate(line):
+                moved |= ((result >> np.uint64(4 * k)) & np.uint64(0xF)) << self.shifts[i]
+        return moved, gained
+
+    # --- Smallest key among the symmetries ---
+    def canonical(self, keys):
+        best = None
+        for cells in self.symmetries:
+            out = np.zeros_like(keys)
+            for i, (r, c) in enumerate(cells):
+                out |= self.cell(keys, r * self.columns + c) << self.shifts[i]
+            best = out if best is None else np.minimum(best, out)
+        return best
+
+    # --- The same for one key, in plain ints for the lookups ---
+    def canonical_key(self, key):
+        return min(sum(((key >> source) & 0xF) << target for source, target in sources) for sources in self._sources)
+
+    def max_exponent(self, keys):
+        top = np.zeros_like(keys)
+        for i in range(self.cells):
+            top = np.maximum(top, self.cell(keys, i))
+        return top
+
+    def tile_sum(self, keys):
+        total = np.zeros_like(keys)
+        for i in range(self.cells):
+            e = self.cell(keys, i)
+            total += np.where(e > 0, np.uint64(1) << e, np.uint64(0))
+        return total
+
+
+def _line_table(length):
+    # Four cells are a row of the 4x4 engine, its tables are built the same way
+    if length == engine.SIZE:
+        return np.array(engine.ROW_LEFT, dtype=np.uint64), np.array(engine.ROW_SCORE, dtype=np.float64)
+    size = 16 ** length
+    table = np.zeros(size, dtype=np.uint64)
+    scores = np.zeros(size, dtype=np.float64)
+    for line in range(size):
+        exponents = [(line >> (4 * k)) & 0xF for k in range(length)]
+        moved, gained, _ = engine.process_line([1 << e if e else 0 for e in exponents], engine.MAX_TILE)
+        packed = 0
+        for k, v in enumerate(moved):
+            if v:
+                packed |= (v.bit_length() - 1) << (4 * k)
+        table[line] = packed
+        scores[line] = gained
+    return table, scores
+
+
+# --- Grid of tile values <-> key ---
+# A grid has to be rows lists of columns tiles when they are given, every tile
+# 0 or a power of two that fits a nibble.
+def encode(grid, rows=None, columns=None):
+    if not isinstance(grid, list) or not grid or not all(isinstance(row, list) for row in grid):
+        raise EndgameError(f"{grid!r} is not a grid of tiles")
+    if (rows is not None and len(grid) != rows) or (columns is not None and any(len(row) != columns for row in grid)):
+        raise EndgameError(f"the grid isn't {rows}x{columns}")
+    columns = len(grid[0])
+    if any(len(row) != columns for row in grid):
+        raise EndgameError("the rows of the grid aren't all the same length")
+    key = 0
+    for r, row in enumerate(grid):
+        for c, v in enumerate(row):
+            if type(v) is not int or v < 0 or v & (v - 1) or v == 1 or v > 1 << 15:
+                raise EndgameError(f"{v!r} at ({r}, {c}) is not a tile")
+            if v:
+                key |= (v.bit_length() - 1) << (4 * (r * columns + c))
+    return key
+
+
+def decode(key, rows, columns):
+    return [[1 << e if e else 0 for e in ((key >> (4 * (r * columns + c))) & 0xF for c in range(columns))]
+            for r in range(rows)]
+
+
+# --- Every board with two 2s on it, the way engine.Game.new_game starts ---
+def start_positions(rows, columns):
+    cells = rows * columns
+    return [(1 << (4 * a)) | (1 << (4 * b)) for a in range(cells) for b in range(a + 1, cells)]
+
+
+# --- Solver ---
+class _Job:
+    def __init__(self, rows, columns, objective, target, max_exponent, work):
+        self.rows = rows
+        self.columns = columns
+        self.objective = objective
+        self.target = target
+        self.max_exponent = max_exponent
+        self.work = work
+
+    def layer_path(self, total, kind):
+        return os.path.join(self.work, f"{kind}-{total}.npy")
+
+    # Positions that are not played on: the target is made, or a tile outgrew the bound
+    def finished(self, rules, keys):
+        top = rules.max_exponent(keys)
+        if self.objective == "reach":
+            return top >= self.target
+        return top > self.max_exponent
+
+
+_rules_cache = {}
+
+
+def _rules(rows, columns):
+    rules = _rules_cache.get((rows, columns))
+    if rules is None:
+        rules = _rules_cache[rows, columns] = Rules(rows, columns)
+    return rules
+
+
+# --- Forward: the children of one chunk of a layer, by the sum they land on ---
+def _expand(job, total, start, stop):
+    rules = _rules(job.rows, job.columns)
+    keys = np.load(job.layer_path(total, "keys"), mmap_mode="r")[start:stop]
+    keys = keys[~job.finished(rules, keys)]
+    twos, fours = [], []
+    for direction in engine.DIRECTIONS:
+        moved = rules.move(keys, direction)[0]
+        moved = moved[moved != keys]
+        for i in range(rules.cells):
+            empty = moved[rules.cell(moved, i) == 0]
+            twos.append(empty | (np.uint64(1) << rules.shifts[i]))
+            fours.append(empty | (np.uint64(2) << rules.shifts[i]))
+    return (np.unique(rules.canonical(np.concatenate(twos))),
+            np.unique(rules.canonical(np.concatenate(fours))))
+
+
+# --- Backward: values of one chunk of a layer from the two layers above ---
+def _evaluate(job, total, start, stop):
+    rules = _rules(job.rows, job.columns)
+    keys = np.array(np.load(job.layer_path(total, "keys"), mmap_mode="r")[start:stop])
+    above = {}
+    for step in (2, 4):
+        path = job.layer_path(total + step, "keys")
+        if os.path.exists(path):
+            above[step] = (np.load(path, mmap_mode="r"), np.load(job.layer_path(total + step, "values"), mmap_mode="r"))
+
+    def lookup(children, step):
+        if step not in above or not len(children):
+            return np.zeros(len(children))
+        layer_keys, layer_values = above[step]
+        children = rules.canonical(children)
+        index = np.searchsorted(layer_keys, children)
+        if np.any(index >= len(layer_keys)) or np.any(layer_keys[np.minimum(index, len(layer_keys) - 1)] != children):
+            raise EndgameError(f"a child of layer {total} is missing from layer {total + step}")
+        return layer_values[index]
+
+    finished = job.finished(rules, keys)
+    live = keys[~finished]
+    values = np.full(len(live), -np.inf)
+    for direction in engine.DIRECTIONS:
+        moved, gained = rules.move(live, direction)
+        legal = moved != live
+        moved, gained = moved[legal], gained[legal]
+        expected = np.zeros(len(moved))
+        empty_cells = np.zeros(len(moved))
+        for i in range(rules.cells):
+            empty = rules.cell(moved, i) == 0
+            spots = moved[empty]
+            expected[empty] += (SPAWN_TWO_PROBABILITY * lookup(spots | (np.uint64(1) << rules.shifts[i]), 2)
+                                + SPAWN_FOUR_PROBABILITY * lookup(spots | (np.uint64(2) << rules.shifts[i]), 4))
+            empty_cells += empty
+        value = expected / empty_cells
+        if job.objective == "score":
+            value += gained
+        values[legal] = np.maximum(values[legal], value)
+
+    # No legal move: the game is over and nothing more comes of it
+    values[values == -np.inf] = 0.0
+    result = np.full(len(keys), 1.0 if job.objective == "reach" else 0.0)
+    result[~finished] = values
+    return result
+
+
+def _chunks(count):
+    return [(start, min(start + CHUNK, count)) for start in range(0, count, CHUNK)]
+
+
+def _run(pool, func, job, total, count):
+    chunks = _chunks(count)
+    if pool is None:
+        return [func(job, total, start, stop) for start, stop in chunks]
+    return list(pool.map(func, *zip(*[(job, total, start, stop) for start, stop in chunks])))
+
+
+def solve(path, rows, columns, objective="score", target=None, max_exponent=None, starts=None,
+          workers=None, work=None, log=print):
+    if objective not in OBJECTIVES:
+        raise EndgameError(f"Unknown objective {objective!r}, use one of {OBJECTIVES}")
+    if objective == "reach" and not target:
+        raise EndgameError("the reach objective needs a target tile")
+    target_exponent = target.bit_length() - 1 if target else 0
+    max_exponent = max_exponent or (target_exponent if objective == "reach" else engine.MAX_EXPONENT)
+    rules = Rules(rows, columns)
+    workers = workers or os.cpu_count() or 1
+    # A fresh folder every time, so no layer of an earlier run is picked up
+    work = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".work",
+                            dir=work or os.path.dirname(os.path.abspath(path)))
+    try:
+        return _solve(path, _Job(rows, columns, objective, target_exponent, max_exponent, work), rules,
+                      starts, workers, log)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def _solve(path, job, rules, starts, workers, log):
+    started = time.perf_counter()
+    rows, columns = job.rows, job.columns
+
+    starts = np.array(starts if starts is not None else start_positions(rows, columns), dtype=np.uint64)
+    pending = {}
+    for total, keys in zip(rules.tile_sum(starts).tolist(), rules.canonical(starts)):
+        pending.setdefault(total, []).append(keys)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        # --- Forward pass, lowest sum first ---
+        layers = []
+        while pending:
+            total = min(pending)
+            keys = np.unique(np.concatenate([np.atleast_1d(k) for k in pending.pop(total)]))
+            np.save(job.layer_path(total, "keys"), keys)
+            layers.append((total, len(keys)))
+            for twos, fours in _run(pool, _expand, job, total, len(keys)):
+                for step, children in ((2, twos), (4, fours)):
+                    if len(children):
+                        pending.setdefault(total + step, []).append(children)
+            # Merge what has piled up for the next layers so memory stays flat
+            for above in (total + 2, total + 4):
+                if len(pending.get(above, ())) > 1:
+                    pending[above] = [np.unique(np.concatenate(pending[above]))]
+        count = sum(n for _, n in layers)
+        log(f"{count:,} positions in {len(layers)} layers, forward pass {time.perf_counter() - started:.1f}s")
+
+        # --- Backward pass, highest sum first ---
+        for total, n in reversed(layers):
+            values = np.concatenate(_run(pool, _evaluate, job, total, n)) if n else np.zeros(0)
+            np.save(job.layer_path(total, "values"), values)
+        log(f"backward pass done after {time.perf_counter() - started:.1f}s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    start_value = _start_value(job, rules, starts)
+    _write_table(path, job, layers, start_value, time.perf_counter() - started)
+    log(f"wrote {path} in {time.perf_counter() - started:.1f}s, start value {start_value:.6g}")
+    return start_value
+
+
+def _start_value(job, rules, starts):
+    values = []
+    for key in rules.canonical(starts):
+        total = int(rules.tile_sum(np.array([key]))[0])
+        layer = np.load(job.layer_path(total, "keys"), mmap_mode="r")
+        values.append(np.load(job.layer_path(total, "values"), mmap_mode="r")[np.searchsorted(layer, key)])
+    return float(np.mean(values))
+
+
+# --- Hash table file ---
+def _hash(keys, bits):
+    return ((keys * np.uint64(_HASH_MULTIPLIER)) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def _write_table(path, job, layers, start_value, seconds):
+    count = sum(n for _, n in layers)
+    bits = max(4, (2 * count - 1).bit_length())
+    capacity = 1 << bits
+    table_keys = np.zeros(capacity, dtype=np.uint64)
+    table_values = np.zeros(capacity, dtype=np.float64)
+
+    # Linear probing, one round per probe step: every key that finds its slot
+    # free takes it (the first one if several do), the others move one on
+    for total, n in layers:
+        if not n:
+            continue
+        keys = np.load(job.layer_path(total, "keys"))
+        values = np.load(job.layer_path(total, "values"))
+        slots = _hash(keys, bits)
+        pending = np.arange(n)
+        while len(pending):
+            candidates = slots[pending]
+            free = table_keys[candidates] == 0
+            taken, first = np.unique(candidates[free], return_index=True)
+            winners = pending[free][first]
+            table_keys[taken] = keys[winners]
+            table_values[taken] = values[winners]
+            placed = np.zeros(n, dtype=bool)
+            placed[winners] = True
+            pending = pending[~placed[pending]]
+            slots[pending] = (slots[pending] + 1) & (capacity - 1)
+
+    header = _HEADER.pack(MAGIC, VERSION, job.rows, job.columns, OBJECTIVES.index(job.objective), job.target,
+                          job.max_exponent, bits, count, start_value, seconds)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header.ljust(_HEADER_SIZE, b"\0"))
+        f.write(table_keys.tobytes())
+        f.write(table_values.tobytes())
+    os.replace(tmp, path)
+
+
+# --- Read-only table, memory mapped ---
+class EndgameTable:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise EndgameError(f"{path} is empty") from e
+        (magic, version, self.rows, self.columns, objective, self.target, self.max_exponent,
+         self.bits, self.count, self.start_value, self.seconds) = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise EndgameError(f"{path} is not an endgame table")
+        self.objective = OBJECTIVES[objective]
+        self.capacity = 1 << self.bits
+        self.keys = np.frombuffer(self._map, dtype=np.uint64, count=self.capacity, offset=_HEADER_SIZE)
+        self.values = np.frombuffer(self._map, dtype=np.float64, count=self.capacity,
+                                    offset=_HEADER_SIZE + 8 * self.capacity)
+        self.rules = Rules(self.rows, self.columns)
+
+    def __len__(self):
+        return self.count
+
+    # --- Key of a position given as a key or a grid of this table's size ---
+    def key(self, board):
+        if isinstance(board, list):
+            return encode(board, self.rows, self.columns)
+        if isinstance(board, bool) or not isinstance(board, (int, np.integer)) \
+                or not 0 <= int(board) < 1 << (4 * self.rules.cells):
+            raise EndgameError(f"{board!r} is not a {self.rows}x{self.columns} key")
+        return int(board)
+
+    # --- Value of a position (key or grid), None if it isn't in the table ---
+    def value(self, board):
+        key = self.rules.canonical_key(self.key(board))
+        mask = self.capacity - 1
+        slot = ((key * _HASH_MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> (64 - self.bits)
+        while True:
+            found = int(self.keys[slot])
+            if found == key:
+                return float(self.values[slot])
+            if found == 0:
+                return None
+            slot = (slot + 1) & mask
+
+    # --- Expected value of every legal move, None for the ones that don't move ---
+    def move_values(self, board):
+        key = self.key(board)
+        rules = self.rules
+        keys = np.array([key], dtype=np.uint64)
+        result = {}
+        for direction in engine.DIRECTIONS:
+            moved, gained = rules.move(keys, direction)
+            if moved[0] == key:
+                result[direction] = None
+                continue
+            moved = int(moved[0])
+            total = count = 0.0
+            for i in range(rules.cells):
+                if not (moved >> (4 * i)) & 0xF:
+                    two = self.value(moved | (1 << (4 * i)))
+                    four = self.value(moved | (2 << (4 * i)))
+                    if two is None or four is None:
+                        total = None
+                        break
+                    total += SPAWN_TWO_PROBABILITY * two + SPAWN_FOUR_PROBABILITY * four
+                    count += 1
+            if total is None:
+                result[direction] = None
+                continue
+            value = total / count
+            if self.objective == "score":
+                value += float(gained[0])
+            result[direction] = value
+        return result
+
+    def best_move(self, board):
+        values = {d: v for d, v in self.move_values(board).items() if v is not None}
+        return max(values, key=values.get) if values else None
+
+    def close(self):
+        self.keys = self.values = None
+        self._map.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="endgame", description="Exact 2048 values by retrograde analysis")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = commands.add_parser("solve", help="solve a board size and write the table")
+    solve_parser.add_argument("size", help="board size, e.g. 3x3")
+    solve_parser.add_argument("path")
+    solve_parser.add_argument("--objective", choices=OBJECTIVES, default="score")
+    solve_parser.add_argument("--target", type=int, help="tile to reach, for --objective reach")
+    solve_parser.add_argument("--max-tile", type=int, help="positions with a bigger tile count as finished")
+    solve_parser.add_argument("--start", help="JSON list of boards (grids of tiles) to solve from "
+                                              "instead of every new game")
+    solve_parser.add_argument("--workers", type=int, default=None)
+    solve_parser.add_argument("--work-dir", help="where the layers are kept while solving (default: next to PATH)")
+
+    query_parser = commands.add_parser("query", help="value and best move of a board")
+    query_parser.add_argument("path")
+    query_parser.add_argument("board", help="JSON grid of tiles")
+
+    info_parser = commands.add_parser("info", help="print what a table holds")
+    info_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "solve":
+            rows, _, columns = args.size.lower().partition("x")
+            rows, columns = int(rows), int(columns or rows)
+            starts = [encode(grid, rows, columns) for grid in json.loads(args.start)] if args.start else None
+            solve(args.path, rows, columns, args.objective, args.target,
+                  args.max_tile.bit_length() - 1 if args.max_tile else None, starts, args.workers, args.work_dir)
+        table = EndgameTable(args.path)
+        if args.command == "query":
+            board = json.loads(args.board)
+            print(f"value {table.value(board)}")
+            for direction, value in table.move_values(board).items():
+                print(f"  {direction:<5} {'-' if value is None else f'{value:.6g}'}")
+        else:
+            target = f", target {1 << table.target}" if table.objective == "reach" else ""
+            print(f"{table.rows}x{table.columns} {table.objective}{target}: {len(table):,} positions, "
+                  f"{os.path.getsize(args.path) / 2**20:.1f} MB, new game value {table.start_value:.6g}")
+        table.close()
+    except (EndgameError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
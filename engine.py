@@ -0,0 +1,586 @@
+# --- 2048 headless engine ---
+# The 4x4 board is packed into one 64-bit integer, 4 bits per cell holding the
+# log2 of the tile (0 = empty). Cell (row, column) lives at nibble row*4 + column,
+# so every row is a 16-bit value that indexes the precomputed lookup tables.
+# No tkinter in here, the Tk window in Main.py is only a view over this module.
+# Other board sizes live in boards.py behind the same set of functions.
+
+import os
+import random
+import struct
+import sys
+from array import array
+
+# --- Board Constants ---
+SIZE = 4
+ROWS = COLS = SIZE
+BOARD_BITS = 64
+DIRECTIONS = ("Up", "Right", "Down", "Left")
+NEW_RANDOM_TILES = [2, 2, 2, 2, 2, 2, 4]
+WIN_EXPONENT = 11
+# The largest tile a nibble holds. Two of them don't merge, so a 4x4 game
+# never makes a 65536 (nor scores one) and the board is stuck once nothing
+# else can move.
+MAX_EXPONENT = 15
+MAX_TILE = 1 << MAX_EXPONENT
+
+ROW_MASK = 0xFFFF
+COL_MASK = 0x000F000F000F000F
+CELL_BITS = 4
+_NIBBLE_ONES = 0x1111111111111111
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:
+    def popcount(x):
+        return bin(x).count("1")
+
+
+# --- Reference line logic (same rules as the old nested process_line) ---
+# Slides a line towards index 0: every tile merges at most once, pairs are taken
+# from the leading edge and the merged value is added to the score. Tiles of
+# value `limit` don't merge, the 4x4 board passes 1 << MAX_EXPONENT.
+def process_line(line, limit=None):
+    new_line = []
+    merges = []
+    score = 0
+    compact = [v for v in line if v != 0]
+    j = 0
+    while j < len(compact):
+        if j + 1 < len(compact) and compact[j] == compact[j + 1] and compact[j] != limit:
+            merged_val = compact[j] * 2
+            merges.append(len(new_line))
+            new_line.append(merged_val)
+            score += merged_val
+            j += 2
+        else:
+            new_line.append(compact[j])
+            j += 1
+
+    while len(new_line) < len(line):
+        new_line.append(0)
+    return new_line, score, merges
+
+
+# --- Slow list based move, the spec the tables and batch engine are checked against ---
+# (with limit=MAX_TILE for the 4x4 board)
+def reference_move(grid, direction, limit=None):
+    rows, columns = len(grid), len(grid[0])
+    new_grid = [row[:] for row in grid]
+    score = 0
+    merges = []
+    reverse = direction in ("Right", "Down")
+    is_col = direction in ("Up", "Down")
+
+    for i in range(columns if is_col else rows):
+        line = [grid[r][i] for r in range(rows)] if is_col else grid[i][:]
+        if reverse:
+            line = line[::-1]
+        new_line, gained, merged = process_line(line, limit)
+        score += gained
+        if reverse:
+            new_line = new_line[::-1]
+            merged = [len(line) - 1 - j for j in merged]
+        for j, v in enumerate(new_line):
+            if is_col:
+                new_grid[j][i] = v
+            else:
+                new_grid[i][j] = v
+        merges.extend((j, i) if is_col else (i, j) for j in merged)
+    return new_grid, score, sorted(merges)
+
+
+# --- Build the 65536 entry row tables once at import ---
+def _build_tables():
+    left = [0] * 65536
+    right = [0] * 65536
+    score = [0] * 65536
+    left_merges = [0] * 65536
+    right_merges = [0] * 65536
+    empty = [0] * 65536
+    max_exp = [0] * 65536
+    pair = [False] * 65536
+
+    for row in range(65536):
+        exps = [(row >> (4 * i)) & 0xF for i in range(4)]
+        empty[row] = exps.count(0)
+        max_exp[row] = max(exps)
+        pair[row] = any(exps[i] != 0 and exps[i] == exps[i + 1] != MAX_EXPONENT for i in range(3))
+
+        line = [1 << e if e else 0 for e in exps]
+        moved, gained, merged = process_line(line, MAX_TILE)
+        packed = 0
+        for i, v in enumerate(moved):
+            packed |= (v.bit_length() - 1) << (4 * i) if v else 0
+        left[row] = packed
+        score[row] = gained
+        mask = 0
+        for i in merged:
+            mask |= 1 << i
+        left_merges[row] = mask
+
+        rev_row = _reverse_row(row)
+        right[rev_row] = _reverse_row(packed)
+        mask = 0
+        for i in merged:
+            mask |= 1 << (3 - i)
+        right_merges[rev_row] = mask
+
+    return left, right, score, left_merges, right_merges, empty, max_exp, pair
+
+
+def _reverse_row(row):
+    return ((row >> 12) & 0xF) | ((row >> 4) & 0xF0) | ((row << 4) & 0xF00) | ((row << 12) & 0xF000)
+
+
+# --- Table cache ---
+# Building the tables takes most of a second, far longer than anything else an
+# import does, so they are kept in __pycache__ next to the bytecode. Like a .pyc
+# the file is tied to the size and mtime of this source file, anything that
+# doesn't match (or can't be read or written) just builds the tables again.
+_TABLES_VERSION = 2
+_TABLES_MAGIC = b"2048"
+_TABLES_HEADER = struct.Struct("<4sBBqq")
+_TABLE_TYPES = "HHIBBBBB"
+
+
+def _tables_path():
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "engine-tables.bin")
+
+
+def _tables_header():
+    stat = os.stat(os.path.abspath(__file__))
+    return _TABLES_HEADER.pack(_TABLES_MAGIC, _TABLES_VERSION, MAX_EXPONENT, stat.st_mtime_ns, stat.st_size)
+
+
+def _read_tables(path, header):
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:_TABLES_HEADER.size] != header:
+        return None
+    tables = []
+    offset = _TABLES_HEADER.size
+    for typecode in _TABLE_TYPES:
+        table = array(typecode)
+        size = table.itemsize * 65536
+        table.frombytes(raw[offset:offset + size])
+        offset += size
+        if sys.byteorder == "big":
+            table.byteswap()
+        tables.append(table.tolist())
+    if offset != len(raw):
+        return None
+    tables[-1] = [bool(v) for v in tables[-1]]
+    return tuple(tables)
+
+
+def _write_tables(path, header, tables):
+    chunks = [header]
+    for typecode, values in zip(_TABLE_TYPES, tables):
+        table = array(typecode, values)
+        if sys.byteorder == "big":
+            table.byteswap()
+        chunks.append(table.tobytes())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(b"".join(chunks))
+    os.replace(tmp, path)
+
+
+def _load_tables():
+    path = _tables_path()
+    header = tables = None
+    try:
+        header = _tables_header()
+        tables = _read_tables(path, header)
+    except (OSError, ValueError):
+        pass
+    if tables is None:
+        tables = _build_tables()
+        if header is not None:
+            try:
+                _write_tables(path, header, tables)
+            except OSError:
+                pass
+    return tables
+
+
+(ROW_LEFT, ROW_RIGHT, ROW_SCORE, ROW_LEFT_MERGES, ROW_RIGHT_MERGES,
+ ROW_EMPTY, ROW_MAX, ROW_HAS_PAIR) = _load_tables()
+
+
+# --- Packing helpers ---
+def pack(grid):
+    board = 0
+    for r, row in enumerate(grid):
+        for c, v in enumerate(row):
+            if v:
+                if v > MAX_TILE:
+                    raise ValueError(f"tile {v} is bigger than {MAX_TILE}")
+                board |= (v.bit_length() - 1) << (4 * (r * SIZE + c))
+    return board
+
+
+def unpack(board):
+    grid = []
+    for r in range(SIZE):
+        row = []
+        for c in range(SIZE):
+            e = (board >> (4 * (r * SIZE + c))) & 0xF
+            row.append(1 << e if e else 0)
+        grid.append(row)
+    return grid
+
+
+def get_exponent(board, row, column):
+    return (board >> (4 * (row * SIZE + column))) & 0xF
+
+
+def get_tile(board, row, column):
+    e = (board >> (4 * (row * SIZE + column))) & 0xF
+    return 1 << e if e else 0
+
+
+def set_tile(board, row, column, value):
+    if value > MAX_TILE:
+        raise ValueError(f"tile {value} is bigger than {MAX_TILE}")
+    shift = 4 * (row * SIZE + column)
+    e = value.bit_length() - 1 if value else 0
+    return (board & ~(0xF << shift)) | (e << shift)
+
+
+# --- Swap rows and columns so column moves can reuse the row tables ---
+def transpose(board):
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _transpose_mask(mask):
+    out = 0
+    while mask:
+        low = mask & -mask
+        i = low.bit_length() - 1
+        out |= 1 << ((i & 3) * SIZE + (i >> 2))
+        mask ^= low
+    return out
+
+
+def _move_rows(board, table):
+    return (table[board & ROW_MASK]
+            | table[(board >> 16) & ROW_MASK] << 16
+            | table[(board >> 32) & ROW_MASK] << 32
+            | table[(board >> 48) & ROW_MASK] << 48)
+
+
+def _score_rows(board):
+    return (ROW_SCORE[board & ROW_MASK]
+            + ROW_SCORE[(board >> 16) & ROW_MASK]
+            + ROW_SCORE[(board >> 32) & ROW_MASK]
+            + ROW_SCORE[(board >> 48) & ROW_MASK])
+
+
+def _merge_rows(board, table):
+    return (table[board & ROW_MASK]
+            | table[(board >> 16) & ROW_MASK] << 4
+            | table[(board >> 32) & ROW_MASK] << 8
+            | table[(board >> 48) & ROW_MASK] << 12)
+
+
+# --- Apply a move, returns the new board and the score gained ---
+def move(board, direction):
+    if direction == "Left":
+        return _move_rows(board, ROW_LEFT), _score_rows(board)
+    if direction == "Right":
+        return _move_rows(board, ROW_RIGHT), _score_rows(board)
+    t = transpose(board)
+    if direction == "Up":
+        return transpose(_move_rows(t, ROW_LEFT)), _score_rows(t)
+    if direction == "Down":
+        return transpose(_move_rows(t, ROW_RIGHT)), _score_rows(t)
+    return board, 0
+
+
+# --- Same as move but also returns a 16 bit mask of the merged cells ---
+def move_with_merges(board, direction):
+    if direction == "Left":
+        return _move_rows(board, ROW_LEFT), _score_rows(board), _merge_rows(board, ROW_LEFT_MERGES)
+    if direction == "Right":
+        return _move_rows(board, ROW_RIGHT), _score_rows(board), _merge_rows(board, ROW_RIGHT_MERGES)
+    t = transpose(board)
+    if direction == "Up":
+        return transpose(_move_rows(t, ROW_LEFT)), _score_rows(t), _transpose_mask(_merge_rows(t, ROW_LEFT_MERGES))
+    if direction == "Down":
+        return transpose(_move_rows(t, ROW_RIGHT)), _score_rows(t), _transpose_mask(_merge_rows(t, ROW_RIGHT_MERGES))
+    return board, 0, 0
+
+
+# --- Where every tile of a 16 bit row goes when it slides left ---
+# Entries are (source index, destination index, merged), cached per row value.
+_row_plans = {}
+
+
+def _row_plan(row):
+    plan = _row_plans.get(row)
+    if plan is not None:
+        return plan
+    plan = []
+    target = 0
+    prev = 0
+    for src in range(SIZE):
+        e = (row >> (4 * src)) & 0xF
+        if not e:
+            continue
+        if e == prev and e != MAX_EXPONENT:
+            first_src, dst, _ = plan[-1]
+            plan[-1] = (first_src, dst, True)
+            plan.append((src, dst, True))
+            prev = 0
+        else:
+            plan.append((src, target, False))
+            target += 1
+            prev = e
+    plan = _row_plans[row] = tuple(plan)
+    return plan
+
+
+# --- Move plan for the animations: ((row, column), (row, column), merged) per tile ---
+def move_plan(board, direction):
+    is_col = direction in ("Up", "Down")
+    reverse = direction in ("Right", "Down")
+    source = transpose(board) if is_col else board
+    last = SIZE - 1
+
+    plan = []
+    for i in range(SIZE):
+        row = (source >> (16 * i)) & ROW_MASK
+        for src, dst, merged in _row_plan(_reverse_row(row) if reverse else row):
+            if reverse:
+                src, dst = last - src, last - dst
+            if is_col:
+                plan.append(((src, i), (dst, i), merged))
+            else:
+                plan.append(((i, src), (i, dst), merged))
+    return plan
+
+
+def mask_cells(mask):
+    cells = []
+    while mask:
+        low = mask & -mask
+        i = low.bit_length() - 1
+        cells.append((i // SIZE, i % SIZE))
+        mask ^= low
+    return cells
+
+
+# --- Legality and end of game checks ---
+def can_move(board, direction):
+    return move(board, direction)[0] != board
+
+
+def legal_moves(board):
+    return [d for d in DIRECTIONS if move(board, d)[0] != board]
+
+
+# --- Empty cells as a mask with the low bit of every empty nibble set ---
+def empty_mask(board):
+    x = board | (board >> 1)
+    x |= x >> 2
+    return ~x & _NIBBLE_ONES
+
+
+# --- Index of the k-th set cell of a mask, counted in row major order ---
+def select_cell(mask, k):
+    for _ in range(k):
+        mask &= mask - 1
+    return ((mask & -mask).bit_length() - 1) >> 2
+
+
+def count_empty(board):
+    return popcount(empty_mask(board))
+
+
+def _has_pair(board):
+    return (ROW_HAS_PAIR[board & ROW_MASK]
+            or ROW_HAS_PAIR[(board >> 16) & ROW_MASK]
+            or ROW_HAS_PAIR[(board >> 32) & ROW_MASK]
+            or ROW_HAS_PAIR[(board >> 48) & ROW_MASK])
+
+
+def is_game_over(board):
+    if empty_mask(board):
+        return False
+    return not (_has_pair(board) or _has_pair(transpose(board)))
+
+
+def max_exponent(board):
+    return max(ROW_MAX[board & ROW_MASK], ROW_MAX[(board >> 16) & ROW_MASK],
+               ROW_MAX[(board >> 32) & ROW_MASK], ROW_MAX[(board >> 48) & ROW_MASK])
+
+
+def max_tile(board):
+    e = max_exponent(board)
+    return 1 << e if e else 0
+
+
+def is_won(board):
+    return max_exponent(board) >= WIN_EXPONENT
+
+
+# --- Spawning ---
+def empty_cells(board):
+    mask = empty_mask(board)
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(divmod((low.bit_length() - 1) >> 2, SIZE))
+        mask ^= low
+    return cells
+
+
+# One draw for the value and one for the cell, picked straight from the empty
+# mask. empty can be passed in by callers that already track it (Game does).
+def spawn(board, rng=random, value=None, empty=None):
+    if empty is None:
+        empty = empty_mask(board)
+    if not empty:
+        return board, None
+    if value is None:
+        value = NEW_RANDOM_TILES[rng.randint(0, len(NEW_RANDOM_TILES) - 1)]
+    i = select_cell(empty, rng.randint(0, popcount(empty) - 1))
+    return board | (value.bit_length() - 1) << (4 * i), divmod(i, SIZE)
+
+
+# --- Stateful game used by the UI and the headless tools ---
+# Every new game gets its own seed, so its spawns can be replayed exactly.
+# An optional recorder (see replay.py) is told about every start, move and spawn.
+# rules is this module for 4x4 or a boards.rules_for(rows, columns) engine.
+# The empty cell mask is kept next to the board: a move recomputes it with a
+# few word operations and a spawn clears one bit, so full() is a plain test.
+class Game:
+    def __init__(self, board=0, score=0, rng=None, recorder=None, rules=None):
+        self._rules = rules or sys.modules[__name__]
+        self.board = board
+        self.score = score
+        self.rng = rng or random.Random()
+        self.seed = None
+        self.recorder = recorder
+        self.last_spawned_tile = None
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self._board = board
+        self.empty = self._rules.empty_mask(board)
+
+    # --- Other rules (board size) read the same board with their own mask ---
+    @property
+    def rules(self):
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = rules
+        self.empty = rules.empty_mask(self._board)
+
+    def new_game(self, seed=None):
+        if seed is None:
+            seed = self.rng.getrandbits(63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._deal(seed, new_game=True)
+
+    # --- New game on a generator the caller keeps, e.g. a server session's ---
+    def new(self, rng):
+        self.seed = None
+        self.rng = rng
+        self._deal(None, new_game=False)
+
+    def _deal(self, seed, new_game):
+        self.board = 0
+        self.score = 0
+        self.last_spawned_tile = None
+        if self.recorder is not None:
+            self.recorder.start(seed, 0, 0, new_game=new_game)
+        for _ in range(2):
+            self._spawn(2)
+
+    # --- Start recording from the current position (loaded or edited board) ---
+    def resume(self):
+        if self.recorder is not None:
+            self.recorder.start(self.seed, self.board, self.score)
+
+    def spawn(self):
+        return self._spawn()
+
+    def _spawn(self, value=None):
+        rules = self.rules
+        self._board, cell = rules.spawn(self._board, self.rng, value, self.empty)
+        if cell is None:
+            return None
+        row, column = cell
+        index = row * rules.COLS + column
+        self.empty &= ~(1 << (rules.CELL_BITS * index))
+        self.last_spawned_tile = cell
+        if self.recorder is not None:
+            self.recorder.spawn(index, rules.get_tile(self._board, row, column).bit_length() - 1)
+        return cell
+
+    # --- Returns the list of merged cells, or None if the board did not move ---
+    def move(self, direction):
+        successor = self.rules.move_with_merges(self._board, direction)
+        if successor[0] == self._board:
+            return None
+        return self.commit(direction, successor)
+
+    # --- (board, gained, merge mask) for every direction, None where nothing moves ---
+    # The window works these out while it is idle, a keypress then only commits one.
+    def successors(self):
+        board = self._board
+        move_with_merges = self.rules.move_with_merges
+        result = {}
+        for direction in self.rules.DIRECTIONS:
+            successor = move_with_merges(board, direction)
+            result[direction] = successor if successor[0] != board else None
+        return result
+
+    # --- Put a given tile on an empty cell, for moves played elsewhere (advisor.py) ---
+    def place(self, cell, value):
+        row, column = cell
+        rules = self.rules
+        self.board = rules.set_tile(self._board, row, column, value)
+        self.last_spawned_tile = cell
+        if self.recorder is not None:
+            self.recorder.spawn(row * rules.COLS + column, value.bit_length() - 1)
+        return cell
+
+    # --- Apply a successor of the current board, returns the merged cells ---
+    def commit(self, direction, successor):
+        new_board, gained, merges = successor
+        self.board = new_board
+        self.score += gained
+        if self.recorder is not None:
+            self.recorder.move(direction, new_board, self.score)
+        return self.rules.mask_cells(merges)
+
+    def full(self):
+        return not self.empty
+
+    def won(self):
+        return self.rules.is_won(self._board)
+
+    def over(self):
+        return not self.empty and self.rules.is_game_over(self._board)
+
+    def grid(self):
+        return self.rules.unpack(self.board)
@@ -0,0 +1,165 @@
+# --- 2048 reinforcement learning environments ---
+# Gym style reset/step wrappers around the game rules. Actions are indices into
+# engine.DIRECTIONS (0 Up, 1 Right, 2 Down, 3 Left), the reward is the merge
+# score the move adds and an action that doesn't move the board is a no-op
+# (no spawn, reward -invalid_penalty).
+#
+# Env plays one game on engine.Game and works for every board size. VecEnv
+# steps N 4x4 games in lockstep on batch.py, so it needs NumPy and has no
+# per-game Python loop. Finished games are reset inside step().
+#
+# Observations: "packed" (the packed board), "grid" (tile values), "log2"
+# (exponents) or "planes" (one-hot exponent planes, NumPy for Env too). There
+# is a plane for every exponent up to rules.MAX_EXPONENT, PLANES on 4x4, more
+# on the bigger boards where tiles go past 2^15.
+
+import random
+
+import boards
+import engine
+
+OBSERVATIONS = ("packed", "grid", "log2", "planes")
+PLANES = 16
+
+
+# --- One game ---
+class Env:
+    def __init__(self, seed=None, observation="packed", rows=4, columns=4, invalid_penalty=0.0, max_steps=None):
+        if observation not in OBSERVATIONS:
+            raise ValueError(f"Unknown observation {observation!r}, use one of {OBSERVATIONS}")
+        self.observation = observation
+        self.rules = boards.rules_for(rows, columns)
+        self.invalid_penalty = invalid_penalty
+        self.max_steps = max_steps
+        self.rng = random.Random(seed)
+        self.game = engine.Game(rng=self.rng, rules=self.rules)
+        self.planes = self.rules.MAX_EXPONENT + 1
+        self.steps = 0
+
+    @property
+    def action_count(self):
+        return len(engine.DIRECTIONS)
+
+    def reset(self, seed=None):
+        self.game.new_game(self.rng.getrandbits(63) if seed is None else seed)
+        self.steps = 0
+        return self.observe()
+
+    def step(self, action):
+        game = self.game
+        before = game.score
+        moved = game.move(engine.DIRECTIONS[action]) is not None
+        if moved:
+            game.spawn()
+            reward = game.score - before
+        else:
+            reward = -self.invalid_penalty
+        self.steps += 1
+
+        done = game.over()
+        truncated = self.max_steps is not None and self.steps >= self.max_steps
+        info = {
+            "moved": moved,
+            "score": game.score,
+            "max_tile": self.rules.max_tile(game.board),
+            "truncated": truncated and not done,
+        }
+        return self.observe(), reward, done or truncated, info
+
+    # --- Legal actions in DIRECTIONS order ---
+    def legal_mask(self):
+        board = self.game.board
+        move = self.rules.move
+        return [move(board, d)[0] != board for d in engine.DIRECTIONS]
+
+    def observe(self):
+        board = self.game.board
+        if self.observation == "packed":
+            return board
+        if self.observation == "grid":
+            return self.rules.unpack(board)
+        exponents = [[self.rules.get_exponent(board, r, c) for c in range(self.rules.COLS)]
+                     for r in range(self.rules.ROWS)]
+        if self.observation == "log2":
+            return exponents
+        import numpy as np
+
+        return (np.arange(self.planes)[:, None, None] == np.array(exponents)[None]).astype(np.uint8)
+
+
+# --- N games in lockstep ---
+class VecEnv:
+    def __init__(self, num_envs, seed=None, observation="packed", invalid_penalty=0.0, max_steps=None):
+        import numpy as np
+
+        import batch
+
+        if observation not in OBSERVATIONS:
+            raise ValueError(f"Unknown observation {observation!r}, use one of {OBSERVATIONS}")
+        self.np = np
+        self.batch = batch
+        self.num_envs = num_envs
+        self.observation = observation
+        self.invalid_penalty = invalid_penalty
+        self.max_steps = max_steps
+        self.rng = np.random.default_rng(seed)
+        self.boards = np.zeros(num_envs, dtype=np.uint64)
+        self.scores = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+    @property
+    def action_count(self):
+        return len(engine.DIRECTIONS)
+
+    def reset(self):
+        self.boards = self.batch.new_boards(self.num_envs, self.rng)
+        self.scores[:] = 0
+        self.steps[:] = 0
+        return self.observe()
+
+    # --- actions is one index or an array with one index per game ---
+    # Returns (observations, rewards, dones, info). For the games that ended
+    # info["final_boards"] and info["final_scores"] hold the last position and
+    # score, the observation is already the first one of the next game.
+    def step(self, actions):
+        np, batch = self.np, self.batch
+        new_boards, gained, _, moved = batch.move(self.boards, actions)
+        spawned, _ = batch.spawn(new_boards, self.rng)
+        boards = np.where(moved, spawned, new_boards)
+
+        rewards = gained.astype(np.float32)
+        if self.invalid_penalty:
+            rewards[~moved] = -self.invalid_penalty
+        self.scores += gained
+        self.steps += 1
+
+        dones = batch.is_game_over(boards)
+        if self.max_steps is not None:
+            dones |= self.steps >= self.max_steps
+        info = {"moved": moved, "scores": self.scores.copy()}
+
+        ended = np.flatnonzero(dones)
+        if ended.size:
+            info["final_boards"] = boards[ended]
+            info["final_scores"] = self.scores[ended]
+            boards[ended] = batch.new_boards(ended.size, self.rng)
+            self.scores[ended] = 0
+            self.steps[ended] = 0
+        self.boards = boards
+        return self.observe(), rewards, dones, info
+
+    # --- Legal actions, shape (N, 4) in DIRECTIONS order ---
+    def legal_mask(self):
+        return self.batch.legal_moves(self.boards)
+
+    def observe(self):
+        np = self.np
+        if self.observation == "packed":
+            return self.boards.copy()
+        exponents = ((self.boards[:, None] >> self.batch._NIBBLE_SHIFTS) & np.uint64(0xF)).astype(np.uint8)
+        exponents = exponents.reshape(-1, engine.SIZE, engine.SIZE)
+        if self.observation == "log2":
+            return exponents
+        if self.observation == "grid":
+            return np.where(exponents > 0, np.left_shift(1, exponents, dtype=np.uint32), 0).astype(np.uint32)
+        return (exponents[:, None] == np.arange(PLANES, dtype=np.uint8)[None, :, None, None]).astype(np.uint8)
@@ -0,0 +1,94 @@
+# --- 2048 undo/redo history ---
+# Fixed-capacity ring buffer of game states kept in flat typed arrays: the
+# packed board, score, high score, spawned cell and overlay flag take 27 bytes
+# per state (8 + 8 + 8 + 1 + 1 + 1), so 10,000 moves fit in about 270 KB. Undo
+# and redo only move a cursor, pushing past the capacity drops the oldest
+# state. Boards wider than 64 bits (see boards.py) take board_bits / 64 words
+# each.
+
+from array import array
+
+NO_OVERLAY, WON, GAME_OVER = 0, 1, 2
+
+
+class History:
+    def __init__(self, capacity=10000, board_bits=64):
+        self.capacity = capacity
+        self.words = max(1, (board_bits + 63) // 64)
+        self.boards = array("Q", bytes(8 * capacity * self.words))
+        self.scores = array("Q", bytes(8 * capacity))
+        self.high_scores = array("Q", bytes(8 * capacity))
+        self.spawned_rows = array("b", bytes(capacity))
+        self.spawned_columns = array("b", bytes(capacity))
+        self.overlays = array("B", bytes(capacity))
+        self.start = 0
+        self.count = 0
+        self.cursor = -1
+
+    def __len__(self):
+        return self.count
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.boards, self.scores, self.high_scores,
+                                                    self.spawned_rows, self.spawned_columns, self.overlays))
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+        self.cursor = -1
+
+    # --- Store a state after the current one, dropping the redo branch ---
+    def push(self, board, score, high_score, spawned=None, overlay=NO_OVERLAY):
+        self.count = self.cursor + 1
+        if self.count == self.capacity:
+            self.start = (self.start + 1) % self.capacity
+            self.count -= 1
+        i = (self.start + self.count) % self.capacity
+        if self.words == 1:
+            self.boards[i] = board
+        else:
+            for k in range(self.words):
+                self.boards[i * self.words + k] = (board >> (64 * k)) & 0xFFFFFFFFFFFFFFFF
+        self.scores[i] = score
+        self.high_scores[i] = high_score
+        self.spawned_rows[i], self.spawned_columns[i] = spawned or (-1, -1)
+        self.overlays[i] = overlay
+        self.count += 1
+        self.cursor = self.count - 1
+
+    def can_undo(self):
+        return self.cursor > 0
+
+    def can_redo(self):
+        return self.cursor < self.count - 1
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+        self.cursor -= 1
+        return self.current()
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        self.cursor += 1
+        return self.current()
+
+    def current(self):
+        if self.cursor < 0:
+            return None
+        i = (self.start + self.cursor) % self.capacity
+        if self.words == 1:
+            board = self.boards[i]
+        else:
+            board = 0
+            for k in range(self.words):
+                board |= self.boards[i * self.words + k] << (64 * k)
+        row = self.spawned_rows[i]
+        return {
+            "board": board,
+            "score": self.scores[i],
+            "high_score": self.high_scores[i],
+            "last_spawned_tile": None if row < 0 else (row, self.spawned_columns[i]),
+            "overlay": self.overlays[i],
+        }
@@ -0,0 +1,373 @@
+# --- 2048 n-tuple network ---
+# Value function over afterstates: a handful of 4-6 cell tuples, each one read
+# from the packed board as an index into its own float32 weight table. Every
+# tuple is looked up on all eight symmetries of the board and the values are
+# summed. Cells that are next to each other in the board are next to each
+# other in the 64-bit integer too, so a tuple is read with one shift and mask
+# per run of consecutive cells instead of one per cell.
+#
+# Weights live in one flat file that is memory mapped: read-only workers share
+# a single copy through the page cache, training maps it writable. The scalar
+# path (the AI, the self-play policies) reads it through a memoryview and needs
+# no NumPy, evaluate_batch uses NumPy for many boards at once.
+#
+# python ntuple.py train weights.ntn --games 20000
+# python ntuple.py play weights.ntn --games 100
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+from collections import deque
+
+import engine
+
+MAGIC = b"2048NTN\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sHH")
+_TUPLE = struct.Struct("<B15s")
+_ALIGN = 64
+_CHUNK = 16384
+
+# Four 6-tuples (two straight, two 2x3 blocks), 16^6 weights each: 256 MB
+DEFAULT_TUPLES = ((0, 1, 2, 3, 4, 5), (4, 5, 6, 7, 8, 9), (0, 1, 2, 4, 5, 6), (4, 5, 6, 8, 9, 10))
+# Rows and squares of 4 cells, 1.25 MB, trains in minutes
+SMALL_TUPLES = ((0, 1, 2, 3), (4, 5, 6, 7), (0, 1, 4, 5), (1, 2, 5, 6), (5, 6, 9, 10))
+TUPLE_SETS = {"default": DEFAULT_TUPLES, "small": SMALL_TUPLES}
+
+
+class NTupleError(Exception):
+    pass
+
+
+# --- The eight symmetries of a packed board ---
+def _flip_columns(b):
+    b = ((b >> 4) & 0x0F0F0F0F0F0F0F0F) | ((b & 0x0F0F0F0F0F0F0F0F) << 4)
+    return ((b >> 8) & 0x00FF00FF00FF00FF) | ((b & 0x00FF00FF00FF00FF) << 8)
+
+
+def _flip_rows(b):
+    b = ((b >> 16) & 0x0000FFFF0000FFFF) | ((b & 0x0000FFFF0000FFFF) << 16)
+    return (b >> 32) | ((b & 0xFFFFFFFF) << 32)
+
+
+def symmetries(board):
+    h = _flip_columns(board)
+    v = _flip_rows(board)
+    hv = _flip_rows(h)
+    transpose = engine.transpose
+    return (board, h, v, hv, transpose(board), transpose(h), transpose(v), transpose(hv))
+
+
+# --- Split a tuple into runs of consecutive cells ---
+# Each run is (board shift, mask, index shift), the tuple index is the sum of
+# ((board >> board shift) & mask) << index shift over its runs.
+def _runs(cells):
+    runs = []
+    start = 0
+    for i in range(1, len(cells) + 1):
+        if i == len(cells) or cells[i] != cells[i - 1] + 1:
+            length = i - start
+            runs.append((4 * cells[start], (1 << (4 * length)) - 1, 4 * start))
+            start = i
+    return tuple(runs)
+
+
+class NTupleNetwork:
+    def __init__(self, tuples=DEFAULT_TUPLES, path=None, writable=False):
+        self.tuples = tuple(tuple(t) for t in tuples)
+        for cells in self.tuples:
+            if not 1 <= len(cells) <= 8 or any(not 0 <= c < 16 for c in cells) or len(set(cells)) != len(cells):
+                raise NTupleError(f"bad tuple {cells}")
+        self.path = path
+        self.writable = writable
+
+        self.offsets = []
+        size = 0
+        for cells in self.tuples:
+            self.offsets.append(size)
+            size += 16 ** len(cells)
+        self.size = size
+        self.data_offset = _align(_HEADER.size + _TUPLE.size * len(self.tuples))
+        self._plans = tuple((offset, _runs(cells)) for offset, cells in zip(self.offsets, self.tuples))
+        self.feature_count = 8 * len(self.tuples)
+
+        self._file = None
+        if path is None:
+            self._buffer = bytearray(self.data_offset + 4 * size)
+        else:
+            self._file = open(path, "r+b" if writable else "rb")
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=access)
+        self._view = memoryview(self._buffer)
+        self.values = self._view[self.data_offset:].cast("f")
+        self._array = None
+
+    # --- Files ---
+    @classmethod
+    def create(cls, path, tuples=DEFAULT_TUPLES):
+        tuples = tuple(tuple(t) for t in tuples)
+        header = _HEADER.pack(MAGIC, VERSION, len(tuples))
+        for cells in tuples:
+            header += _TUPLE.pack(len(cells), bytes(cells))
+        data_offset = _align(len(header))
+        with open(path, "wb") as f:
+            f.write(header.ljust(data_offset, b"\x00"))
+            # Zero weights, the file system keeps them sparse until trained
+            f.truncate(data_offset + 4 * sum(16 ** len(cells) for cells in tuples))
+        return cls(tuples, path, writable=True)
+
+    @classmethod
+    def open(cls, path, writable=False):
+        with open(path, "rb") as f:
+            raw = f.read(_HEADER.size)
+            if len(raw) < _HEADER.size:
+                raise NTupleError(f"{path} is not an n-tuple weight file")
+            magic, version, count = _HEADER.unpack(raw)
+            if magic != MAGIC or version != VERSION:
+                raise NTupleError(f"{path} is not an n-tuple weight file")
+            tuples = []
+            for _ in range(count):
+                length, cells = _TUPLE.unpack(f.read(_TUPLE.size))
+                tuples.append(tuple(cells[:length]))
+        network = cls(tuples, path, writable)
+        if len(network._buffer) != network.data_offset + 4 * network.size:
+            network.close()
+            raise NTupleError(f"{path} has the wrong size for its tuples")
+        return network
+
+    def save(self, path):
+        if self._file is not None and os.path.abspath(path) == os.path.abspath(self.path):
+            self.flush()
+            return
+        header = _HEADER.pack(MAGIC, VERSION, len(self.tuples))
+        for cells in self.tuples:
+            header += _TUPLE.pack(len(cells), bytes(cells))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(header.ljust(self.data_offset, b"\x00"))
+            f.write(self._view[self.data_offset:])
+        os.replace(tmp, path)
+
+    def flush(self):
+        if self._file is not None and self.writable:
+            self._buffer.flush()
+
+    def close(self):
+        self._array = None
+        self.values.release()
+        self._view.release()
+        if self._file is not None:
+            self._buffer.close()
+            self._file.close()
+
+    # --- Scalar evaluation ---
+    def features(self, board):
+        out = []
+        for b in symmetries(board):
+            for offset, runs in self._plans:
+                index = offset
+                for shift, mask, out_shift in runs:
+                    index += ((b >> shift) & mask) << out_shift
+                out.append(index)
+        return out
+
+    def value_of(self, features):
+        values = self.values
+        return sum([values[i] for i in features])
+
+    def __call__(self, board):
+        values = self.values
+        total = 0.0
+        for b in symmetries(board):
+            for offset, runs in self._plans:
+                index = offset
+                for shift, mask, out_shift in runs:
+                    index += ((b >> shift) & mask) << out_shift
+                total += values[index]
+        return total
+
+    def update(self, features, delta):
+        values = self.values
+        for i in features:
+            values[i] += delta
+
+    # --- Many boards at once, NumPy ---
+    def weights(self):
+        if self._array is None:
+            import numpy as np
+
+            self._array = np.frombuffer(self._buffer, dtype=np.float32, count=self.size, offset=self.data_offset)
+        return self._array
+
+    def evaluate_batch(self, boards):
+        import numpy as np
+
+        boards = np.ascontiguousarray(boards, dtype=np.uint64)
+        total = np.empty(boards.shape[0], dtype=np.float32)
+        # Blocks keep the temporaries in cache, the weight gathers are the cost
+        for lo in range(0, boards.shape[0], _CHUNK):
+            total[lo:lo + _CHUNK] = self._evaluate_block(boards[lo:lo + _CHUNK])
+        return total
+
+    def _evaluate_block(self, boards):
+        import numpy as np
+
+        weights = self.weights()
+        u = np.uint64
+        total = np.zeros(boards.shape[0], dtype=np.float32)
+        index = np.empty(boards.shape[0], dtype=np.uint64)
+        part = np.empty_like(index)
+        for b in symmetries_array(boards):
+            for offset, runs in self._plans:
+                index.fill(offset)
+                for shift, mask, out_shift in runs:
+                    np.right_shift(b, u(shift), out=part)
+                    part &= u(mask)
+                    part <<= u(out_shift)
+                    index += part
+                total += weights.take(index.view(np.int64))
+        return total
+
+
+def _align(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+# --- symmetries() for a uint64 array of boards, same order ---
+def symmetries_array(boards):
+    import batch
+
+    h = _flip_columns_array(boards)
+    v = _flip_rows_array(boards)
+    hv = _flip_rows_array(h)
+    transpose = batch.transpose
+    return (boards, h, v, hv, transpose(boards), transpose(h), transpose(v), transpose(hv))
+
+
+def _flip_columns_array(b):
+    import numpy as np
+
+    u = np.uint64
+    b = ((b >> u(4)) & u(0x0F0F0F0F0F0F0F0F)) | ((b & u(0x0F0F0F0F0F0F0F0F)) << u(4))
+    return ((b >> u(8)) & u(0x00FF00FF00FF00FF)) | ((b & u(0x00FF00FF00FF00FF)) << u(8))
+
+
+def _flip_rows_array(b):
+    import numpy as np
+
+    u = np.uint64
+    b = ((b >> u(16)) & u(0x0000FFFF0000FFFF)) | ((b & u(0x0000FFFF0000FFFF)) << u(16))
+    return (b >> u(32)) | ((b & u(0xFFFFFFFF)) << u(32))
+
+
+# --- Policy: the move with the best reward plus afterstate value ---
+def best_afterstate(network, board):
+    best = None
+    for direction in engine.DIRECTIONS:
+        after, reward = engine.move(board, direction)
+        if after == board:
+            continue
+        value = reward + network(after)
+        if best is None or value > best[0]:
+            best = (value, direction, after, reward)
+    return best
+
+
+def greedy_policy(network):
+    def policy(board):
+        best = best_afterstate(network, board)
+        return best[1] if best else None
+    return policy
+
+
+# --- TD(lambda) over afterstates from self-play ---
+# After every move the previous afterstate is pulled towards reward + value of
+# the new afterstate, and the terminal one towards 0. With lam > 0 the same
+# error also goes to the trace_length afterstates before it, scaled by lam^k.
+def train(network, games, alpha=0.1, lam=0.0, trace_length=5, seed=0, report_every=1000, out=sys.stdout):
+    rng = random.Random(seed)
+    rate = alpha / network.feature_count
+    history = deque(maxlen=trace_length if lam else 1)
+    decay = [lam ** k for k in range(history.maxlen)]
+    scores = []
+    start = time.perf_counter()
+    moves = 0
+
+    def learn(target):
+        delta = rate * (target - network.value_of(history[0]))
+        for k, features in enumerate(history):
+            network.update(features, delta * decay[k])
+
+    for n in range(1, games + 1):
+        game = engine.Game(rng=rng)
+        game.new_game(rng.getrandbits(63))
+        history.clear()
+        while True:
+            best = best_afterstate(network, game.board)
+            if best is None:
+                break
+            _, direction, after, reward = best
+            features = network.features(after)
+            if history:
+                learn(reward + network.value_of(features))
+            history.appendleft(features)
+            game.move(direction)
+            game.spawn()
+            moves += 1
+        if history:
+            learn(0.0)
+        scores.append(game.score)
+
+        if report_every and n % report_every == 0:
+            recent = scores[-report_every:]
+            elapsed = time.perf_counter() - start
+            print(f"games {n:>7}  mean score {sum(recent) / len(recent):>9.0f}  best {max(recent):>7}"
+                  f"  {moves / elapsed:,.0f} moves/s", file=out)
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and play the 2048 n-tuple network")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = sub.add_parser("train", help="TD training over self-play games")
+    train_parser.add_argument("weights")
+    train_parser.add_argument("--tuples", choices=sorted(TUPLE_SETS), default="default",
+                              help="tuple set for a new weight file")
+    train_parser.add_argument("--games", type=int, default=10000)
+    train_parser.add_argument("--alpha", type=float, default=0.1)
+    train_parser.add_argument("--lam", type=float, default=0.0, help="TD(lambda), 0 is TD(0)")
+    train_parser.add_argument("--trace", type=int, default=5, help="afterstates kept for lambda")
+    train_parser.add_argument("--seed", type=int, default=0)
+    train_parser.add_argument("--report", type=int, default=1000)
+
+    play_parser = sub.add_parser("play", help="play greedy games with trained weights")
+    play_parser.add_argument("weights")
+    play_parser.add_argument("--games", type=int, default=100)
+    play_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        if os.path.exists(args.weights):
+            network = NTupleNetwork.open(args.weights, writable=True)
+        else:
+            network = NTupleNetwork.create(args.weights, TUPLE_SETS[args.tuples])
+        try:
+            train(network, args.games, args.alpha, args.lam, args.trace, args.seed, args.report)
+        finally:
+            network.flush()
+            network.close()
+        return 0
+
+    import selfplay
+
+    return selfplay.main(["--policy", "ntuple", "--weights", args.weights, "--games", str(args.games),
+                          "--seed", str(args.seed), "--quiet"])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
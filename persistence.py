@@ -0,0 +1,279 @@
+# --- 2048 game state persistence ---
+# Saves run on a background thread: save() only hands over the latest snapshot,
+# the writer waits for the debounce delay so a burst of moves becomes one write.
+# Every write goes to a temp file that is fsynced and renamed over the real one,
+# the previous good file is kept next to it as a fallback.
+#
+# Two formats: the old JSON layout (plus a checksum) and a 43 byte binary
+# record holding the packed 64-bit board and, for server sessions, the state of
+# their spawn generator (version 1 records without it still load). load()
+# detects the format itself.
+# Boards other than 4x4 are always written as JSON, the size is the grid's shape.
+# Every session (window or server game) can have its own file, see session_path.
+
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+import boards
+import engine
+
+MAGIC = b"2048"
+VERSION = 2
+# magic, version, board, score, high score, spawned row, spawned column, generator state
+_RECORDS = {1: struct.Struct("<4sBQQQbb"), 2: struct.Struct("<4sBQQQbbQ")}
+_RECORD = _RECORDS[VERSION]
+_CRC = struct.Struct("<I")
+
+
+# --- Encoding ---
+def encode_json(state):
+    data = {
+        "high_score": state["high_score"],
+        "score": state["score"],
+        "last_spawned_tile": list(state["last_spawned_tile"]) if state.get("last_spawned_tile") else None,
+        "board": state["board"],
+    }
+    data["checksum"] = _json_checksum(data)
+    return json.dumps(data).encode("utf-8")
+
+
+def _json_checksum(data):
+    body = {k: data[k] for k in ("high_score", "score", "last_spawned_tile", "board")}
+    return zlib.crc32(json.dumps(body, sort_keys=True).encode("utf-8"))
+
+
+def encode_binary(state):
+    row, column = state.get("last_spawned_tile") or (-1, -1)
+    record = _RECORD.pack(MAGIC, VERSION, engine.pack(state["board"]),
+                          state["score"], state["high_score"], row, column, state.get("rng_state") or 0)
+    return record + _CRC.pack(zlib.crc32(record))
+
+
+# --- Decoding, returns None for anything that doesn't validate ---
+def decode(raw):
+    if raw[:4] == MAGIC:
+        return decode_binary(raw)
+    return decode_json(raw)
+
+
+# --- "rng_state" is only in the state when the record has one (0 means none) ---
+def decode_binary(raw):
+    layout = _RECORDS.get(raw[4]) if len(raw) > 4 else None
+    if layout is None or len(raw) != layout.size + _CRC.size:
+        return None
+    record = raw[:layout.size]
+    if _CRC.unpack(raw[layout.size:])[0] != zlib.crc32(record):
+        return None
+    magic, version, board, score, high_score, row, column, *rng_state = layout.unpack(record)
+    state = {
+        "high_score": high_score,
+        "score": score,
+        "last_spawned_tile": (row, column) if row >= 0 else None,
+        "board": engine.unpack(board),
+    }
+    if rng_state and rng_state[0]:
+        state["rng_state"] = rng_state[0]
+    return state if validate(state) else None
+
+
+def decode_json(raw):
+    try:
+        data = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    # Files written before the checksum existed are still accepted
+    if "checksum" in data:
+        try:
+            if data["checksum"] != _json_checksum(data):
+                return None
+        except (KeyError, TypeError):
+            return None
+
+    # Checked before it is turned into a tuple, the file may hold anything here
+    last_tile = data.get("last_spawned_tile")
+    if last_tile is not None and last_tile != [] and not (isinstance(last_tile, list) and len(last_tile) == 2):
+        return None
+    state = {
+        "high_score": data.get("high_score", 0),
+        "score": data.get("score", 0),
+        "last_spawned_tile": tuple(last_tile) if last_tile else None,
+        "board": data.get("board"),
+    }
+    return state if validate(state) else None
+
+
+def validate(state):
+    for key in ("score", "high_score"):
+        if not isinstance(state[key], int) or isinstance(state[key], bool) or state[key] < 0:
+            return False
+
+    board = state["board"]
+    if not isinstance(board, list) or not board or not isinstance(board[0], list):
+        return False
+    rows, columns = len(board), len(board[0])
+    try:
+        rules = boards.rules_for(rows, columns)
+    except ValueError:
+        return False
+    for row in board:
+        if not isinstance(row, list) or len(row) != columns:
+            return False
+        for v in row:
+            if not isinstance(v, int) or v < 0 or v > 1 << rules.MAX_EXPONENT or v & (v - 1) or v == 1:
+                return False
+
+    tile = state["last_spawned_tile"]
+    if tile is not None:
+        if len(tile) != 2 or not all(isinstance(i, int) and not isinstance(i, bool) and 0 <= i < n
+                                     for i, n in zip(tile, (rows, columns))):
+            return False
+    return True
+
+
+def _fits_binary(state):
+    board = state["board"]
+    return len(board) == engine.SIZE and len(board[0]) == engine.SIZE
+
+
+# --- One state file per session, instead of the single ~/gamestate.json ---
+# Names are limited to letters, digits, - and _ so they can't leave the folder.
+SESSIONS_DIR = os.path.join(os.path.expanduser("~"), "2048-sessions")
+_SESSION_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
+
+
+def valid_session(name):
+    return isinstance(name, str) and 0 < len(name) <= 64 and set(name) <= _SESSION_CHARS
+
+
+def session_path(name, folder=None, binary=False):
+    if not valid_session(name):
+        raise ValueError(f"bad session name {name!r}")
+    return os.path.join(folder or SESSIONS_DIR, name + (".bin" if binary else ".json"))
+
+
+# --- Atomic file helpers ---
+def write_atomic(path, raw, backup=True):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    if backup and os.path.exists(path):
+        os.replace(path, path + ".bak")
+    os.replace(tmp, path)
+
+
+def read_state(path):
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    # A file that doesn't decode counts as missing, so load() falls back to .bak
+    try:
+        return decode(raw)
+    except (TypeError, ValueError, KeyError, OverflowError, struct.error):
+        return None
+
+
+# --- Debounced background writer ---
+class GameStateStore:
+    def __init__(self, path, binary=False, delay=0.5):
+        self.path = path
+        self.binary = binary
+        self.delay = delay
+        self.errors = 0
+        self.writes = 0
+
+        self._pending = None
+        self._written = 0
+        self._requested = 0
+        self._flushing = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="gamestate-writer", daemon=True)
+        self._thread.start()
+
+    # --- Load the file, falling back to the last good snapshot ---
+    def load(self):
+        state = read_state(self.path)
+        if state is None:
+            state = read_state(self.path + ".bak")
+        return state
+
+    # --- The main file only, quiet when it is missing or broken (first frame) ---
+    def peek(self):
+        return read_state(self.path)
+
+    def exists(self):
+        return os.path.exists(self.path) or os.path.exists(self.path + ".bak")
+
+    # --- Queue a snapshot, returns immediately ---
+    def save(self, state):
+        with self._lock:
+            self._pending = state
+            self._requested += 1
+            self._lock.notify_all()
+
+    # --- Block until everything saved so far is on disk ---
+    def flush(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            target = self._requested
+            self._flushing += 1
+            self._lock.notify_all()
+            try:
+                while self._written < target and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._lock.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+        self._thread.join(timeout=1.0)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._pending is None and not self._closed:
+                    self._lock.wait()
+                if self._pending is None and self._closed:
+                    return
+                # Debounce: keep taking newer snapshots until the delay passes
+                # quietly or someone is waiting in flush()
+                deadline = time.monotonic() + self.delay
+                while not self._closed and not self._flushing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    requested = self._requested
+                    self._lock.wait(remaining)
+                    if self._requested == requested:
+                        break
+                state, self._pending = self._pending, None
+                target = self._requested
+
+            try:
+                raw = encode_binary(state) if self.binary and _fits_binary(state) else encode_json(state)
+                write_atomic(self.path, raw)
+                self.writes += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"DEBUG: Error saving game state: {type(e).__name__}: {e}")
+
+            with self._lock:
+                self._written = max(self._written, target)
+                self._lock.notify_all()
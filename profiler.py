@@ -0,0 +1,269 @@
+# --- 2048 profiling ---
+# Opt-in timing for the hot paths. PROFILER is off by default and then costs
+# next to nothing: phase() hands back one shared no-op context and wrap()
+# returns the function it was given. Turned on it keeps, per phase, a rolling
+# histogram of the last `window` durations plus call counts and total/own time
+# (own time leaves out nested phases), and plain counters (moves, nodes,
+# canvas operations) for rates.
+#
+# The window's debug frame shows a one line summary and exports the data, the
+# headless runs (selfplay --profile, the AI) use the same object. Exports are
+# JSON or a pstats file (python -m pstats, snakeviz) with one entry per phase.
+
+import json
+import marshal
+import math
+import time
+from collections import deque
+
+_FILE = "2048"
+
+
+# --- Last `window` samples of one value, plus all-time count, sum and max ---
+class RollingHistogram:
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p, ordered=None):
+        ordered = ordered if ordered is not None else sorted(self.samples)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))]
+
+    # --- Window counts per power of two bucket, keyed by the bucket's upper bound ---
+    def buckets(self):
+        counts = {}
+        for value in self.samples:
+            bound = 2.0 ** math.ceil(math.log2(value)) if value > 0 else 0.0
+            counts[bound] = counts.get(bound, 0) + 1
+        return dict(sorted(counts.items()))
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50, ordered),
+            "p90": self.percentile(90, ordered),
+            "p99": self.percentile(99, ordered),
+            "max": self.max,
+            "buckets": self.buckets(),
+        }
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullPhase()
+
+
+class _Phase:
+    __slots__ = ("profiler", "name", "start", "children")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.children = 0.0
+
+    def __enter__(self):
+        self.profiler.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler.stack
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            parent.children += elapsed
+        self.profiler.record(self.name, elapsed, elapsed - self.children, parent.name if parent else None)
+        return False
+
+
+class Profiler:
+    def __init__(self, window=1000):
+        self.window = window
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.phases = {}
+        self.edges = {}
+        self.counters = {}
+        self.marks = {}
+        self.stack = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            self.started = time.perf_counter()
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            self.seconds += time.perf_counter() - self.started
+            self.stack = []
+
+    # --- Seconds spent enabled, the base for the rates ---
+    def elapsed(self):
+        return self.seconds + (time.perf_counter() - self.started if self.enabled else 0.0)
+
+    # --- with PROFILER.phase("render"): ... ---
+    def phase(self, name):
+        if not self.enabled:
+            return _NULL
+        return _Phase(self, name)
+
+    # --- Time every call of func as a phase, or func itself when disabled ---
+    def wrap(self, name, func):
+        if not self.enabled:
+            return func
+
+        def timed(*args, **kwargs):
+            with _Phase(self, name):
+                return func(*args, **kwargs)
+        return timed
+
+    def record(self, name, seconds, own=None, parent=None):
+        own = seconds if own is None else own
+        self.sample(name, seconds * 1000.0)
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += own
+        if parent is not None:
+            edge = self.edges.get((parent, name))
+            if edge is None:
+                edge = self.edges[parent, name] = [0, 0.0, 0.0]
+            edge[0] += 1
+            edge[1] += seconds
+            edge[2] += own
+
+    def sample(self, name, value):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = RollingHistogram(self.window)
+        histogram.add(value)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    # --- Sample how much a counter grew since the last mark, e.g. canvas ops per frame ---
+    def mark(self, counter, name):
+        value = self.counters.get(counter, 0)
+        self.sample(name, value - self.marks.get(counter, value))
+        self.marks[counter] = value
+
+    # --- Reports ---
+    def report(self):
+        elapsed = self.elapsed()
+        return {
+            "seconds": elapsed,
+            "histograms": {name: h.summary() for name, h in sorted(self.histograms.items())},
+            "phases": {name: {"calls": n, "total_seconds": total, "own_seconds": own}
+                       for name, (n, total, own) in sorted(self.phases.items())},
+            "counters": dict(sorted(self.counters.items())),
+            "rates": {name + "_per_sec": n / elapsed if elapsed > 0 else 0.0 for name, n in sorted(self.counters.items())},
+        }
+
+    # --- p50/p99 of a few histograms on one line, for the debug frame ---
+    def summary(self, names=None):
+        parts = []
+        for name in names or sorted(self.histograms):
+            histogram = self.histograms.get(name)
+            if histogram is None or not histogram.count:
+                continue
+            ordered = sorted(histogram.samples)
+            parts.append(f"{name} {histogram.percentile(50, ordered):.2f}/{histogram.percentile(99, ordered):.2f}")
+        return "  ".join(parts)
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    # --- pstats file: one function per phase, nested phases as caller edges ---
+    def export_pstats(self, path):
+        stats = {}
+        for name, (n, total, own) in self.phases.items():
+            callers = {}
+            for (parent, child), (en, etotal, eown) in self.edges.items():
+                if child == name:
+                    callers[_FILE, 0, parent] = (en, en, eown, etotal)
+            stats[_FILE, 0, name] = (n, n, own, total, callers)
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+    # --- Move the data of a worker process over to this profiler ---
+    def snapshot(self):
+        return {
+            "phases": self.phases,
+            "edges": list(self.edges.items()),
+            "counters": self.counters,
+            "histograms": {name: (list(h.samples), h.count, h.total, h.max) for name, h in self.histograms.items()},
+        }
+
+    def merge(self, snapshot):
+        for name, (n, total, own) in snapshot["phases"].items():
+            stats = self.phases.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += n
+            stats[1] += total
+            stats[2] += own
+        for key, (n, total, own) in snapshot["edges"]:
+            edge = self.edges.setdefault(tuple(key), [0, 0.0, 0.0])
+            edge[0] += n
+            edge[1] += total
+            edge[2] += own
+        for name, n in snapshot["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        for name, (samples, count, total, peak) in snapshot["histograms"].items():
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.samples.extend(samples)
+            histogram.count += count
+            histogram.total += total
+            histogram.max = max(histogram.max, peak)
+
+
+# --- Counts every method call made through it, e.g. on the Tk canvas ---
+class CallCounter:
+    def __init__(self, target, profiler, counter):
+        self.target = target
+        self.profiler = profiler
+        self.counter = counter
+
+    def __getattr__(self, name):
+        attr = getattr(self.target, name)
+        if not callable(attr):
+            return attr
+        profiler, counter = self.profiler, self.counter
+
+        def counted(*args, **kwargs):
+            profiler.count(counter)
+            return attr(*args, **kwargs)
+        return counted
+
+
+PROFILER = Profiler()
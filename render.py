@@ -0,0 +1,452 @@
+# --- 2048 board rendering without a window ---
+# Layout holds the geometry every backend shares: where each cell sits for a
+# given board size, cell size and padding. draw_board() and draw_tile() hold
+# the drawing itself and only call the primitives of Backend (clear, rect,
+# text, hide). The Tk canvas in Main.py is one backend, this module adds two
+# that need neither Tk nor a display:
+#
+# SVGBackend     one SVG document per board, built from per-cell fragments
+# RasterBackend  RGB pixels in pure Python, written out as PNG or PPM
+#
+# Both take a packed board (any size, rules is engine or a boards.rules_for()
+# engine) and draw it with the tile styles from styles.py. The raster backend
+# draws every tile style once and keeps each row of tiles it has put together
+# (also compressed for PNG), so a frame is mostly a join of cached rows.
+# FrameCache keeps finished frames by board, a replay that comes back to the
+# same position doesn't draw it again.
+#
+# python render.py replay ~/2048-replay.log frames/ --format png --cell-size 40
+# python render.py replay ~/2048-replay.log replay.svg --animate
+
+import argparse
+import os
+import struct
+import sys
+import zlib
+from collections import OrderedDict
+
+import engine
+import styles
+
+FORMATS = ("png", "svg", "ppm")
+
+
+# --- Geometry of a board ---
+class Layout:
+    def __init__(self, rows=engine.ROWS, columns=engine.COLS, cell_size=100, padding=10):
+        self.rows = rows
+        self.columns = columns
+        self.cell_size = cell_size
+        self.padding = padding
+        self.width = columns * cell_size + padding
+        self.height = rows * cell_size + padding
+        self.tile_size = cell_size - padding
+        self.radius = cell_size * 15 // 100
+        self.boxes = {}
+        for row in range(rows):
+            for column in range(columns):
+                x1 = column * cell_size + padding
+                y1 = row * cell_size + padding
+                self.boxes[row, column] = (x1, y1, x1 + self.tile_size, y1 + self.tile_size)
+
+    def center(self, cell):
+        x1, y1, x2, y2 = self.boxes[cell]
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
+
+# --- Point list of a rounded tile for a smoothed polygon ---
+def rounded_points(x1, y1, x2, y2, r=25):
+    return [
+        x1+r, y1,
+        x2-r, y1,
+        x2, y1, x2, y1+r,
+        x2, y2-r,
+        x2, y2, x2-r, y2,
+        x1+r, y2,
+        x1, y2, x1, y2-r,
+        x1, y1+r,
+        x1, y1
+    ]
+
+
+def _rgb(color):
+    return bytes.fromhex(color[1:])
+
+
+# --- Drawing primitives, all a backend has to provide ---
+# Every item has a key, (cell, part) with part "slot", "shadow", "tile" or
+# "text". A retained backend (the Tk canvas) reconfigures the item it made
+# for the key and hides the parts a cell doesn't show, an immediate one just
+# draws and ignores hide().
+class Backend:
+    # Tiles get a drop shadow 3 pixels down and to the right
+    shadows = True
+
+    # --- The whole board in one color, before a full frame ---
+    def clear(self, color):
+        raise NotImplementedError
+
+    # --- Filled box (x1, y1, x2, y2) with corners rounded by radius ---
+    def rect(self, key, box, fill, radius=0):
+        raise NotImplementedError
+
+    # --- Label centered on (x, y), font_class indexes styles.font_sizes() ---
+    def text(self, key, x, y, label, color, font_class):
+        raise NotImplementedError
+
+    def hide(self, key):
+        pass
+
+    # --- One cell, backends that cache whole cells wrap this ---
+    def cell(self, cell, box, radius, exponent, is_new):
+        draw_tile(self, cell, box, radius, exponent, is_new)
+
+
+# --- What a cell shows: an empty slot, or shadow, tile and label ---
+def draw_tile(backend, cell, box, radius, exponent, is_new):
+    fill, text, label, font_class = styles.tile_style(exponent, is_new)
+    if not exponent:
+        for part in ("shadow", "tile", "text"):
+            backend.hide((cell, part))
+        backend.rect((cell, "slot"), box, fill, radius)
+        return
+    x1, y1, x2, y2 = box
+    backend.hide((cell, "slot"))
+    if backend.shadows:
+        backend.rect((cell, "shadow"), (x1 + 3, y1 + 3, x2 + 3, y2 + 3), styles.SHADOW_COLOR)
+    backend.rect((cell, "tile"), box, fill, radius)
+    backend.text((cell, "text"), (x1 + x2) / 2, (y1 + y2) / 2, label, text, font_class)
+
+
+# --- A packed board through a backend, only `cells` (and no clear) when given ---
+def draw_board(backend, layout, rules, board, spawned=None, cells=None):
+    if cells is None:
+        backend.clear(styles.BOARD_COLOR)
+        cells = layout.boxes
+    get_exponent = rules.get_exponent
+    boxes, radius = layout.boxes, layout.radius
+    for cell in cells:
+        e = get_exponent(board, *cell)
+        backend.cell(cell, boxes[cell], radius, e, e != 0 and cell == spawned)
+
+
+# --- Keeps the last frames drawn, keyed by board and spawned cell ---
+class FrameCache:
+    def __init__(self, draw, capacity=4096):
+        self.draw = draw
+        self.capacity = capacity
+        self.frames = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, board, spawned=None):
+        key = (board, spawned)
+        frame = self.frames.get(key)
+        if frame is not None:
+            self.hits += 1
+            self.frames.move_to_end(key)
+            return frame
+        self.misses += 1
+        frame = self.frames[key] = self.draw(board, spawned)
+        if len(self.frames) > self.capacity:
+            self.frames.popitem(last=False)
+        return frame
+
+
+# --- Frames as SVG documents ---
+class SVGBackend(Backend):
+    def __init__(self, rules=engine, cell_size=100, padding=10):
+        self.rules = rules
+        self.layout = Layout(rules.ROWS, rules.COLS, cell_size, padding)
+        self.font_sizes = styles.font_sizes(cell_size)
+        self.fragments = {}
+        self.out = []
+        width, height = self.layout.width, self.layout.height
+        self.head = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                     f'viewBox="0 0 {width} {height}">')
+
+    def clear(self, color):
+        self.out.append(f'<rect width="{self.layout.width}" height="{self.layout.height}" fill="{color}"/>')
+
+    def rect(self, key, box, fill, radius=0):
+        x1, y1, x2, y2 = box
+        rounded = f' rx="{radius}"' if radius else ""
+        self.out.append(f'<rect x="{x1}" y="{y1}" width="{x2 - x1}" height="{y2 - y1}"{rounded} fill="{fill}"/>')
+
+    def text(self, key, x, y, label, color, font_class):
+        self.out.append(f'<text x="{x:g}" y="{y:g}" fill="{color}" font-family="Arial" '
+                        f'font-size="{self.font_sizes[font_class]}pt" text-anchor="middle" '
+                        f'dominant-baseline="central">{label}</text>')
+
+    # --- Markup of one cell, made once per cell and style ---
+    def cell(self, cell, box, radius, exponent, is_new):
+        key = (cell, exponent, is_new)
+        markup = self.fragments.get(key)
+        if markup is None:
+            out, self.out = self.out, []
+            draw_tile(self, cell, box, radius, exponent, is_new)
+            markup = self.fragments[key] = "".join(self.out)
+            self.out = out
+        self.out.append(markup)
+
+    def body(self, board, spawned=None):
+        self.out = []
+        draw_board(self, self.layout, self.rules, board, spawned)
+        body, self.out = "".join(self.out), []
+        return body
+
+    def draw(self, board, spawned=None):
+        return self.head + self.body(board, spawned) + "</svg>"
+
+    # --- One SVG that steps through the frames, each distinct board is stored once ---
+    def animate(self, boards, frame_seconds=0.15):
+        ids = {}
+        defs = []
+        steps = []
+        for i, board in enumerate(boards):
+            if board not in ids:
+                ids[board] = f"f{len(ids)}"
+                defs.append(f'<g id="{ids[board]}">{self.body(board)}</g>')
+            steps.append(f'<set attributeName="href" to="#{ids[board]}" begin="{i * frame_seconds:g}s"/>')
+        first = ids[boards[0]] if boards else ""
+        return (self.head + "<defs>" + "".join(defs) + "</defs>"
+                + f'<use href="#{first}">' + "".join(steps) + "</use></svg>")
+
+
+# --- 3x5 digit glyphs for the raster backend, one string per pixel row ---
+_GLYPHS = {
+    "0": ("111", "101", "101", "101", "111"),
+    "1": ("010", "110", "010", "010", "111"),
+    "2": ("111", "001", "111", "100", "111"),
+    "3": ("111", "001", "111", "001", "111"),
+    "4": ("101", "101", "111", "001", "001"),
+    "5": ("111", "100", "111", "001", "111"),
+    "6": ("111", "100", "111", "101", "111"),
+    "7": ("111", "001", "001", "001", "001"),
+    "8": ("111", "101", "111", "101", "111"),
+    "9": ("111", "101", "111", "001", "111"),
+}
+
+
+# --- Frames as RGB pixels ---
+# Every tile style is rasterised once into a list of pixel rows, by drawing
+# the cell into a buffer of its own. A band (one row of tiles and the padding
+# under it) is joined from those once per combination of styles and kept, so a
+# frame is a join of a few bands.
+class RasterBackend(Backend):
+    # Tiles are cached without the padding around them, a shadow wouldn't fit
+    shadows = False
+
+    def __init__(self, rules=engine, cell_size=100, padding=10, compress_level=6, band_capacity=4096):
+        self.rules = rules
+        self.layout = Layout(rules.ROWS, rules.COLS, cell_size, padding)
+        self.font_sizes = styles.font_sizes(cell_size)
+        self.compress_level = compress_level
+        self.tiles = {}
+        background = _rgb(styles.BOARD_COLOR)
+        self.pad = background * padding
+        self.blank = [background * self.layout.width] * padding
+        self.top = [b"".join(self.blank), b"\x00" + b"\x00".join(self.blank), None]
+        self.bands = {}
+        self.band_capacity = band_capacity
+        self.pixels = None
+        self.frame = []
+
+    # --- Primitives, drawing into the pixel rows of the tile being made ---
+    def clear(self, color):
+        pass
+
+    def rect(self, key, box, fill, radius=0):
+        pixels = self.pixels
+        x1, y1, x2, y2 = box
+        fill, background = _rgb(fill), _rgb(styles.BOARD_COLOR)
+        for y in range(y1, y2):
+            pixels[y][3 * x1:3 * x2] = fill * (x2 - x1)
+        # Round the corners: anything outside the corner circle is background
+        r = radius
+        for y in range(r):
+            for x in range(r):
+                if (r - x - 0.5) ** 2 + (r - y - 0.5) ** 2 > r * r:
+                    for px, py in ((x1 + x, y1 + y), (x2 - 1 - x, y1 + y), (x1 + x, y2 - 1 - y), (x2 - 1 - x, y2 - 1 - y)):
+                        pixels[py][3 * px:3 * px + 3] = background
+
+    def text(self, key, x, y, label, color, font_class):
+        pixels = self.pixels
+        size = self.layout.tile_size
+        color = _rgb(color)
+        # Glyph height follows the Tk font size, narrower if the label won't fit
+        scale = max(1, self.font_sizes[font_class] * 2 // 15)
+        while scale > 1 and 4 * len(label) * scale - scale > size * 9 // 10:
+            scale -= 1
+        width = 4 * len(label) * scale - scale
+        left, top = int((2 * x - width) // 2), int((2 * y - 5 * scale) // 2)
+        for i, digit in enumerate(label):
+            for gy, line in enumerate(_GLYPHS[digit]):
+                for gx, bit in enumerate(line):
+                    px = left + (4 * i + gx) * scale
+                    # Labels too long for the tile are cut at its edges
+                    if bit == "1" and 0 <= px and px + scale <= size:
+                        for py in range(top + gy * scale, top + (gy + 1) * scale):
+                            pixels[py][3 * px:3 * (px + scale)] = color * scale
+
+    # --- A frame only collects the cell styles, the pixels come from tile() ---
+    def cell(self, cell, box, radius, exponent, is_new):
+        self.frame.append((exponent, is_new))
+
+    # --- Pixel rows of one tile style ---
+    def tile(self, exponent, is_new):
+        key = (exponent, is_new)
+        rows = self.tiles.get(key)
+        if rows is not None:
+            return rows
+        size = self.layout.tile_size
+        self.pixels = [bytearray(_rgb(styles.BOARD_COLOR) * size) for _ in range(size)]
+        draw_tile(self, None, (0, 0, size, size), self.layout.radius, exponent, is_new)
+        rows = self.tiles[key] = [bytes(row) for row in self.pixels]
+        self.pixels = None
+        return rows
+
+    # --- One board row and the padding under it, as (RGB, PNG scanlines) ---
+    def band(self, styles_key):
+        band = self.bands.get(styles_key)
+        if band is not None:
+            return band
+        if len(self.bands) >= self.band_capacity:
+            self.bands.clear()
+        pad = self.pad
+        lines = [pad + pad.join(pixel_row) + pad for pixel_row in zip(*(self.tile(*key) for key in styles_key))]
+        lines += self.blank
+        band = self.bands[styles_key] = [b"".join(lines), b"\x00" + b"\x00".join(lines), None]
+        return band
+
+    def bands_of(self, board, spawned=None):
+        self.frame = []
+        draw_board(self, self.layout, self.rules, board, spawned)
+        frame, columns = self.frame, self.layout.columns
+        return [self.band(tuple(frame[i:i + columns])) for i in range(0, len(frame), columns)]
+
+    # --- Raw RGB, rows top to bottom ---
+    def draw(self, board, spawned=None):
+        return self.top[0] + b"".join(band[0] for band in self.bands_of(board, spawned))
+
+    # --- PNG from deflate segments compressed once per band ---
+    # Each segment ends on a full flush, so segments can be concatenated into
+    # one stream; the checksum is combined from the per-band Adler-32 values.
+    def png(self, board, spawned=None):
+        segments = [self.top] + self.bands_of(board, spawned)
+        data = []
+        checksum = 1
+        for band in segments:
+            if band[2] is None:
+                compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+                band[2] = (compressor.compress(band[1]) + compressor.flush(zlib.Z_FULL_FLUSH),
+                           zlib.adler32(band[1]), len(band[1]))
+            deflated, adler, length = band[2]
+            data.append(deflated)
+            checksum = _adler32_combine(checksum, adler, length)
+        stream = b"\x78\x01" + b"".join(data) + b"\x03\x00" + struct.pack(">I", checksum)
+        header = struct.pack(">IIBBBBB", self.layout.width, self.layout.height, 8, 2, 0, 0, 0)
+        return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header)
+                + _png_chunk(b"IDAT", stream) + _png_chunk(b"IEND", b""))
+
+    def ppm(self, board, spawned=None):
+        return b"P6 %d %d 255\n" % (self.layout.width, self.layout.height) + self.draw(board, spawned)
+
+
+# --- Adler-32 of two pieces of data from the checksum of each (zlib's adler32_combine) ---
+def _adler32_combine(adler1, adler2, length2):
+    base = 65521
+    rem = length2 % base
+    sum1 = adler1 & 0xFFFF
+    sum2 = rem * sum1 % base
+    sum1 = (sum1 + (adler2 & 0xFFFF) + base - 1) % base
+    sum2 = (sum2 + (adler1 >> 16) + (adler2 >> 16) + base - rem) % base
+    return sum1 | (sum2 << 16)
+
+
+def _png_chunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+# --- Encoded frames for a format, cached by board ---
+def frame_cache(fmt, rules=engine, cell_size=100, padding=10, capacity=4096):
+    if fmt == "svg":
+        backend = SVGBackend(rules, cell_size, padding)
+        return FrameCache(lambda board, spawned: backend.draw(board, spawned).encode(), capacity)
+    if fmt in ("png", "ppm"):
+        backend = RasterBackend(rules, cell_size, padding)
+        return FrameCache(getattr(backend, fmt), capacity)
+    raise ValueError(f"Unknown format {fmt!r}, use one of {FORMATS}")
+
+
+# --- Write one numbered file per board ---
+def export_frames(boards, directory, fmt="png", rules=engine, cell_size=100, padding=10):
+    os.makedirs(directory, exist_ok=True)
+    cache = frame_cache(fmt, rules, cell_size, padding)
+    count = 0
+    for count, board in enumerate(boards, 1):
+        with open(os.path.join(directory, f"frame-{count - 1:06d}.{fmt}"), "wb") as f:
+            f.write(cache.get(board))
+    return count, cache
+
+
+def main(argv=None):
+    import replay
+
+    parser = argparse.ArgumentParser(prog="render", description="Render 2048 boards without a window")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    replay_parser = commands.add_parser("replay", help="render the boards of a replay log")
+    replay_parser.add_argument("log")
+    replay_parser.add_argument("output", help="folder for frame files, or an .svg file with --animate")
+    replay_parser.add_argument("--format", choices=FORMATS, default="png")
+    replay_parser.add_argument("--animate", action="store_true", help="write one animated SVG")
+    replay_parser.add_argument("--start", type=int, default=0, help="first move to render")
+    replay_parser.add_argument("--moves", type=int, default=None, help="number of moves to render")
+    replay_parser.add_argument("--cell-size", type=int, default=100)
+    replay_parser.add_argument("--padding", type=int, default=None)
+    replay_parser.add_argument("--frame-seconds", type=float, default=0.15)
+
+    board_parser = commands.add_parser("board", help="render one packed 4x4 board")
+    board_parser.add_argument("board", help="packed board, e.g. 0x1234")
+    board_parser.add_argument("output", help=".png, .svg or .ppm file")
+    board_parser.add_argument("--cell-size", type=int, default=100)
+    board_parser.add_argument("--padding", type=int, default=None)
+    args = parser.parse_args(argv)
+    padding = args.padding if args.padding is not None else max(2, args.cell_size // 10)
+
+    if args.command == "board":
+        fmt = os.path.splitext(args.output)[1].lstrip(".").lower()
+        frame = frame_cache(fmt, engine, args.cell_size, padding).get(int(args.board, 0))
+        with open(args.output, "wb") as f:
+            f.write(frame)
+        return 0
+
+    try:
+        reader = replay.ReplayReader(args.log)
+    except (OSError, replay.ReplayError) as e:
+        print(f"ERROR: Failed to open replay log! {e}")
+        return 1
+    try:
+        boards = []
+        for state in reader.states():
+            if args.moves is not None and len(boards) >= args.moves:
+                break
+            if state["move"] >= args.start:
+                boards.append(state["board"])
+    finally:
+        reader.close()
+
+    if args.animate:
+        svg = SVGBackend(engine, args.cell_size, padding).animate(boards, args.frame_seconds)
+        with open(args.output, "w") as f:
+            f.write(svg)
+        print(f"{len(boards)} frames, {len(set(boards))} distinct boards -> {args.output}")
+        return 0
+    count, cache = export_frames(boards, args.output, args.format, engine, args.cell_size, padding)
+    print(f"{count} frames, {cache.misses} drawn, {cache.hits} from the cache -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+# --- 2048 replay log ---
+# Append-only binary log of every game: a START record (seed, board, score),
+# then one MOVE record per move (direction plus the board and score after the
+# slide) and one SPAWN record per placed tile. Every record is length prefixed.
+#
+# Every KEYFRAME_INTERVAL moves a KEYFRAME record with the full state is
+# written, and the same keyframe is appended to a fixed-size side index
+# (<log>.idx). Seeking to move n is a binary search over that index followed by
+# a replay of at most KEYFRAME_INTERVAL moves. Readers stream the file, nothing
+# is held in memory besides the record being looked at.
+
+import bisect
+import mmap
+import os
+import random
+import struct
+
+import engine
+
+MAGIC = b"2048LOG\x00"
+VERSION = 1
+KEYFRAME_INTERVAL = 256
+
+START, MOVE, SPAWN, KEYFRAME = 1, 2, 3, 4
+
+# START flags
+NEW_GAME = 1
+SEEDED = 2
+
+_HEADER = struct.Struct("<8sB")
+_PREFIX = struct.Struct("<HB")
+_PAYLOADS = {
+    START: struct.Struct("<QQQB"),
+    MOVE: struct.Struct("<BQQ"),
+    SPAWN: struct.Struct("<BB"),
+    KEYFRAME: struct.Struct("<QQQ"),
+}
+_INDEX = struct.Struct("<QQQQ")
+
+
+class ReplayError(Exception):
+    pass
+
+
+# --- Writer, plugs into engine.Game as its recorder ---
+class ReplayWriter:
+    def __init__(self, path, keyframe_interval=KEYFRAME_INTERVAL):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.keyframe_interval = keyframe_interval
+        self.moves = 0
+        self.board = 0
+        self.score = 0
+
+        end = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # Pick up where the last session stopped and cut off a torn record
+            reader = ReplayReader(path)
+            end, self.moves, self.board, self.score = reader.tail()
+            keyframes = reader.keyframes_before(end)
+            reader.close()
+
+        self._log = open(path, "ab")
+        if end is not None and end < self._log.tell():
+            self._log.truncate(end)
+        self._index = open(self.index_path, "ab")
+        # Keyframes of the cut off tail (or a torn index entry) go too
+        if end is not None and keyframes * _INDEX.size < self._index.tell():
+            self._index.truncate(keyframes * _INDEX.size)
+        if self._log.tell() == 0:
+            self._log.write(_HEADER.pack(MAGIC, VERSION))
+
+    def _write(self, kind, *fields):
+        payload = _PAYLOADS[kind].pack(*fields)
+        offset = self._log.tell()
+        self._log.write(_PREFIX.pack(len(payload), kind))
+        self._log.write(payload)
+        return offset
+
+    def start(self, seed, board, score, new_game=False):
+        flags = (NEW_GAME if new_game else 0) | (SEEDED if seed is not None else 0)
+        self._write(START, seed or 0, board, score, flags)
+        self.board, self.score = board, score
+
+    def move(self, direction, board, score):
+        if self.moves % self.keyframe_interval == 0:
+            offset = self._write(KEYFRAME, self.moves, self.board, self.score)
+            self._index.write(_INDEX.pack(self.moves, offset, self.board, self.score))
+        self._write(MOVE, engine.DIRECTIONS.index(direction), board, score)
+        self.moves += 1
+        self.board, self.score = board, score
+
+    def spawn(self, cell, exponent):
+        self._write(SPAWN, cell, exponent)
+        self.board |= exponent << (4 * cell)
+
+    def flush(self):
+        self._log.flush()
+        self._index.flush()
+
+    def close(self):
+        self.flush()
+        self._log.close()
+        self._index.close()
+
+
+# --- Reader ---
+class ReplayReader:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self._file = open(path, "rb")
+        header = self._file.read(_HEADER.size)
+        if len(header) < _HEADER.size or _HEADER.unpack(header)[0] != MAGIC:
+            raise ReplayError(f"{path} is not a 2048 replay log")
+        self._index = None
+        self._index_map = None
+
+    def close(self):
+        if self._index_map is not None:
+            self._index_map.close()
+        if self._index is not None:
+            self._index.close()
+        self._file.close()
+
+    # --- Yield (offset, kind, fields) for every record from offset on ---
+    def records(self, offset=None):
+        f = self._file
+        f.seek(_HEADER.size if offset is None else offset)
+        while True:
+            pos = f.tell()
+            prefix = f.read(_PREFIX.size)
+            if len(prefix) < _PREFIX.size:
+                return
+            length, kind = _PREFIX.unpack(prefix)
+            payload = f.read(length)
+            if len(payload) < length:
+                # A torn record at the end of the file is ignored
+                return
+            fmt = _PAYLOADS.get(kind)
+            if fmt is None or fmt.size != length:
+                raise ReplayError(f"bad record at offset {pos}")
+            yield pos, kind, fmt.unpack(payload)
+            f.seek(pos + _PREFIX.size + length)
+
+    # --- Yield the state after every move (spawn included) ---
+    def states(self, offset=None, move=0, board=0, score=0):
+        pending = None
+        for _, kind, fields in self.records(offset):
+            if kind == MOVE:
+                if pending is not None:
+                    yield pending
+                direction, board, score = fields
+                move += 1
+                pending = {"move": move, "direction": engine.DIRECTIONS[direction], "board": board, "score": score}
+            elif kind == SPAWN:
+                cell, exponent = fields
+                board |= exponent << (4 * cell)
+                if pending is not None:
+                    pending["board"] = board
+            elif kind == START:
+                if pending is not None:
+                    yield pending
+                    pending = None
+                _, board, score, _ = fields
+            elif kind == KEYFRAME:
+                move = fields[0]
+        if pending is not None:
+            yield pending
+
+    # --- End offset of the last complete record and the state there ---
+    # Starts from the last keyframe, so it only reads the tail of the log.
+    def tail(self):
+        offset, move, board, score = None, 0, 0, 0
+        # The index can run ahead of a log that lost its tail
+        count = self.keyframes_before(os.path.getsize(self.path))
+        if count:
+            move, offset, board, score = self.keyframe(count - 1)
+        end = _HEADER.size if offset is None else offset
+        for pos, kind, fields in self.records(offset):
+            end = pos + _PREFIX.size + _PAYLOADS[kind].size
+            if kind == MOVE:
+                _, board, score = fields
+                move += 1
+            elif kind == SPAWN:
+                board |= fields[1] << (4 * fields[0])
+            elif kind == START:
+                _, board, score, _ = fields
+            elif kind == KEYFRAME:
+                move = fields[0]
+        return end, move, board, score
+
+    # --- Keyframe index, rebuilt from the log if the side file is missing ---
+    def _load_index(self):
+        if self._index_map is not None:
+            return self._index_map
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+            self.rebuild_index()
+        self._index = open(self.index_path, "rb")
+        size = os.path.getsize(self.index_path) // _INDEX.size * _INDEX.size
+        self._index_map = mmap.mmap(self._index.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+        return self._index_map
+
+    def rebuild_index(self):
+        with open(self.index_path, "wb") as out:
+            for offset, kind, fields in self.records():
+                if kind == KEYFRAME:
+                    out.write(_INDEX.pack(fields[0], offset, fields[1], fields[2]))
+
+    def keyframe_count(self):
+        return len(self._load_index()) // _INDEX.size
+
+    def keyframe(self, i):
+        return _INDEX.unpack_from(self._load_index(), i * _INDEX.size)
+
+    # --- Number of keyframes whose record lies entirely before `end` ---
+    def keyframes_before(self, end):
+        lo, hi = 0, self.keyframe_count()
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keyframe(mid)[1] + _PREFIX.size + _PAYLOADS[KEYFRAME].size <= end:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # --- State right after move number `move` ---
+    def seek(self, move):
+        count = self.keyframe_count()
+        if count == 0:
+            raise ReplayError("log has no keyframes")
+
+        # Binary search for the last keyframe at or before the move
+        keys = _KeyframeMoves(self, count)
+        i = bisect.bisect_right(keys, move) - 1
+        if i < 0:
+            raise ReplayError(f"move {move} is before the first keyframe")
+        start_move, offset, board, score = self.keyframe(i)
+        if start_move == move:
+            return {"move": move, "board": board, "score": score}
+
+        for state in self.states(offset, start_move, board, score):
+            if state["move"] == move:
+                return state
+            if state["move"] > move:
+                break
+        raise ReplayError(f"move {move} is not in the log")
+
+
+class _KeyframeMoves:
+    def __init__(self, reader, count):
+        self.reader = reader
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.reader.keyframe(i)[0]
+
+
+# --- Re-simulate the whole log and compare with what was recorded ---
+# Moves are replayed with engine.move and must give the recorded board and
+# score. For seeded new games the spawns are also redrawn from the seed and
+# must land on the recorded cell with the recorded value.
+def verify(path, max_errors=10):
+    reader = ReplayReader(path)
+    errors = []
+    moves = 0
+    games = 0
+    board = score = 0
+    rng = None
+    forced = 0
+
+    def fail(message):
+        errors.append(f"move {moves}: {message}")
+
+    try:
+        for offset, kind, fields in reader.records():
+            if len(errors) >= max_errors:
+                break
+            if kind == START:
+                seed, board, score, flags = fields
+                games += 1
+                rng = random.Random(seed) if flags & SEEDED and flags & NEW_GAME else None
+                forced = 2 if flags & NEW_GAME else 0
+            elif kind == MOVE:
+                direction, recorded_board, recorded_score = fields
+                new_board, gained = engine.move(board, engine.DIRECTIONS[direction])
+                if new_board != recorded_board:
+                    fail(f"{engine.DIRECTIONS[direction]} gives {new_board:#018x}, log has {recorded_board:#018x}")
+                if score + gained != recorded_score:
+                    fail(f"score {score + gained}, log has {recorded_score}")
+                board, score = recorded_board, recorded_score
+                moves += 1
+            elif kind == SPAWN:
+                cell, exponent = fields
+                if rng is not None:
+                    expected, spot = engine.spawn(board, rng, 2 if forced else None)
+                    if spot is None or spot[0] * engine.SIZE + spot[1] != cell or expected != board | exponent << (4 * cell):
+                        fail(f"seeded spawn gives {spot}, log has cell {cell} exponent {exponent}")
+                        rng = None
+                forced = max(0, forced - 1)
+                if (board >> (4 * cell)) & 0xF:
+                    fail(f"spawn on occupied cell {cell}")
+                board |= exponent << (4 * cell)
+            elif kind == KEYFRAME:
+                if fields[0] != moves or fields[1] != board or fields[2] != score:
+                    fail(f"keyframe {fields} does not match state")
+    except ReplayError as e:
+        fail(str(e))
+    finally:
+        reader.close()
+
+    return {"ok": not errors, "games": games, "moves": moves, "errors": errors}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect and verify 2048 replay logs")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, help="print the board after this move")
+    parser.add_argument("--reindex", action="store_true", help="rebuild the keyframe index")
+    args = parser.parse_args(argv)
+
+    if args.reindex:
+        reader = ReplayReader(args.path)
+        reader.rebuild_index()
+        reader.close()
+    if args.seek is not None:
+        reader = ReplayReader(args.path)
+        state = reader.seek(args.seek)
+        reader.close()
+        print(f"move {state['move']}  score {state['score']}")
+        for row in engine.unpack(state["board"]):
+            print(" ".join(f"{v:>5}" for v in row))
+        return 0
+
+    report = verify(args.path)
+    print(f"games {report['games']}  moves {report['moves']}  {'OK' if report['ok'] else 'MISMATCH'}")
+    for error in report["errors"]:
+        print("  " + error)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,294 @@
+# --- 2048 self-play tournament ---
+# Plays complete games headlessly on engine.py, spread over one worker process
+# per core. Every game is reproducible from its seed: the game is started
+# with new_game(seed) and the policy gets its own generator seeded from it.
+#
+# python Main.py selfplay --policy expectimax --games 1000
+# python selfplay.py --policy mymodule:my_policy --seed 5000 --games 200
+# python selfplay.py --policy ntuple --weights weights.ntn --games 1000
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import engine
+import profiler
+
+POLICIES = ("random", "greedy", "expectimax", "ntuple")
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+# Heuristic tables are built once per worker and shared by its games, n-tuple
+# weights are memory mapped read-only so all workers share one copy
+_worker_cache = {}
+
+
+# --- Policies, each one is a callable board -> direction ---
+def random_policy(rng):
+    def policy(board):
+        legal = engine.legal_moves(board)
+        return rng.choice(legal) if legal else None
+    return policy
+
+
+def greedy_policy(rng):
+    def policy(board):
+        best, best_key = None, None
+        for direction in engine.DIRECTIONS:
+            new_board, gained = engine.move(board, direction)
+            if new_board == board:
+                continue
+            key = (gained, engine.count_empty(new_board), rng.random())
+            if best_key is None or key > best_key:
+                best, best_key = direction, key
+        return best
+    return policy
+
+
+def _network(weights):
+    import ntuple
+
+    key = ("ntuple", weights)
+    network = _worker_cache.get(key)
+    if network is None:
+        network = _worker_cache[key] = ntuple.NTupleNetwork.open(weights)
+    return network
+
+
+def ntuple_policy(weights):
+    import ntuple
+
+    if not weights:
+        raise ValueError("the ntuple policy needs --weights")
+    return ntuple.greedy_policy(_network(weights))
+
+
+def expectimax_policy(depth, weights=None):
+    import ai
+
+    if weights:
+        heuristic = _network(weights)
+    else:
+        heuristic = _worker_cache.get("heuristic")
+    if heuristic is None:
+        heuristic = _worker_cache["heuristic"] = ai.TableHeuristic().build()
+    # A fresh search per game keeps the transposition table from leaking
+    # between games, so the result only depends on the seed
+    searcher = ai.ExpectimaxAI(heuristic=heuristic, depth=depth)
+    return searcher.best_move
+
+
+# --- Resolve a policy name or a "module:function" path ---
+def make_policy(spec, seed, depth=2, weights=None):
+    rng = random.Random(f"policy:{seed}")
+    if spec == "random":
+        return random_policy(rng)
+    if spec == "greedy":
+        return greedy_policy(rng)
+    if spec == "expectimax":
+        return expectimax_policy(depth, weights)
+    if spec == "ntuple":
+        return ntuple_policy(weights)
+    if callable(spec):
+        return spec
+    if ":" in spec:
+        module_name, func_name = spec.split(":", 1)
+        return getattr(importlib.import_module(module_name), func_name)
+    raise ValueError(f"Unknown policy {spec!r}, use one of {POLICIES} or module:function")
+
+
+# --- Play one game to the end ---
+def play_game(seed, policy="random", depth=2, max_moves=None, weights=None):
+    start = time.perf_counter()
+    game = engine.Game()
+    game.new_game(seed)
+    # With profiling on every step is timed, off these are the plain callables
+    prof = profiler.PROFILER
+    choose = prof.wrap("policy", make_policy(policy, seed, depth, weights))
+    move = prof.wrap("engine", game.move)
+    spawn = prof.wrap("spawn", game.spawn)
+
+    moves = 0
+    while not game.over():
+        if max_moves is not None and moves >= max_moves:
+            break
+        direction = choose(game.board)
+        if direction is None or move(direction) is None:
+            break
+        spawn()
+        moves += 1
+    prof.count("moves", moves)
+    prof.count("games")
+
+    return {
+        "seed": seed,
+        "score": game.score,
+        "max_tile": engine.max_tile(game.board),
+        "moves": moves,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# --- A worker chunk, with profile=True it also returns the worker's profile ---
+def _play_chunk(seeds, policy, depth, max_moves, weights=None, profile=False):
+    if profile:
+        profiler.PROFILER.reset()
+        profiler.PROFILER.enable()
+    results = [play_game(seed, policy, depth, max_moves, weights) for seed in seeds]
+    if profile:
+        return results, profiler.PROFILER.snapshot()
+    return results
+
+
+# --- Run seeds over a process pool, yielding results as they finish ---
+def run_tournament(seeds, policy="random", depth=2, workers=None, chunk_size=None, max_moves=None, weights=None):
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(seeds) // (workers * 8) or 1))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, len(seeds), chunk_size)]
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from _play_chunk(chunk, policy, depth, max_moves, weights)
+        return
+
+    # Workers have their own profiler, their data is merged into this one
+    profile = profiler.PROFILER.enabled
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_play_chunk, chunk, policy, depth, max_moves, weights, profile) for chunk in chunks]
+        for future in as_completed(futures):
+            if profile:
+                results, snapshot = future.result()
+                profiler.PROFILER.merge(snapshot)
+                yield from results
+            else:
+                yield from future.result()
+
+
+# --- Aggregate statistics ---
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(results):
+    scores = sorted(r["score"] for r in results)
+    moves = sum(r["moves"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    tiles = {}
+    for r in results:
+        tiles[r["max_tile"]] = tiles.get(r["max_tile"], 0) + 1
+
+    return {
+        "games": len(results),
+        "moves": moves,
+        "game_seconds": seconds,
+        "mean_score": sum(scores) / len(scores) if scores else 0,
+        "score_percentiles": {p: percentile(scores, p) for p in PERCENTILES},
+        "best_score": scores[-1] if scores else 0,
+        "max_tile_counts": dict(sorted(tiles.items())),
+    }
+
+
+def score_histogram(results, bins=10):
+    scores = [r["score"] for r in results]
+    if not scores:
+        return []
+    lo, hi = min(scores), max(scores)
+    width = max(1, (hi - lo + bins) // bins)
+    counts = [0] * bins
+    for s in scores:
+        counts[min((s - lo) // width, bins - 1)] += 1
+    return [(lo + i * width, lo + (i + 1) * width, c) for i, c in enumerate(counts)]
+
+
+def print_summary(summary, results, wall_seconds):
+    games = summary["games"]
+    print(f"\nGames: {games}   moves: {summary['moves']}   wall time: {wall_seconds:.2f}s")
+    if wall_seconds > 0:
+        print(f"Throughput: {games / wall_seconds:.1f} games/s, {summary['moves'] / wall_seconds:.0f} moves/s")
+
+    print("\nScore percentiles")
+    print(f"  mean {summary['mean_score']:.0f}   best {summary['best_score']}")
+    for p, v in summary["score_percentiles"].items():
+        print(f"  p{p:<3} {v:>10.0f}")
+
+    print("\nScore histogram")
+    bar_scale = max((c for _, _, c in score_histogram(results)), default=1)
+    for lo, hi, count in score_histogram(results):
+        bar = "#" * int(40 * count / bar_scale)
+        print(f"  {lo:>7} - {hi:<7} {count:>6}  {bar}")
+
+    print("\nMax tile            games   reached")
+    reached = games
+    for tile, count in summary["max_tile_counts"].items():
+        print(f"  {tile:>6}  {count:>14}   {100.0 * reached / games:6.2f}%")
+        reached -= count
+
+
+def print_profile(prof):
+    report = prof.report()
+    print("\nProfile            calls    total s     p50 ms     p99 ms")
+    for name, phase in report["phases"].items():
+        h = report["histograms"][name]
+        print(f"  {name:<12} {phase['calls']:>9} {phase['total_seconds']:>10.2f} {h['p50']:>10.4f} {h['p99']:>10.4f}")
+    for name, rate in report["rates"].items():
+        print(f"  {name:<20} {rate:>14,.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="selfplay", description="Run headless 2048 self-play games")
+    parser.add_argument("--policy", default="random", help="random, greedy, expectimax, ntuple or module:function")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="first seed, games use seed .. seed+games-1")
+    parser.add_argument("--depth", type=int, default=2, help="search depth for expectimax")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--max-moves", type=int, default=None)
+    parser.add_argument("--weights", help="n-tuple weight file for ntuple, also the expectimax heuristic")
+    parser.add_argument("--output", help="write one JSON line per game to this file")
+    parser.add_argument("--quiet", action="store_true", help="don't print per-game results")
+    parser.add_argument("--profile", action="store_true", help="time policy, engine and spawn, count moves and AI nodes")
+    parser.add_argument("--profile-out", help="write the profile to this file, pstats if it ends in .prof, else JSON")
+    args = parser.parse_args(argv)
+    if args.profile or args.profile_out:
+        profiler.PROFILER.enable()
+
+    start = time.perf_counter()
+    results = []
+    out = open(args.output, "w") if args.output else None
+    try:
+        seeds = range(args.seed, args.seed + args.games)
+        for result in run_tournament(seeds, args.policy, args.depth, args.workers, max_moves=args.max_moves,
+                                     weights=args.weights):
+            results.append(result)
+            if out:
+                out.write(json.dumps(result) + "\n")
+            if not args.quiet:
+                print(f"seed {result['seed']:>8}  score {result['score']:>7}  max tile {result['max_tile']:>5}"
+                      f"  moves {result['moves']:>5}  {result['seconds']:.3f}s")
+    finally:
+        if out:
+            out.close()
+
+    print_summary(summarize(results), results, time.perf_counter() - start)
+    if profiler.PROFILER.enabled:
+        print_profile(profiler.PROFILER)
+        if args.profile_out:
+            if args.profile_out.endswith(".prof"):
+                profiler.PROFILER.export_pstats(args.profile_out)
+            else:
+                profiler.PROFILER.export_json(args.profile_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
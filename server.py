@@ -0,0 +1,522 @@
+# --- 2048 game server ---
+# Many concurrent 4x4 games behind one asyncio server, over TCP or a unix
+# socket. Framing is one JSON object per line each way:
+#
+#   {"op": "new", "seed": 5}                        start a session
+#   {"op": "attach", "session": "9f0c..."}          pick up a saved session
+#   {"op": "move", "session": "9f0c...", "direction": "Left"}
+#   {"op": "state", "session": "9f0c...", "grid": true}
+#   {"op": "hint", "session": "9f0c...", "depth": 2}
+#   {"op": "close", "session": "9f0c..."}           save and drop from memory
+#   {"op": "stats"}
+#
+# Replies carry "ok" plus the session's packed board, score and flags, and
+# echo the request's "id" if it had one.
+#
+# Sessions live in a SessionTable: parallel arrays of packed boards, scores
+# and 64-bit generator states, about 40 bytes a game plus its dict entry, so
+# tens of thousands of idle sessions cost a few MB. The moves are engine.Game
+# on the packed board, the same code as the window and self-play. Hints are
+# searched in a process pool so the event loop never waits on the AI. Every
+# session is saved to its own binary file (persistence.session_path) together
+# with its generator state, so a reloaded session spawns the same tiles it
+# would have. The files are the window's too: python Main.py --session TOKEN
+# plays a server session. Dirty sessions are written in batches off the loop,
+# and sessions that sat idle too long are saved and dropped until someone
+# attaches again.
+#
+# python server.py serve --port 2048
+# python server.py load --port 2048 --clients 64 --requests 50000
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import engine
+import persistence
+
+DEFAULT_PORT = 2048
+SESSIONS_DIR = persistence.SESSIONS_DIR
+_MASK64 = (1 << 64) - 1
+
+
+# --- Random numbers from one 64-bit state (splitmix64) ---
+# Just enough of random.Random for engine.spawn, a session stores the state
+# in its table slot instead of a 2.5 KB Random object.
+class SessionRandom:
+    __slots__ = ("state",)
+
+    def __init__(self, state):
+        self.state = state
+
+    def next64(self):
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & _MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+
+    def randint(self, a, b):
+        return a + self.next64() % (b - a + 1)
+
+    def getrandbits(self, k):
+        return self.next64() >> (64 - k)
+
+
+# --- All sessions, one slot per game in parallel arrays ---
+class SessionTable:
+    def __init__(self):
+        self.index = {}
+        self.tokens = []
+        self.boards = array("Q")
+        self.scores = array("Q")
+        self.high_scores = array("Q")
+        self.rng_states = array("Q")
+        self.spawned = array("b")
+        self.last_used = array("d")
+        self.free = []
+        self.dirty = set()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, token):
+        return token in self.index
+
+    def add(self, token, board, score, high_score, rng_state, spawned=-1):
+        if self.free:
+            slot = self.free.pop()
+            self.tokens[slot] = token
+            self.boards[slot] = board
+            self.scores[slot] = score
+            self.high_scores[slot] = high_score
+            self.rng_states[slot] = rng_state
+            self.spawned[slot] = spawned
+            self.last_used[slot] = time.monotonic()
+        else:
+            slot = len(self.tokens)
+            self.tokens.append(token)
+            self.boards.append(board)
+            self.scores.append(score)
+            self.high_scores.append(high_score)
+            self.rng_states.append(rng_state)
+            self.spawned.append(spawned)
+            self.last_used.append(time.monotonic())
+        self.index[token] = slot
+        return slot
+
+    def remove(self, token):
+        slot = self.index.pop(token)
+        self.tokens[slot] = None
+        self.dirty.discard(slot)
+        self.free.append(slot)
+
+    # --- The slot as a Game, and the Game written back ---
+    def game(self, slot):
+        game = engine.Game(self.boards[slot], self.scores[slot], rng=SessionRandom(self.rng_states[slot]))
+        spawned = self.spawned[slot]
+        game.last_spawned_tile = divmod(spawned, engine.SIZE) if spawned >= 0 else None
+        return game
+
+    def store(self, slot, game):
+        self.boards[slot] = game.board
+        self.scores[slot] = game.score
+        self.high_scores[slot] = max(self.high_scores[slot], game.score)
+        self.rng_states[slot] = game.rng.state
+        cell = game.last_spawned_tile
+        self.spawned[slot] = cell[0] * engine.SIZE + cell[1] if cell else -1
+        self.last_used[slot] = time.monotonic()
+        self.dirty.add(slot)
+
+    def state(self, slot):
+        spawned = self.spawned[slot]
+        return {
+            "board": engine.unpack(self.boards[slot]),
+            "score": self.scores[slot],
+            "high_score": self.high_scores[slot],
+            "last_spawned_tile": divmod(spawned, engine.SIZE) if spawned >= 0 else None,
+            "rng_state": self.rng_states[slot],
+        }
+
+    def nbytes(self):
+        arrays = (self.boards, self.scores, self.high_scores, self.rng_states, self.spawned, self.last_used)
+        tokens = sum(sys.getsizeof(t) for t in self.index)
+        return (sum(a.itemsize * len(a) for a in arrays) + sys.getsizeof(self.index)
+                + sys.getsizeof(self.tokens) + tokens)
+
+
+# --- An integer field of a request, JSON floats (1e999 too) and booleans are refused ---
+def _integer(request, key, default):
+    value = request.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError(f"{key} must be an integer")
+    return value
+
+
+# --- Runs in the hint pool, the heuristic tables are built once per worker ---
+def _hint(board, depth):
+    import selfplay
+
+    return selfplay.expectimax_policy(depth)(board)
+
+
+class GameServer:
+    def __init__(self, folder=SESSIONS_DIR, workers=None, save_interval=2.0, idle_timeout=600.0, max_depth=3):
+        self.folder = folder
+        self.sessions = SessionTable()
+        self.workers = workers
+        self.pool = None
+        self.save_interval = save_interval
+        self.idle_timeout = idle_timeout
+        self.max_depth = max_depth
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.writes = 0
+        self.started = time.monotonic()
+        # Tokens being closed, requests for them wait until the file is written
+        self.closing = {}
+        # One thread writes every file, so writes land in the order they were made
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-writer")
+        self._server = None
+        self._saver = None
+        os.makedirs(folder, exist_ok=True)
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT, path=None):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Build the heuristic tables before the first hint is asked for
+        self.pool.submit(_hint, 0, 1)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self.handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self.handle, host, port)
+        self._saver = asyncio.get_running_loop().create_task(self.save_loop())
+        return self._server
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._saver is not None:
+            self._saver.cancel()
+        await self.save_dirty()
+        self.writer.shutdown()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+    # --- One client connection, requests are answered in order ---
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.dispatch(line)
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def dispatch(self, line):
+        self.requests += 1
+        request = None
+        try:
+            request = json.loads(line)
+            op = request.get("op") if isinstance(request, dict) else None
+            handler = getattr(self, "op_" + op, None) if isinstance(op, str) else None
+            if handler is None:
+                raise ValueError(f"unknown op {op!r}")
+            reply = await handler(request)
+        except (ValueError, KeyError, TypeError, OverflowError) as e:
+            self.errors += 1
+            reply = {"ok": False, "error": str(e)}
+        else:
+            reply["ok"] = True
+        if isinstance(request, dict) and "id" in request:
+            reply["id"] = request["id"]
+        return reply
+
+    # --- Session lookup, loading a saved session on first use ---
+    async def slot(self, token):
+        closing = self.closing.get(token) if isinstance(token, str) else None
+        if closing is not None:
+            await closing.wait()
+        slot = self.sessions.index.get(token)
+        if slot is not None:
+            return slot
+        if not persistence.valid_session(token):
+            raise ValueError("bad session")
+        state = persistence.read_state(persistence.session_path(token, self.folder, binary=True))
+        if state is None:
+            raise ValueError(f"no session {token}")
+        if (len(state["board"]), len(state["board"][0])) != (engine.ROWS, engine.COLS):
+            raise ValueError(f"session {token} is not a 4x4 game")
+        # Sessions last saved by the window have no generator state
+        spawned = state["last_spawned_tile"]
+        return self.sessions.add(token, engine.pack(state["board"]), state["score"], state["high_score"],
+                                 state.get("rng_state") or random.getrandbits(64),
+                                 spawned[0] * engine.SIZE + spawned[1] if spawned else -1)
+
+    def reply(self, token, slot, grid=False, **extra):
+        board = self.sessions.boards[slot]
+        reply = {
+            "session": token,
+            "board": board,
+            "score": self.sessions.scores[slot],
+            "over": engine.is_game_over(board),
+            "won": engine.is_won(board),
+        }
+        if grid:
+            reply["grid"] = engine.unpack(board)
+        reply.update(extra)
+        return reply
+
+    async def op_new(self, request):
+        token = secrets.token_hex(8)
+        seed = request.get("seed")
+        rng = SessionRandom(random.getrandbits(64) if seed is None else _integer(request, "seed", None) & _MASK64)
+        game = engine.Game()
+        game.new(rng)
+        slot = self.sessions.add(token, 0, 0, 0, 0)
+        self.sessions.store(slot, game)
+        return self.reply(token, slot, request.get("grid", False))
+
+    async def op_attach(self, request):
+        token = request["session"]
+        slot = await self.slot(token)
+        return self.reply(token, slot, request.get("grid", False))
+
+    async def op_state(self, request):
+        return await self.op_attach(request)
+
+    async def op_move(self, request):
+        token = request["session"]
+        direction = request["direction"]
+        if direction not in engine.DIRECTIONS:
+            raise ValueError(f"bad direction {direction!r}")
+        slot = await self.slot(token)
+        game = self.sessions.game(slot)
+        merges = game.move(direction)
+        spawned = None
+        if merges is not None:
+            spawned = game.spawn()
+            self.sessions.store(slot, game)
+        return self.reply(token, slot, request.get("grid", False), moved=merges is not None, spawned=spawned)
+
+    async def op_hint(self, request):
+        token = request["session"]
+        depth = max(1, min(_integer(request, "depth", 2), self.max_depth))
+        slot = await self.slot(token)
+        board = self.sessions.boards[slot]
+        direction = await asyncio.get_running_loop().run_in_executor(self.pool, _hint, board, depth)
+        return {"session": token, "board": board, "direction": direction}
+
+    # --- The session leaves the table before the write is awaited, so no move lands in between ---
+    async def op_close(self, request):
+        token = request["session"]
+        slot = await self.slot(token)
+        item = (persistence.session_path(token, self.folder, binary=True),
+                persistence.encode_binary(self.sessions.state(slot)))
+        self.sessions.remove(token)
+        closing = self.closing[token] = asyncio.Event()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.writer, _write_files, [item])
+            self.writes += 1
+        finally:
+            del self.closing[token]
+            closing.set()
+        return {"session": token}
+
+    async def op_stats(self, request):
+        return {
+            "sessions": len(self.sessions),
+            "session_bytes": self.sessions.nbytes(),
+            "connections": self.connections,
+            "requests": self.requests,
+            "errors": self.errors,
+            "writes": self.writes,
+            "uptime": time.monotonic() - self.started,
+        }
+
+    # --- Persistence, the files are written on a thread ---
+    async def save_slots(self, slots):
+        items = []
+        for slot in slots:
+            token = self.sessions.tokens[slot]
+            if token is not None:
+                items.append((persistence.session_path(token, self.folder, binary=True),
+                              persistence.encode_binary(self.sessions.state(slot))))
+            self.sessions.dirty.discard(slot)
+        if items:
+            await asyncio.get_running_loop().run_in_executor(self.writer, _write_files, items)
+            self.writes += len(items)
+
+    async def save_dirty(self):
+        await self.save_slots(list(self.sessions.dirty))
+
+    async def save_loop(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            try:
+                await self.save_dirty()
+                self.evict_idle()
+            except OSError as e:
+                print(f"ERROR: Failed to save sessions! {e}")
+
+    # --- Drop saved sessions nobody touched for idle_timeout seconds ---
+    def evict_idle(self):
+        if not self.idle_timeout:
+            return
+        cutoff = time.monotonic() - self.idle_timeout
+        sessions = self.sessions
+        for token, slot in list(sessions.index.items()):
+            if sessions.last_used[slot] < cutoff and slot not in sessions.dirty:
+                sessions.remove(token)
+
+
+def _write_files(items):
+    for path, raw in items:
+        persistence.write_atomic(path, raw, backup=False)
+
+
+# --- Load generator ---
+# Every client opens a session and plays random moves, starting a new game
+# when one ends, until the clients have sent `requests` requests together.
+async def _client(open_connection, budget, latencies, hint_every, rng):
+    reader, writer = await open_connection()
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error"))
+        return reply
+
+    try:
+        state = await call({"op": "new"})
+        sent = 1
+        while budget[0] > 0:
+            budget[0] -= 1
+            if state["over"]:
+                state = await call({"op": "new"})
+            elif hint_every and sent % hint_every == 0:
+                await call({"op": "hint", "session": state["session"], "depth": 1})
+            else:
+                state = await call({"op": "move", "session": state["session"],
+                                    "direction": rng.choice(engine.DIRECTIONS)})
+            sent += 1
+        await call({"op": "close", "session": state["session"]})
+    finally:
+        writer.close()
+
+
+async def run_load(open_connection, clients=32, requests=20000, hint_every=0, seed=0):
+    budget = [requests]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(open_connection, budget, latencies, hint_every, random.Random(seed + i))
+                           for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100.0))] * 1000.0 if ordered else 0.0
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {"p50": pick(50), "p90": pick(90), "p99": pick(99), "p99.9": pick(99.9), "max": pick(100)},
+    }
+
+
+# --- Idle sessions for a memory check: open, play one move, leave them ---
+async def open_idle(open_connection, count):
+    reader, writer = await open_connection()
+    for _ in range(count):
+        writer.write(b'{"op": "new"}\n')
+    await writer.drain()
+    for _ in range(count):
+        await reader.readline()
+    writer.write(b'{"op": "stats"}\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="server", description="2048 game server and load generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("serve", "run the server"), ("load", "run the load generator against a server")):
+        sub = commands.add_parser(name, help=text)
+        sub.add_argument("--host", default="127.0.0.1")
+        sub.add_argument("--port", type=int, default=DEFAULT_PORT)
+        sub.add_argument("--unix", help="unix socket path instead of TCP")
+    serve = commands.choices["serve"]
+    serve.add_argument("--sessions-dir", default=SESSIONS_DIR)
+    serve.add_argument("--workers", type=int, default=None, help="hint processes (default: one per core)")
+    serve.add_argument("--save-interval", type=float, default=2.0)
+    serve.add_argument("--idle-timeout", type=float, default=600.0, help="seconds, 0 keeps every session in memory")
+    load = commands.choices["load"]
+    load.add_argument("--clients", type=int, default=32)
+    load.add_argument("--requests", type=int, default=20000)
+    load.add_argument("--hint-every", type=int, default=0, help="every Nth request of a client is a depth 1 hint")
+    load.add_argument("--idle", type=int, default=0, help="open this many idle sessions first and report memory")
+    load.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.unix:
+        def open_connection():
+            return asyncio.open_unix_connection(args.unix)
+    else:
+        def open_connection():
+            return asyncio.open_connection(args.host, args.port)
+
+    if args.command == "serve":
+        async def serve():
+            server = GameServer(args.sessions_dir, args.workers, args.save_interval, args.idle_timeout)
+            await server.start(args.host, args.port, args.unix)
+            print(f"Serving on {args.unix or f'{args.host}:{args.port}'}, sessions in {args.sessions_dir}")
+            try:
+                await asyncio.Event().wait()
+            finally:
+                await server.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    async def load_test():
+        if args.idle:
+            stats = await open_idle(open_connection, args.idle)
+            print(f"{stats['sessions']} sessions in {stats['session_bytes'] / 2**20:.1f} MB "
+                  f"({stats['session_bytes'] / max(1, stats['sessions']):.0f} bytes each)")
+        return await run_load(open_connection, args.clients, args.requests, args.hint_every, args.seed)
+
+    result = asyncio.run(load_test())
+    latency = result["latency_ms"]
+    print(f"{result['requests']} requests from {result['clients']} clients in {result['seconds']:.2f}s: "
+          f"{result['requests_per_sec']:,.0f} requests/s")
+    print("latency ms  " + "  ".join(f"{k} {v:.3f}" for k, v in latency.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,484 @@
+# --- 2048 board statistics database ---
+# Outcomes of simulated games per position: how often a board was seen, the
+# mean final score of those games and which move did best from it. Boards are
+# stored under the smallest of their eight symmetries, so a position and its
+# mirror images share one record, moves are turned back on lookup.
+#
+# The database is a folder of shard files. Each shard is a header and a sorted
+# array of fixed 64-byte records, memory mapped read-only: a lookup is a
+# binary search straight in the page cache, any number of processes can read
+# at once and no NumPy is needed for it. Writers never touch the shards, every
+# flush of a writer is a new run file of its own, put in place complete with
+# os.replace, so a run is never written to again once it can be seen. merge()
+# folds all pending runs into the shards in bulk (NumPy). A merged shard is written as the next
+# generation of that shard, a new file, and meta.json (the manifest naming the
+# generation of every shard) is swapped in with os.replace. A mapped shard is
+# never replaced or written, which Windows wouldn't allow, readers keep their
+# old mapping until they refresh(), and old generations are removed once no
+# process holds them any more.
+#
+# python statsdb.py collect stats --games 10000 --policy expectimax
+# python statsdb.py merge stats
+# python statsdb.py info stats
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+import engine
+import ntuple
+
+MAGIC = b"2048STS\x00"
+VERSION = 1
+META_FILE = "meta.json"
+DEFAULT_SHARDS = 16
+_HEADER = struct.Struct("<8sHHQ")
+_HEADER_SIZE = 64
+# key, visits, games per move, final score sums per move, padding
+_RECORD = struct.Struct("<QI4I4d4x")
+_KEY = struct.Struct("<Q")
+_LOCK_FILE = "merge.lock"
+_REPLACE_ATTEMPTS = 50
+# Run files being written, and the torn end of a run a merge couldn't read
+_PARTIAL = ".partial"
+_TORN = ".torn"
+
+
+class StatsError(Exception):
+    pass
+
+
+# --- Directions in the frame of each symmetry (order of ntuple.symmetries) ---
+# Flipping the columns swaps Left and Right, flipping the rows Up and Down,
+# the transpose swaps Up with Left and Down with Right.
+def _compose(first, second):
+    return tuple(second[first[d]] for d in range(4))
+
+
+_IDENTITY = (0, 1, 2, 3)
+_FLIP_COLUMNS = (0, 3, 2, 1)
+_FLIP_ROWS = (2, 1, 0, 3)
+_TRANSPOSE = (3, 2, 1, 0)
+_FLIP_BOTH = _compose(_FLIP_COLUMNS, _FLIP_ROWS)
+_TO_SYMMETRY = tuple(
+    [_IDENTITY, _FLIP_COLUMNS, _FLIP_ROWS, _FLIP_BOTH]
+    + [_compose(p, _TRANSPOSE) for p in (_IDENTITY, _FLIP_COLUMNS, _FLIP_ROWS, _FLIP_BOTH)]
+)
+_FROM_SYMMETRY = tuple(tuple(p.index(d) for d in range(4)) for p in _TO_SYMMETRY)
+
+
+# --- Smallest symmetric board and the index of the symmetry that gives it ---
+def canonical(board):
+    boards = ntuple.symmetries(board)
+    key = min(boards)
+    return key, boards.index(key)
+
+
+# --- Shard of a canonical key, the multiply spreads boards that differ in one cell ---
+def shard_of(key, shards):
+    return ((key * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) >> 48 & (shards - 1)
+
+
+def _shard_name(index):
+    return f"shard-{index:03d}.sts"
+
+
+# --- File of one generation of a shard, generation 0 is the plain name ---
+def _shard_file(index, generation):
+    return _shard_name(index) if not generation else f"shard-{index:03d}.g{generation}.sts"
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        raise StatsError(f"{path} is not a statistics database: {e}")
+    if not isinstance(meta, dict):
+        raise StatsError(f"{path} has an unsupported layout")
+    shards = meta.get("shards", 0)
+    if meta.get("version") != VERSION or type(shards) is not int or shards < 1 or shards & (shards - 1):
+        raise StatsError(f"{path} has an unsupported layout")
+    generations = meta.setdefault("generations", [0] * shards)
+    if not isinstance(generations, list) or len(generations) != shards:
+        raise StatsError(f"{path} has an unsupported layout")
+    return meta
+
+
+# --- Swap in a new manifest ---
+# On Windows os.replace fails while a reader has meta.json open for the moment
+# it takes to read it, so the swap is tried again a few times.
+def _write_meta(path, meta):
+    target = os.path.join(path, META_FILE)
+    temp = target + ".tmp"
+    with open(temp, "w") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(_REPLACE_ATTEMPTS):
+        try:
+            os.replace(temp, target)
+            return
+        except PermissionError:
+            if attempt == _REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.02)
+
+
+def _empty_entry():
+    return [0, [0, 0, 0, 0], [0.0, 0.0, 0.0, 0.0]]
+
+
+# --- One shard, mapped read-only ---
+class Shard:
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._map = None
+        if not os.path.exists(path):
+            return
+        self._file = open(path, "rb")
+        stat = os.fstat(self._file.fileno())
+        if stat.st_size < _HEADER_SIZE:
+            self.close()
+            raise StatsError(f"{path} is not a statistics shard")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or stat.st_size != _HEADER_SIZE + count * _RECORD.size:
+            self.close()
+            raise StatsError(f"{path} is not a statistics shard")
+        self.count = count
+
+    def find(self, key):
+        lo, hi = 0, self.count
+        data, unpack = self._map, _KEY.unpack_from
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if unpack(data, _HEADER_SIZE + mid * _RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count:
+            record = _RECORD.unpack_from(data, _HEADER_SIZE + lo * _RECORD.size)
+            if record[0] == key:
+                return record
+        return None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# --- Reader ---
+class StatsDB:
+    def __init__(self, path):
+        self.path = path
+        meta = _read_meta(path)
+        self.shard_count = meta["shards"]
+        self.generations = meta["generations"]
+        self.shards = [Shard(os.path.join(path, _shard_file(i, g))) for i, g in enumerate(self.generations)]
+
+    @classmethod
+    def create(cls, path, shards=DEFAULT_SHARDS):
+        if shards < 1 or shards & (shards - 1):
+            raise StatsError("the shard count must be a power of two")
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            with open(meta_path, "w") as f:
+                json.dump({"version": VERSION, "shards": shards}, f)
+        return cls(path)
+
+    def __len__(self):
+        return sum(shard.count for shard in self.shards)
+
+    # --- Statistics of a board, None if it was never seen ---
+    # Returns visits, mean final score and per direction (games, mean final
+    # score), all in the frame of the board that was asked for.
+    def lookup(self, board):
+        key, symmetry = canonical(board)
+        record = self.shards[shard_of(key, self.shard_count)].find(key)
+        if record is None:
+            return None
+        visits, games, sums = record[1], record[2:6], record[6:10]
+        moves = {}
+        for d, direction in enumerate(engine.DIRECTIONS):
+            n = games[_TO_SYMMETRY[symmetry][d]]
+            if n:
+                moves[direction] = (n, sums[_TO_SYMMETRY[symmetry][d]] / n)
+        return {
+            "visits": visits,
+            "mean_score": sum(sums) / visits if visits else 0.0,
+            "moves": moves,
+        }
+
+    # --- Direction with the best mean final score, min_games keeps noise out ---
+    def best_move(self, board, min_games=1):
+        stats = self.lookup(board)
+        if stats is None:
+            return None
+        best, best_mean = None, None
+        for direction, (n, mean) in stats["moves"].items():
+            if n >= min_games and (best_mean is None or mean > best_mean):
+                best, best_mean = direction, mean
+        return None if best is None else (best, best_mean, stats["visits"])
+
+    # --- Pick up the shards a merge has written since they were mapped ---
+    def refresh(self):
+        try:
+            generations = _read_meta(self.path)["generations"]
+        except StatsError:
+            return
+        for i, generation in enumerate(generations):
+            if generation != self.generations[i]:
+                self.shards[i].close()
+                self.shards[i] = Shard(os.path.join(self.path, _shard_file(i, generation)))
+                self.generations[i] = generation
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+# --- Writer, one per process ---
+# Aggregates in a dict and writes every flush to new run files named after the
+# writer and the flush, so parallel writers never share a file and a merge
+# never reads a run that is still growing. Nothing is visible to readers
+# before merge().
+class StatsWriter:
+    def __init__(self, path, name=None, flush_every=200000):
+        self.db = StatsDB.create(path)
+        self.path = path
+        self.name = name or f"{os.getpid()}-{time.time_ns()}"
+        self.flush_every = flush_every
+        self.flushes = 0
+        self.pending = {}
+
+    def add(self, board, direction, final_score):
+        key, symmetry = canonical(board)
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = _empty_entry()
+        d = _TO_SYMMETRY[symmetry][engine.DIRECTIONS.index(direction)]
+        entry[0] += 1
+        entry[1][d] += 1
+        entry[2][d] += final_score
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    # --- One game: the boards before each move, the moves and the final score ---
+    def add_game(self, positions, final_score):
+        for board, direction in positions:
+            self.add(board, direction, final_score)
+
+    def flush(self):
+        if not self.pending:
+            return
+        shards = self.db.shard_count
+        runs = [bytearray() for _ in range(shards)]
+        pack = _RECORD.pack
+        for key, (visits, games, sums) in self.pending.items():
+            runs[shard_of(key, shards)] += pack(key, visits, *games, *sums)
+        for index, data in enumerate(runs):
+            if data:
+                name = os.path.join(self.path, f"{_shard_name(index)}.run-{self.name}-{self.flushes:06d}")
+                with open(name + _PARTIAL, "wb") as f:
+                    f.write(data)
+                os.replace(name + _PARTIAL, name)
+        self.flushes += 1
+        self.pending.clear()
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+# --- Fold all run files into the shards ---
+# Records are summed per key with NumPy: sort by key, then reduce each group.
+# Only one merge runs at a time (lock file), readers are never blocked.
+def merge(path):
+    import numpy as np
+
+    dtype = np.dtype([("key", "<u8"), ("visits", "<u4"), ("games", "<u4", 4), ("sums", "<f8", 4), ("pad", "V4")])
+    db = StatsDB.create(path)
+    lock = os.path.join(path, _LOCK_FILE)
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise StatsError(f"another merge is running on {path} (remove {lock} if it crashed)")
+
+    merged = 0
+    try:
+        names = os.listdir(path)
+        generations = list(db.generations)
+        done = []
+        torn = {}
+        for index, shard in enumerate(db.shards):
+            prefix = _shard_name(index) + ".run-"
+            runs = sorted(os.path.join(path, n) for n in names
+                          if n.startswith(prefix) and not n.endswith((_PARTIAL, _TORN)))
+            if not runs:
+                continue
+            parts = [np.frombuffer(shard._map, dtype=dtype, count=shard.count, offset=_HEADER_SIZE)] if shard.count else []
+            for run in runs:
+                with open(run, "rb") as f:
+                    data = f.read()
+                end = len(data) - len(data) % dtype.itemsize
+                if end < len(data):
+                    torn[run] = data[end:]
+                parts.append(np.frombuffer(data[:end], dtype=dtype))
+            records = np.concatenate(parts)
+            records = records[np.argsort(records["key"], kind="stable")]
+            starts = np.flatnonzero(np.r_[True, records["key"][1:] != records["key"][:-1]])
+
+            out = np.zeros(len(starts), dtype=dtype)
+            out["key"] = records["key"][starts]
+            out["visits"] = np.add.reduceat(records["visits"].astype(np.uint64), starts).clip(max=0xFFFFFFFF)
+            out["games"] = np.add.reduceat(records["games"].astype(np.uint64), starts).clip(max=0xFFFFFFFF)
+            out["sums"] = np.add.reduceat(records["sums"], starts)
+
+            generations[index] += 1
+            with open(os.path.join(path, _shard_file(index, generations[index])), "wb") as f:
+                f.write(_HEADER.pack(MAGIC, VERSION, index, len(out)).ljust(_HEADER_SIZE, b"\x00"))
+                f.write(out.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            del parts, records
+            done.extend(runs)
+
+        # One manifest swap makes every merged shard visible at once, the runs
+        # go only after it so a crash before it loses nothing
+        if done:
+            meta = _read_meta(path)
+            meta["generations"] = generations
+            _write_meta(path, meta)
+            # A record cut short (a writer that died mid-write) is kept next to its run
+            for run, tail in torn.items():
+                with open(run + _TORN, "ab") as f:
+                    f.write(tail)
+            for run in done:
+                os.remove(run)
+            merged = len(done)
+        db.close()
+        _remove_old_generations(path, generations)
+    finally:
+        db.close()
+        os.close(fd)
+        os.remove(lock)
+    return merged
+
+
+# --- Remove the shard files the manifest no longer names ---
+# Windows won't delete one a reader still has mapped, that one goes on a later
+# merge.
+def _remove_old_generations(path, generations):
+    current = {_shard_file(i, g) for i, g in enumerate(generations)}
+    for name in os.listdir(path):
+        if name.startswith("shard-") and name.endswith(".sts") and name not in current:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+# --- Collecting statistics from self-play ---
+def _collect_chunk(path, seeds, policy, depth, weights, record_moves):
+    import selfplay
+
+    writer = StatsWriter(path)
+    positions = 0
+    for seed in seeds:
+        game = engine.Game()
+        game.new_game(seed)
+        choose = selfplay.make_policy(policy, seed, depth, weights)
+        trajectory = []
+        while not game.over():
+            board = game.board
+            direction = choose(board)
+            if direction is None or game.move(direction) is None:
+                break
+            if record_moves is None or len(trajectory) < record_moves:
+                trajectory.append((board, direction))
+            game.spawn()
+        writer.add_game(trajectory, game.score)
+        positions += len(trajectory)
+    writer.close()
+    return len(seeds), positions
+
+
+def collect(path, seeds, policy="expectimax", depth=2, weights=None, workers=None, record_moves=None):
+    StatsDB.create(path).close()
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    size = max(1, min(256, len(seeds) // (workers * 4) or 1))
+    chunks = [seeds[i:i + size] for i in range(0, len(seeds), size)]
+    args = (policy, depth, weights, record_moves)
+
+    if workers == 1:
+        results = [_collect_chunk(path, chunk, *args) for chunk in chunks]
+    else:
+        # Imported here, the window only reads the database and shouldn't pay for it
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_collect_chunk, [path] * len(chunks), chunks, *[[a] * len(chunks) for a in args]))
+    return sum(g for g, _ in results), sum(p for _, p in results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="statsdb", description="Board statistics from simulated 2048 games")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    collect_parser = commands.add_parser("collect", help="play games and merge their statistics")
+    collect_parser.add_argument("path")
+    collect_parser.add_argument("--games", type=int, default=1000)
+    collect_parser.add_argument("--seed", type=int, default=0)
+    collect_parser.add_argument("--policy", default="expectimax")
+    collect_parser.add_argument("--depth", type=int, default=2)
+    collect_parser.add_argument("--weights")
+    collect_parser.add_argument("--workers", type=int, default=None)
+    collect_parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    collect_parser.add_argument("--record-moves", type=int, default=None,
+                                help="only record the first N moves of each game (openings)")
+
+    merge_parser = commands.add_parser("merge", help="fold pending run files into the shards")
+    merge_parser.add_argument("path")
+
+    info_parser = commands.add_parser("info", help="print the size of a database")
+    info_parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "collect":
+            StatsDB.create(args.path, args.shards).close()
+            start = time.perf_counter()
+            games, positions = collect(args.path, range(args.seed, args.seed + args.games), args.policy, args.depth,
+                                       args.weights, args.workers, args.record_moves)
+            played = time.perf_counter() - start
+            runs = merge(args.path)
+            print(f"{games} games, {positions} positions in {played:.1f}s, "
+                  f"merged {runs} run files in {time.perf_counter() - start - played:.1f}s")
+        elif args.command == "merge":
+            start = time.perf_counter()
+            runs = merge(args.path)
+            print(f"merged {runs} run files in {time.perf_counter() - start:.1f}s")
+        db = StatsDB(args.path)
+        size = sum(os.path.getsize(s.path) for s in db.shards if s.count)
+        print(f"{len(db)} positions in {db.shard_count} shards, {size / 2**20:.1f} MB")
+        db.close()
+    except StatsError as e:
+        print(f"ERROR: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
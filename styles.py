@@ -0,0 +1,59 @@
+# --- 2048 tile styles ---
+# One precomputed entry per tile exponent: (fill, text color, label, font class).
+# The renderer indexes it with the exponent straight from the packed board, so
+# drawing a tile builds no dicts and formats no strings. Font classes index a
+# list of font objects the renderer creates once (see FONT_SIZES).
+# No tkinter in here, the headless renderers use the same table.
+
+EMPTY_COLOR = "#cdc1b4"
+BOARD_COLOR = "#bbada0"
+SHADOW_COLOR = "#b3a396"
+DARK_TEXT = "#776e65"
+LIGHT_TEXT = "#f9f6f2"
+NEW_TEXT = "#f78a8a"
+
+# Fill per exponent, 2 (exponent 1) up to 131072 (exponent 17)
+TILE_COLORS = (
+    EMPTY_COLOR,
+    "#eee4da", "#ede0c8", "#f2b179", "#f59563", "#f67c5f", "#f65e3b",
+    "#edcf72", "#edcc61", "#f2b179", "#f59563", "#edc22e",
+    "#3c3a32", "#5b4a7a", "#3f5f8f", "#2e7d6b", "#7a3b5e", "#1f1f1f",
+)
+MAX_STYLE_EXPONENT = len(TILE_COLORS) - 1
+
+# Highlight for a freshly spawned 2 or 4
+NEW_TILE_COLORS = {1: "#e0f2f8", 2: "#b8dbe5"}
+
+# Font size at 100px cells per font class: up to 3 digits, 4, 5, 6 and more
+FONT_SIZES = (36, 28, 22, 18)
+
+
+def _font_class(label):
+    return min(max(len(label) - 3, 0), len(FONT_SIZES) - 1)
+
+
+def _build_styles(count):
+    styles = []
+    for e in range(count):
+        label = str(1 << e) if e else ""
+        fill = TILE_COLORS[min(e, MAX_STYLE_EXPONENT)]
+        text = DARK_TEXT if e in (1, 2) else LIGHT_TEXT
+        styles.append((fill, text, label, _font_class(label)))
+    return styles
+
+
+TILE_STYLES = _build_styles(MAX_STYLE_EXPONENT + 1)
+NEW_TILE_STYLES = {e: (fill, NEW_TEXT) + TILE_STYLES[e][2:] for e, fill in NEW_TILE_COLORS.items()}
+
+
+# --- Style for an exponent, the table grows for tiles beyond 2^17 ---
+def tile_style(exponent, is_new=False):
+    if is_new and exponent in NEW_TILE_STYLES:
+        return NEW_TILE_STYLES[exponent]
+    if exponent >= len(TILE_STYLES):
+        TILE_STYLES[:] = _build_styles(exponent + 1)
+    return TILE_STYLES[exponent]
+
+
+def font_sizes(cell_size):
+    return [max(8, size * cell_size // 100) for size in FONT_SIZES]
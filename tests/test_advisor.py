@@ -0,0 +1,107 @@
+import queue
+import time
+import types
+
+import advisor
+import engine
+
+BOARD = engine.pack([[2, 4, 8, 16], [0, 2, 4, 8], [0, 0, 2, 4], [0, 0, 0, 2]])
+
+
+# --- Requests that end (None) once the queued ones are taken ---
+class Requests(queue.Queue):
+    def get(self, block=True, timeout=None):
+        if not block:
+            return super().get(block=False)
+        try:
+            return super().get(block=False)
+        except queue.Empty:
+            return None
+
+
+# --- An Advisor on plain queues, the worker runs in the test ---
+def local_advisor():
+    adv = advisor.Advisor.__new__(advisor.Advisor)
+    adv.hint_depth = 2
+    adv.generation = types.SimpleNamespace(value=0)
+    adv.requests = Requests()
+    adv.results = queue.Queue()
+    return adv
+
+
+def run_worker(adv):
+    advisor._worker(adv.requests, adv.results, adv.generation)
+    results = []
+    while not adv.results.empty():
+        results.append(adv.results.get())
+    return results
+
+
+def test_poll_drops_results_of_older_generations():
+    adv = local_advisor()
+    stale = adv.hint(BOARD)
+    adv.results.put(("hint", stale, 1, "Up", 1.0))
+    current = adv.hint(BOARD)
+    adv.results.put(("hint", stale, 2, "Up", 2.0))
+    adv.results.put(("hint", current, 1, "Left", 3.0))
+    assert adv.poll() == [("hint", current, 1, "Left", 3.0)]
+
+
+def test_worker_skips_a_cancelled_request():
+    adv = local_advisor()
+    adv.hint(BOARD)
+    adv.cancel()
+    assert run_worker(adv) == []
+    # Autoplay would still post its "done" if it ran
+    adv.autoplay(BOARD, 0, seed=1)
+    adv.cancel()
+    assert run_worker(adv) == []
+
+
+def test_worker_stops_a_search_once_the_generation_moves_on():
+    adv = local_advisor()
+    current = adv.hint(BOARD)
+    # The generation moves on while the search runs: every level after that is dropped
+    real_deepen = advisor.ai.ExpectimaxAI.deepen
+
+    def deepen(self, board, stop, max_depth=None):
+        for level in real_deepen(self, board, stop, max_depth):
+            yield level
+            adv.generation.value += 1
+
+    advisor.ai.ExpectimaxAI.deepen = deepen
+    try:
+        results = run_worker(adv)
+    finally:
+        advisor.ai.ExpectimaxAI.deepen = real_deepen
+    assert [(r[1], r[2]) for r in results] == [(current, 1)]
+    assert adv.poll() == []
+
+
+def test_autoplay_posts_moves_for_its_generation():
+    adv = local_advisor()
+    current = adv.autoplay(BOARD, 0, seed=3, depth=1)
+    results = run_worker(adv)
+    assert results[-1] == ("done", current)
+    moves = [move for result in results[:-1] for move in result[2]]
+    assert moves and all(result[1] == current for result in results)
+    game = engine.Game(BOARD)
+    for direction, cell, value in moves:
+        assert game.move(direction) is not None
+        game.place(cell, value)
+
+
+def test_worker_process_only_hands_out_the_newest_hint():
+    adv = advisor.Advisor(hint_depth=3)
+    try:
+        adv.hint(BOARD)
+        current = adv.hint(engine.pack([[2, 2, 0, 0], [0] * 4, [0] * 4, [0] * 4]))
+        results = []
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and len(results) < 3:
+            results += adv.poll()
+            time.sleep(0.01)
+        assert [r[2] for r in results] == [1, 2, 3]
+        assert all(r[1] == current for r in results)
+    finally:
+        adv.close()
@@ -0,0 +1,69 @@
+import pytest
+
+import ai
+import engine
+
+BOARD = engine.pack([[2, 4, 8, 16], [0, 2, 4, 8], [0, 0, 2, 4], [0, 0, 0, 2]])
+
+
+# --- Plain expectimax over the same heuristic, depth in player moves ---
+def expected(board, depth, heuristic):
+    values = [chance(moved, depth - 1, heuristic) for moved in successors(board)]
+    return max(values, default=0.0)
+
+
+def successors(board):
+    moved = (engine.move(board, direction)[0] for direction in engine.DIRECTIONS)
+    return [new_board for new_board in moved if new_board != board]
+
+
+def chance(board, depth, heuristic):
+    if depth <= 0:
+        return heuristic(board)
+    cells = [i for i in range(16) if not (board >> (4 * i)) & 0xF]
+    total = 0.0
+    for i in cells:
+        total += ai.SPAWN_TWO_PROBABILITY * expected(board | 1 << (4 * i), depth, heuristic)
+        total += ai.SPAWN_FOUR_PROBABILITY * expected(board | 2 << (4 * i), depth, heuristic)
+    return total / len(cells)
+
+
+def test_search_matches_plain_expectimax():
+    heuristic = ai.TableHeuristic()
+    player = ai.ExpectimaxAI(heuristic=heuristic, prob_cutoff=0.0)
+    move = player.best_move(BOARD, depth=2)
+    assert player.stats["value"] == pytest.approx(expected(BOARD, 2, heuristic))
+    values = {d: chance(engine.move(BOARD, d)[0], 1, heuristic) for d in engine.legal_moves(BOARD)}
+    assert values[move] == max(values.values())
+
+
+def test_time_budget_returns_a_legal_move():
+    player = ai.ExpectimaxAI(heuristic=ai.TableHeuristic().build(), time_limit=0.05)
+    assert player.best_move(BOARD) in engine.legal_moves(BOARD)
+    assert player.stats["depth"] >= 1
+    assert 0.0 <= player.stats["table_hit_rate"] <= 1.0
+
+
+def test_no_move_on_a_finished_board():
+    board = engine.pack([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]])
+    assert ai.best_move(board, depth=2) is None
+
+
+def test_table_evicts_the_least_recently_used():
+    table = ai.TranspositionTable(capacity=2)
+    table.put(1, 2, 1.0)
+    table.put(2, 2, 2.0)
+    assert table.get(1, 1) == 1.0
+    table.put(3, 2, 3.0)
+    assert table.get(2, 1) is None
+    assert table.get(1, 3) is None
+    assert table.hit_rate == pytest.approx(1 / 3)
+
+
+def test_every_depth_counts_nodes():
+    player = ai.ExpectimaxAI(heuristic=ai.TableHeuristic().build())
+    player.best_move(BOARD, depth=1)
+    assert player.stats["nodes"] == len(engine.legal_moves(BOARD))
+    assert player.stats["nodes_per_sec"] > 0
+    player.best_move(BOARD, depth=2)
+    assert player.stats["nodes"] > len(engine.legal_moves(BOARD))
@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+import pytest
+
+import batch
+import engine
+
+
+def random_boards(seed, n=400):
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(n):
+        top = rng.randint(1, 15)
+        fill = rng.choice((0.3, 0.7, 1.0))
+        boards.append(sum((rng.randint(1, top) if rng.random() < fill else 0) << (4 * c) for c in range(16)))
+    # Dead boards too, so the done flags see both answers
+    boards.append(engine.pack([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]))
+    return boards
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_moves_match_reference_move(seed):
+    boards = random_boards(seed)
+    array = batch.from_ints(boards)
+    directions = np.array([random.Random(seed + i).randrange(4) for i in range(len(boards))])
+    for direction in list(range(4)) + [directions]:
+        new_boards, score, merges, moved = batch.move(array, direction)
+        for i, board in enumerate(boards):
+            d = engine.DIRECTIONS[int(np.broadcast_to(direction, len(boards))[i])]
+            expected, gained, merged = engine.reference_move(engine.unpack(board), d, engine.MAX_TILE)
+            assert engine.unpack(int(new_boards[i])) == expected
+            assert int(score[i]) == gained
+            assert sorted(engine.mask_cells(int(merges[i]))) == merged
+            assert bool(moved[i]) == (engine.pack(expected) != board)
+
+
+def test_done_flags_and_empty_cells_match_the_engine():
+    boards = random_boards(7)
+    array = batch.from_ints(boards)
+    over = batch.is_game_over(array)
+    legal = batch.legal_moves(array)
+    empty = batch.empty_masks(array)
+    counts = batch.count_empty(array)
+    assert over.any() and not over.all()
+    for i, board in enumerate(boards):
+        assert bool(over[i]) == engine.is_game_over(board)
+        assert [engine.DIRECTIONS[d] for d in np.flatnonzero(legal[i])] == engine.legal_moves(board)
+        assert int(empty[i]) == sum(1 << c for c in range(16) if not (board >> (4 * c)) & 0xF)
+        assert int(counts[i]) == engine.count_empty(board)
+
+
+def test_spawn_puts_one_tile_on_an_empty_cell():
+    boards = random_boards(3)
+    array = batch.from_ints(boards)
+    spawned, cells = batch.spawn(array, np.random.default_rng(1))
+    for board, new_board, cell in zip(boards, batch.to_ints(spawned), cells.tolist()):
+        if cell < 0:
+            assert engine.count_empty(board) == 0 and new_board == board
+            continue
+        assert (board >> (4 * cell)) & 0xF == 0
+        assert new_board ^ board in (1 << (4 * cell), 2 << (4 * cell))
+
+
+def test_new_boards_hold_two_twos():
+    for board in batch.to_ints(batch.new_boards(50, np.random.default_rng(2))):
+        assert sorted(engine.unpack(board)[r][c] for r in range(4) for c in range(4))[-3:] == [0, 2, 2]
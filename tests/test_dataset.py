@@ -0,0 +1,104 @@
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import dataset
+import engine
+
+
+def export(path, **options):
+    return dataset.export(str(path), range(3), policy="greedy", workers=1, **options)
+
+
+def rows(path, observation="packed"):
+    data = dataset.Dataset(str(path))
+    try:
+        batch = next(data.batches(len(data), shuffle=False, observation=observation))
+    finally:
+        data.close()
+    return batch
+
+
+@pytest.mark.parametrize("layout", dataset.LAYOUTS)
+def test_rows_are_legal_moves_with_their_reward(tmp_path, layout):
+    writer = export(tmp_path / "data", layout=layout, shard_rows=100)
+    batch = rows(tmp_path / "data")
+    assert len(batch["actions"]) == writer.rows > 100
+    for board, action, reward in zip(batch["boards"].tolist(), batch["actions"].tolist(), batch["rewards"].tolist()):
+        moved, gained = engine.move(board, engine.DIRECTIONS[action])
+        assert moved != board
+        assert gained == reward
+
+
+def test_returns_add_up_to_the_final_score(tmp_path):
+    boards, actions, rewards = dataset.play_game(5, policy="greedy")
+    writer = dataset.DatasetWriter(str(tmp_path / "game"))
+    writer.add_game(boards, actions, rewards)
+    writer.close()
+    batch = rows(tmp_path / "game")
+    assert batch["returns"][0] == pytest.approx(rewards.sum())
+    assert np.allclose(batch["returns"][:-1] - batch["returns"][1:], batch["rewards"][:-1])
+    assert np.allclose(dataset.returns_to_go([1, 2, 4], gamma=0.5), [1 + 1 + 1, 2 + 2, 4])
+
+
+def test_augment_and_dedup(tmp_path):
+    plain = export(tmp_path / "plain", shard_rows=64)
+    augmented = export(tmp_path / "augmented", shard_rows=64, augment=True, dedup=True)
+    batch = rows(tmp_path / "augmented")
+    assert len(np.unique(batch["boards"])) == len(batch["boards"]) == augmented.rows
+    assert plain.rows < augmented.rows <= 8 * plain.rows
+    for board, action in zip(batch["boards"].tolist(), batch["actions"].tolist()):
+        assert engine.move(board, engine.DIRECTIONS[action])[0] != board
+
+
+def test_planes_observation(tmp_path):
+    export(tmp_path / "data")
+    packed, planes = rows(tmp_path / "data"), rows(tmp_path / "data", "planes")
+    assert planes["boards"].shape == (len(packed["boards"]), 16, dataset.PLANES)
+    assert np.array_equal(dataset.to_packed(planes["boards"].argmax(axis=2)), packed["boards"])
+
+
+def test_export_with_workers_matches_one_worker(tmp_path):
+    dataset.export(str(tmp_path / "one"), range(6), policy="greedy", workers=1)
+    dataset.export(str(tmp_path / "two"), range(6), policy="greedy", workers=2)
+    one, two = rows(tmp_path / "one"), rows(tmp_path / "two")
+    for name in one:
+        assert np.array_equal(one[name], two[name])
+
+
+# --- Futures run when their result is asked for, so the ones in flight can be counted ---
+class LazyPool:
+    def __init__(self, max_workers):
+        self.waiting = 0
+        self.most = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, func, *args):
+        pool = self
+        self.waiting += 1
+        self.most = max(self.most, self.waiting)
+
+        class Future:
+            def result(self):
+                pool.waiting -= 1
+                return func(*args)
+        return Future()
+
+
+def test_export_keeps_few_chunks_in_flight(tmp_path, monkeypatch):
+    pools = []
+
+    def make_pool(max_workers):
+        pools.append(LazyPool(max_workers))
+        return pools[-1]
+
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", make_pool)
+    writer = dataset.export(str(tmp_path / "data"), range(40), policy="random", workers=2, max_moves=5)
+    assert writer.games == 40
+    assert pools[0].most == 4
@@ -0,0 +1,77 @@
+import functools
+
+import pytest
+
+import endgame
+import engine
+
+
+# --- Plain expectimax over 2x2 grids, the spec the solver is checked against ---
+def slide(grid, direction):
+    return engine.reference_move([list(row) for row in grid], direction)[:2]
+
+
+@functools.lru_cache(maxsize=None)
+def expected(grid):
+    best = None
+    for direction in engine.DIRECTIONS:
+        moved, gained = slide([list(row) for row in grid], direction)
+        if moved == [list(row) for row in grid]:
+            continue
+        empty = [(r, c) for r in range(2) for c in range(2) if not moved[r][c]]
+        total = 0.0
+        for r, c in empty:
+            for tile, p in ((2, endgame.SPAWN_TWO_PROBABILITY), (4, endgame.SPAWN_FOUR_PROBABILITY)):
+                child = [row[:] for row in moved]
+                child[r][c] = tile
+                total += p * expected(tuple(map(tuple, child)))
+        value = gained + total / len(empty)
+        best = value if best is None else max(best, value)
+    return best or 0.0
+
+
+@pytest.fixture(scope="module")
+def table(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("endgame") / "2x2.egt")
+    endgame.solve(path, 2, 2, workers=1, log=lambda message: None)
+    table = endgame.EndgameTable(path)
+    yield table
+    table.close()
+
+
+def test_2x2_matches_brute_force(table):
+    starts = [endgame.decode(key, 2, 2) for key in endgame.start_positions(2, 2)]
+    for grid in starts + [[[2, 4], [0, 8]], [[4, 4], [2, 0]], [[16, 8], [4, 0]]]:
+        assert table.value(grid) == pytest.approx(expected(tuple(map(tuple, grid))))
+    want = sum(expected(tuple(map(tuple, grid))) for grid in starts) / len(starts)
+    assert table.start_value == pytest.approx(want)
+
+
+def test_best_move_is_the_best_brute_force_move(table):
+    grid = [[2, 4], [2, 0]]
+    values = table.move_values(grid)
+    assert values["Left"] is None
+    assert table.best_move(grid) in ("Up", "Down")
+
+
+@pytest.mark.parametrize("grid", [
+    [[2, 0, 0], [0, 2, 0], [0, 0, 0]],
+    [[2, 0], [0, 2], [0, 0]],
+    [[3, 0], [0, 2]],
+    [[2, 0], [0, True]],
+    [[1, 0], [0, 2]],
+    [[2, 0], [0]],
+    [],
+])
+def test_rejects_grids_that_do_not_fit(table, grid):
+    with pytest.raises(endgame.EndgameError):
+        table.value(grid)
+    with pytest.raises(endgame.EndgameError):
+        table.move_values(grid)
+
+
+def test_rejects_keys_that_do_not_fit(table):
+    with pytest.raises(endgame.EndgameError):
+        table.value(1 << 16)
+    with pytest.raises(endgame.EndgameError):
+        table.value(-1)
@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+import boards
+import engine
+
+
+def random_board(rng):
+    top = rng.randint(2, 15)
+    return sum((rng.randint(1, top) if rng.random() < 0.6 else 0) << (4 * c) for c in range(16))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_tables_match_reference_move(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        board = random_board(rng)
+        grid = engine.unpack(board)
+        for direction in engine.DIRECTIONS:
+            expected, score, merges = engine.reference_move(grid, direction, engine.MAX_TILE)
+            new_board, gained, mask = engine.move_with_merges(board, direction)
+            assert engine.unpack(new_board) == expected
+            assert gained == score
+            assert sorted(engine.mask_cells(mask)) == merges
+
+
+def test_largest_tiles_do_not_merge():
+    top = engine.MAX_TILE
+    board = engine.pack([[top, top, 0, 0], [2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4]])
+    assert engine.move(board, "Left") == (board, 0)
+    assert engine.move_plan(board, "Right")[0][2] is False
+    stuck = engine.pack([[top, top, 2, 4], [2, 4, 8, 16], [4, 8, 16, 32], [8, 16, 32, 64]])
+    assert engine.is_game_over(stuck)
+
+
+def test_pack_rejects_tiles_past_the_nibble():
+    with pytest.raises(ValueError):
+        engine.pack([[engine.MAX_TILE * 2, 0, 0, 0]] + [[0] * 4] * 3)
+    with pytest.raises(ValueError):
+        engine.set_tile(0, 0, 0, engine.MAX_TILE * 2)
+    assert engine.unpack(engine.pack([[engine.MAX_TILE, 0, 0, 0]] + [[0] * 4] * 3))[0][0] == engine.MAX_TILE
+
+
+def test_seeded_games_repeat():
+    def play(seed):
+        game = engine.Game()
+        game.new_game(seed)
+        rng = random.Random(seed)
+        while not game.over():
+            if game.move(rng.choice(engine.legal_moves(game.board))) is not None:
+                game.spawn()
+        return game.board, game.score
+
+    assert play(3) == play(3)
+
+
+def test_changing_rules_recomputes_the_empty_cells():
+    game = engine.Game(board=engine.pack([[2, 4, 8, 16]] * 4))
+    assert game.full()
+    game.rules = boards.rules_for(5, 5)
+    assert not game.full()
+    assert game.empty == game.rules.empty_mask(game.board)
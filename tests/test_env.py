@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+import batch
+import engine
+import env
+
+
+def as_grid(board, rules=engine):
+    return rules.unpack(board)
+
+
+@pytest.mark.parametrize("observation", env.OBSERVATIONS)
+@pytest.mark.parametrize("size", [(4, 4), (3, 3), (5, 5)])
+def test_env_observations(observation, size):
+    game = env.Env(seed=1, observation=observation, rows=size[0], columns=size[1])
+    obs = game.reset()
+    board = game.game.board
+    grid = game.rules.unpack(board)
+    if observation == "packed":
+        assert obs == board
+    elif observation == "grid":
+        assert obs == grid
+    elif observation == "log2":
+        assert [[1 << e if e else 0 for e in row] for row in obs] == grid
+    else:
+        assert obs.shape == (game.rules.MAX_EXPONENT + 1, size[0], size[1])
+        assert (obs.sum(axis=0) == 1).all()
+        assert [[1 << e if e else 0 for e in row] for row in obs.argmax(axis=0).tolist()] == grid
+
+
+def test_planes_hold_big_tiles():
+    game = env.Env(observation="planes", rows=5, columns=5)
+    game.reset(seed=3)
+    game.game.board = game.rules.set_tile(game.game.board, 0, 0, 1 << 20)
+    assert game.observe()[20, 0, 0] == 1
+
+
+def test_env_step_follows_the_engine():
+    game = env.Env(seed=2)
+    game.reset(seed=5)
+    steps = 0
+    done = False
+    while not done:
+        board, score = game.game.board, game.game.score
+        mask = game.legal_mask()
+        assert mask == [engine.move(board, d)[0] != board for d in engine.DIRECTIONS]
+        action = mask.index(True)
+        obs, reward, done, info = game.step(action)
+        moved, gained = engine.move(board, engine.DIRECTIONS[action])
+        assert reward == gained == info["score"] - score
+        assert info["moved"] and engine.count_empty(obs) == engine.count_empty(moved) - 1
+        assert done == engine.is_game_over(obs)
+        steps += 1
+    assert steps > 50
+
+
+def test_env_invalid_action_and_truncation():
+    game = env.Env(seed=2, invalid_penalty=1.5, max_steps=2)
+    game.reset()
+    game.game.board = engine.pack([[2, 0, 0, 0], [4, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0]])
+    obs, reward, done, info = game.step(engine.DIRECTIONS.index("Left"))
+    assert (reward, done, info["moved"]) == (-1.5, False, False)
+    assert obs == game.game.board
+    obs, reward, done, info = game.step(engine.DIRECTIONS.index("Right"))
+    assert done and info["truncated"]
+
+
+@pytest.mark.parametrize("observation", env.OBSERVATIONS)
+def test_vec_env_observations(observation):
+    games = env.VecEnv(6, seed=1, observation=observation)
+    obs = games.reset()
+    grids = [as_grid(board) for board in batch.to_ints(games.boards)]
+    if observation == "packed":
+        assert obs.shape == (6,)
+    elif observation == "grid":
+        assert obs.tolist() == grids
+    elif observation == "log2":
+        assert np.where(obs > 0, 1 << obs.astype(np.int64), 0).tolist() == grids
+    else:
+        assert obs.shape == (6, env.PLANES, 4, 4)
+        assert (obs.sum(axis=1) == 1).all()
+
+
+# --- The same actions on VecEnv and on one Env per game give the same moves ---
+def test_vec_env_matches_env():
+    games = env.VecEnv(8, seed=4, invalid_penalty=2.0)
+    games.reset()
+    rng = np.random.default_rng(9)
+    finished = 0
+    for _ in range(300):
+        before, scores = batch.to_ints(games.boards), games.scores.copy()
+        actions = rng.integers(0, 4, size=8)
+        _, rewards, dones, info = games.step(actions)
+        final = iter(batch.to_ints(info.get("final_boards", [])))
+        for i, board in enumerate(before):
+            moved, gained = engine.move(board, engine.DIRECTIONS[actions[i]])
+            after = next(final) if dones[i] else int(games.boards[i])
+            assert bool(info["moved"][i]) == (moved != board)
+            if moved == board:
+                assert rewards[i] == -2.0 and after == board
+            else:
+                assert rewards[i] == gained
+                assert after & ~moved == after ^ moved and engine.count_empty(after) == engine.count_empty(moved) - 1
+            if not dones[i]:
+                assert games.scores[i] == scores[i] + gained
+            assert bool(dones[i]) == engine.is_game_over(after)
+        finished += int(dones.sum())
+    assert finished > 0
@@ -0,0 +1,27 @@
+import history
+
+
+def test_state_size():
+    assert history.History(capacity=100).nbytes() == 27 * 100
+
+
+def test_undo_redo_and_capacity():
+    h = history.History(capacity=3)
+    for board in range(1, 5):
+        h.push(board, board * 10, 40, spawned=(0, board % 4))
+    assert len(h) == 3 and h.current()["board"] == 4
+    assert h.undo()["board"] == 3
+    assert h.undo()["board"] == 2
+    assert h.undo() is None
+    assert h.redo()["score"] == 30
+    h.push(9, 90, 90, overlay=history.GAME_OVER)
+    assert not h.can_redo()
+    assert h.current() == {"board": 9, "score": 90, "high_score": 90, "last_spawned_tile": None,
+                           "overlay": history.GAME_OVER}
+
+
+def test_wide_boards():
+    h = history.History(capacity=2, board_bits=200)
+    board = (1 << 199) | 5
+    h.push(board, 0, 0)
+    assert h.current()["board"] == board
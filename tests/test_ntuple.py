@@ -0,0 +1,82 @@
+import io
+import random
+
+import numpy as np
+import pytest
+
+import engine
+import ntuple
+
+
+def random_boards(seed, n=200):
+    rng = random.Random(seed)
+    return [sum(rng.choice((0, 0, 1, 2, 3, 5, 9, 11)) << (4 * c) for c in range(16)) for _ in range(n)]
+
+
+def random_network(seed, path=None):
+    network = ntuple.NTupleNetwork.create(path, ntuple.SMALL_TUPLES) if path else ntuple.NTupleNetwork(ntuple.SMALL_TUPLES)
+    network.weights()[:] = np.random.default_rng(seed).standard_normal(network.size).astype(np.float32)
+    return network
+
+
+def test_scalar_and_batch_evaluation_agree():
+    network = random_network(1)
+    boards = random_boards(2)
+    batch_values = network.evaluate_batch(np.array(boards, dtype=np.uint64))
+    for board, batch_value in zip(boards, batch_values.tolist()):
+        assert network(board) == pytest.approx(network.value_of(network.features(board)), rel=1e-9)
+        assert network(board) == pytest.approx(batch_value, rel=1e-4, abs=1e-3)
+    network.close()
+
+
+def test_symmetries_array_matches_symmetries():
+    boards = random_boards(3, 50)
+    arrays = ntuple.symmetries_array(np.array(boards, dtype=np.uint64))
+    for i, board in enumerate(boards):
+        assert [int(a[i]) for a in arrays] == list(ntuple.symmetries(board))
+
+
+def test_weights_survive_a_file_round_trip(tmp_path):
+    path, copy = str(tmp_path / "w.ntn"), str(tmp_path / "copy.ntn")
+    network = random_network(4, path)
+    boards = random_boards(5, 20)
+    expected = [network(board) for board in boards]
+    network.save(copy)
+    network.close()
+    for name in (path, copy):
+        loaded = ntuple.NTupleNetwork.open(name)
+        assert loaded.tuples == ntuple.SMALL_TUPLES
+        assert [loaded(board) for board in boards] == expected
+        loaded.close()
+
+    with open(path, "r+b") as f:
+        f.truncate(1000)
+    with pytest.raises(ntuple.NTupleError):
+        ntuple.NTupleNetwork.open(path)
+
+
+def test_update_moves_a_value_towards_its_target():
+    network = ntuple.NTupleNetwork(ntuple.SMALL_TUPLES)
+    features = network.features(random_boards(6, 1)[0])
+    rate = 0.1 / network.feature_count
+    errors = []
+    for _ in range(5):
+        error = 100.0 - network.value_of(features)
+        errors.append(abs(error))
+        network.update(features, rate * error)
+    assert errors == sorted(errors, reverse=True) and errors[-1] < errors[0]
+    network.close()
+
+
+def test_training_changes_the_weights_and_learns_a_value():
+    network = ntuple.NTupleNetwork(ntuple.SMALL_TUPLES)
+    game = engine.Game()
+    game.new_game(11)
+    after = ntuple.best_afterstate(network, game.board)[2]
+    assert network(after) == 0.0
+    scores = ntuple.train(network, 30, seed=1, report_every=10, out=io.StringIO())
+    assert len(scores) == 30
+    assert np.count_nonzero(network.weights()) > 0
+    # Every afterstate of a game is worth what is still to come, more than nothing early on
+    assert network(after) > 0.0
+    network.close()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import persistence
+
+STATE = {
+    "high_score": 16,
+    "score": 8,
+    "last_spawned_tile": (0, 1),
+    "board": [[2, 2, 0, 0], [0, 4, 0, 0], [0, 0, 8, 0], [0, 0, 0, 16]],
+}
+
+
+@pytest.mark.parametrize("encode", [persistence.encode_json, persistence.encode_binary])
+def test_round_trip(encode):
+    assert persistence.decode(encode(STATE)) == STATE
+
+
+def test_store_round_trip(tmp_path):
+    path = str(tmp_path / "state.bin")
+    store = persistence.GameStateStore(path, binary=True, delay=0)
+    store.save(STATE)
+    store.close()
+    assert persistence.GameStateStore(path).load() == STATE
+
+
+@pytest.mark.parametrize("last_tile", [3, True, "ab", [0, True], [0, 1, 2], [0, 9]])
+def test_corrupt_file_falls_back_to_backup(tmp_path, last_tile):
+    path = tmp_path / "state.json"
+    (tmp_path / "state.json.bak").write_bytes(persistence.encode_json(STATE))
+    data = dict(STATE, last_spawned_tile=last_tile)
+    path.write_text(json.dumps(data))
+    store = persistence.GameStateStore(str(path))
+    try:
+        assert store.peek() is None
+        assert store.load() == STATE
+    finally:
+        store.close()
+
+
+def test_garbage_is_rejected():
+    assert persistence.decode(b"2048 not a record") is None
+    assert persistence.decode(b"[1, 2]") is None
+    assert persistence.decode(b"\xff\xfe") is None
+
+
+def test_binary_keeps_the_generator_state():
+    state = dict(STATE, rng_state=0x123456789ABCDEF)
+    assert persistence.decode(persistence.encode_binary(state)) == state
+
+
+def test_version_1_records_still_load():
+    import struct
+    import zlib
+
+    import engine
+
+    record = struct.pack("<4sBQQQbb", b"2048", 1, engine.pack(STATE["board"]), 8, 16, 0, 1)
+    assert persistence.decode(record + struct.pack("<I", zlib.crc32(record))) == STATE
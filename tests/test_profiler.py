@@ -0,0 +1,84 @@
+import io
+import pickle
+import pstats
+
+import pytest
+
+import profiler
+
+
+def test_histogram_percentiles_and_window():
+    histogram = profiler.RollingHistogram(window=100)
+    for value in range(1, 201):
+        histogram.add(float(value))
+    summary = histogram.summary()
+    # The percentiles come from the last 100 samples, count, mean and max from all of them
+    assert (summary["p50"], summary["p90"], summary["p99"]) == (151.0, 191.0, 200.0)
+    assert summary["count"] == 200 and summary["mean"] == pytest.approx(100.5) and summary["max"] == 200.0
+    assert sum(summary["buckets"].values()) == 100
+    assert max(summary["buckets"]) == 256.0
+    assert profiler.RollingHistogram().percentile(50) == 0.0
+
+
+def test_phases_nest_and_count_own_time():
+    prof = profiler.Profiler()
+    assert prof.phase("idle") is prof.phase("other")
+    prof.enable()
+    with prof.phase("outer"):
+        with prof.phase("inner"):
+            pass
+    prof.count("moves", 3)
+    prof.disable()
+    prof.count("moves")
+    calls, total, own = prof.phases["outer"]
+    assert calls == 1 and own <= total
+    assert prof.edges["outer", "inner"][0] == 1
+    assert prof.counters == {"moves": 3}
+
+
+def recorded(moves, samples):
+    prof = profiler.Profiler()
+    prof.enable()
+    for value in samples:
+        prof.record("engine", value / 1000.0, parent="policy")
+    prof.count("moves", moves)
+    return prof
+
+
+def test_merge_adds_a_worker_profile():
+    main, worker = recorded(2, [1.0, 2.0]), recorded(3, [4.0])
+    # Snapshots cross a process boundary, so they have to pickle
+    main.merge(pickle.loads(pickle.dumps(worker.snapshot())))
+    assert main.counters == {"moves": 5}
+    assert main.phases["engine"][0] == 3 and main.phases["engine"][1] == pytest.approx(0.007)
+    assert main.edges["policy", "engine"][0] == 3
+    histogram = main.histograms["engine"]
+    assert histogram.count == 3 and histogram.max == pytest.approx(4.0)
+    assert sorted(histogram.samples) == pytest.approx([1.0, 2.0, 4.0])
+
+
+def test_pstats_file_loads(tmp_path):
+    prof = profiler.Profiler()
+    prof.enable()
+    with prof.phase("move"):
+        with prof.phase("engine"):
+            pass
+        with prof.phase("spawn"):
+            pass
+    path = str(tmp_path / "profile.pstats")
+    prof.export_pstats(path)
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    assert stats.total_calls == 3
+    stats.sort_stats("cumulative").print_stats()
+    stats.print_callers("engine")
+    assert "move" in out.getvalue() and "engine" in out.getvalue()
+    assert set(stats.stats[profiler._FILE, 0, "engine"][4]) == {(profiler._FILE, 0, "move")}
+
+
+def test_report_rates(tmp_path):
+    prof = recorded(10, [1.0])
+    report = prof.report()
+    assert report["counters"] == {"moves": 10} and report["rates"]["moves_per_sec"] > 0
+    assert report["phases"]["engine"]["calls"] == 1
+    prof.export_json(str(tmp_path / "profile.json"))
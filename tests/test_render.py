@@ -0,0 +1,48 @@
+import engine
+import render
+import styles
+
+
+class Recorder(render.Backend):
+    def __init__(self):
+        self.calls = []
+
+    def clear(self, color):
+        self.calls.append(("clear", color))
+
+    def rect(self, key, box, fill, radius=0):
+        self.calls.append(("rect", key, fill))
+
+    def text(self, key, x, y, label, color, font_class):
+        self.calls.append(("text", key, label))
+
+    def hide(self, key):
+        self.calls.append(("hide", key))
+
+
+def test_draw_board_uses_only_primitives():
+    board = engine.pack([[2, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 4]])
+    layout = render.Layout(4, 4, 100, 10)
+    backend = Recorder()
+    render.draw_board(backend, layout, engine, board, spawned=(3, 3))
+    calls = backend.calls
+    assert calls[0] == ("clear", styles.BOARD_COLOR)
+    assert ("text", ((0, 0), "text"), "2") in calls
+    assert ("text", ((3, 3), "text"), "4") in calls
+    assert ("rect", ((3, 3), "tile"), styles.tile_style(2, True)[0]) in calls
+    assert sum(1 for call in calls if call[0] == "rect" and call[1][1] == "slot") == 14
+
+
+def test_draw_board_only_given_cells():
+    layout = render.Layout(4, 4, 100, 10)
+    backend = Recorder()
+    render.draw_board(backend, layout, engine, 0, cells=[(1, 2)])
+    assert {call[1][0] for call in backend.calls} == {(1, 2)}
+
+
+def test_svg_and_raster_draw_every_cell():
+    board = engine.pack([[2, 4, 8, 16], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 2048]])
+    svg = render.SVGBackend().draw(board)
+    assert svg.count("<text") == 5 and ">2048</text>" in svg
+    raster = render.RasterBackend(cell_size=40, padding=4)
+    assert len(raster.ppm(board)) == len(raster.ppm(0))
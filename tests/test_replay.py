@@ -0,0 +1,98 @@
+import os
+import random
+
+import pytest
+
+import engine
+import replay
+
+
+# --- A recorded seeded game, the state after every move ---
+def play(path, seed=7, moves=120, keyframe_interval=16):
+    writer = replay.ReplayWriter(path, keyframe_interval=keyframe_interval)
+    game = engine.Game(recorder=writer)
+    game.new_game(seed)
+    choose = random.Random(seed)
+    states = {}
+    while len(states) < moves and not game.over():
+        if game.move(choose.choice(engine.DIRECTIONS)) is None:
+            continue
+        game.spawn()
+        states[len(states) + 1] = (game.board, game.score)
+    writer.close()
+    return states
+
+
+def test_verify_accepts_a_recorded_game(tmp_path):
+    path = str(tmp_path / "game.log")
+    states = play(path)
+    assert replay.verify(path) == {"ok": True, "games": 1, "moves": len(states), "errors": []}
+
+
+def test_verify_catches_a_changed_spawn(tmp_path):
+    path = str(tmp_path / "game.log")
+    play(path)
+    reader = replay.ReplayReader(path)
+    offset = [pos for pos, kind, _ in reader.records() if kind == replay.SPAWN][5]
+    reader.close()
+    with open(path, "r+b") as f:
+        f.seek(offset + 3)
+        cell = f.read(1)[0]
+        f.seek(offset + 3)
+        f.write(bytes([(cell + 1) % 16]))
+    result = replay.verify(path)
+    assert not result["ok"] and result["errors"]
+
+
+@pytest.mark.parametrize("rebuild", [False, True])
+def test_seek_matches_the_game(tmp_path, rebuild):
+    path = str(tmp_path / "game.log")
+    states = play(path)
+    if rebuild:
+        os.remove(path + ".idx")
+    reader = replay.ReplayReader(path)
+    try:
+        assert reader.keyframe_count() == (len(states) + 15) // 16
+        for move in (1, 15, 16, 17, 64, len(states)):
+            state = reader.seek(move)
+            assert (state["board"], state["score"]) == states[move]
+        with pytest.raises(replay.ReplayError):
+            reader.seek(len(states) + 1)
+    finally:
+        reader.close()
+
+
+def test_writer_cuts_a_torn_record_and_carries_on(tmp_path):
+    path = str(tmp_path / "game.log")
+    states = play(path, moves=20)
+    with open(path, "ab") as f:
+        f.write(b"\x12\x00\x02")
+    writer = replay.ReplayWriter(path, keyframe_interval=16)
+    assert (writer.moves, writer.board, writer.score) == (20, *states[20])
+    writer.close()
+    assert replay.verify(path)["ok"]
+
+
+def test_writer_drops_keyframes_past_a_truncated_log(tmp_path):
+    path = str(tmp_path / "game.log")
+    states = play(path, moves=40)
+    reader = replay.ReplayReader(path)
+    # Cut the log in the middle of the keyframe record of move 32
+    cut = reader.keyframe(2)[1] + 5
+    reader.close()
+    with open(path, "r+b") as f:
+        f.truncate(cut)
+    assert os.path.getsize(path + ".idx") == 3 * replay._INDEX.size
+
+    writer = replay.ReplayWriter(path, keyframe_interval=16)
+    assert (writer.moves, writer.board, writer.score) == (32, *states[32])
+    writer.close()
+    assert os.path.getsize(path + ".idx") == 2 * replay._INDEX.size
+    reader = replay.ReplayReader(path)
+    try:
+        assert (reader.seek(31)["board"], reader.seek(31)["score"]) == states[31]
+        with pytest.raises(replay.ReplayError):
+            reader.seek(33)
+    finally:
+        reader.close()
+    assert replay.verify(path)["ok"]
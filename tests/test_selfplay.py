@@ -0,0 +1,25 @@
+import pytest
+
+import selfplay
+
+
+def outcomes(results):
+    return sorted((r["seed"], r["score"], r["max_tile"], r["moves"]) for r in results)
+
+
+@pytest.mark.parametrize("policy", ["random", "greedy"])
+def test_seeded_runs_match_at_any_worker_and_chunk_count(policy):
+    seeds = range(100, 108)
+    expected = outcomes(selfplay.run_tournament(seeds, policy, workers=1, chunk_size=8))
+    assert len(expected) == 8
+    assert outcomes(selfplay.run_tournament(seeds, policy, workers=1, chunk_size=1)) == expected
+    assert outcomes(selfplay.run_tournament(seeds, policy, workers=2, chunk_size=3)) == expected
+
+
+def test_summary_of_a_run():
+    results = list(selfplay.run_tournament(range(4), "greedy", workers=1))
+    summary = selfplay.summarize(results)
+    assert summary["games"] == 4
+    assert summary["moves"] == sum(r["moves"] for r in results)
+    assert summary["best_score"] == max(r["score"] for r in results)
+    assert sum(summary["max_tile_counts"].values()) == 4
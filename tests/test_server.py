@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+def dispatch(game_server, request):
+    line = request if isinstance(request, bytes) else json.dumps(request).encode()
+    return asyncio.run(game_server.dispatch(line))
+
+
+@pytest.fixture
+def game_server(tmp_path):
+    return server.GameServer(str(tmp_path))
+
+
+@pytest.mark.parametrize("line", [
+    b"not json",
+    b"[1, 2]",
+    b'{"op": 5}',
+    b'{"op": "nope"}',
+    b'{"op": "move"}',
+    b'{"op": "move", "session": "../x", "direction": "Left"}',
+    b'{"op": "move", "session": ["a"], "direction": "Left"}',
+    b'{"op": "new", "seed": 1e999}',
+    b'{"op": "new", "seed": "5"}',
+    b'{"op": "hint", "session": "abc", "depth": 1e999}',
+    b'{"op": "hint", "session": "abc", "depth": true}',
+])
+def test_malformed_requests_get_an_error_reply(game_server, line):
+    reply = dispatch(game_server, line)
+    assert reply["ok"] is False and reply["error"]
+    assert game_server.errors == 1
+
+
+def test_new_and_move(game_server):
+    reply = dispatch(game_server, {"op": "new", "seed": 5, "id": 1})
+    assert reply["ok"] and reply["id"] == 1
+    token = reply["session"]
+    reply = dispatch(game_server, {"op": "move", "session": token, "direction": "Left", "grid": True})
+    assert reply["ok"] and len(reply["grid"]) == 4
+    assert dispatch(game_server, {"op": "move", "session": token, "direction": "Sideways"})["ok"] is False
+
+
+def test_reloaded_session_spawns_the_same_tiles(tmp_path):
+    moves = ["Left", "Up", "Right", "Down"] * 5
+
+    def play(close_after):
+        game_server = server.GameServer(str(tmp_path))
+        token = dispatch(game_server, {"op": "new", "seed": 7})["session"]
+        boards = []
+        for i, direction in enumerate(moves):
+            if i == close_after:
+                dispatch(game_server, {"op": "close", "session": token})
+                game_server = server.GameServer(str(tmp_path))
+            boards.append(dispatch(game_server, {"op": "move", "session": token, "direction": direction})["board"])
+        return boards
+
+    assert play(close_after=None) == play(close_after=6)
+
+
+def test_window_session_file_is_the_server_file(tmp_path):
+    import persistence
+
+    game_server = server.GameServer(str(tmp_path))
+    reply = dispatch(game_server, {"op": "new", "seed": 3, "grid": True})
+    dispatch(game_server, {"op": "close", "session": reply["session"]})
+    path = persistence.session_path(reply["session"], str(tmp_path), binary=True)
+    store = persistence.GameStateStore(path, binary=True)
+    try:
+        state = store.load()
+    finally:
+        store.close()
+    assert state["board"] == reply["grid"] and state["rng_state"]
+
+
+def test_move_during_close_is_not_lost(tmp_path):
+    game_server = server.GameServer(str(tmp_path))
+
+    async def run():
+        token = (await game_server.dispatch(b'{"op": "new", "seed": 11}'))["session"]
+        close = json.dumps({"op": "close", "session": token}).encode()
+        move = json.dumps({"op": "move", "session": token, "direction": "Left"}).encode()
+        moves = [json.dumps({"op": "move", "session": token, "direction": d}).encode() for d in ("Up", "Down")]
+        closed, *replies = await asyncio.gather(game_server.dispatch(close), game_server.dispatch(move),
+                                                *(game_server.dispatch(m) for m in moves))
+        state = await game_server.dispatch(json.dumps({"op": "state", "session": token}).encode())
+        return closed, replies, state
+
+    closed, replies, state = asyncio.run(run())
+    assert closed["ok"] and all(reply["ok"] for reply in replies)
+    assert state["board"] == replies[-1]["board"]
@@ -0,0 +1,83 @@
+import os
+
+import engine
+import statsdb
+
+
+def board(*tiles):
+    return engine.pack([list(tiles), [0] * 4, [0] * 4, [0] * 4])
+
+
+def write(path, positions, score):
+    writer = statsdb.StatsWriter(path)
+    writer.add_game(positions, score)
+    writer.close()
+
+
+def test_merge_never_replaces_a_mapped_shard(tmp_path, monkeypatch):
+    path = str(tmp_path / "stats")
+    first = board(2, 4, 0, 0)
+    write(path, [(first, "Left")], 100)
+    assert statsdb.merge(path) == 1
+
+    reader = statsdb.StatsDB(path)
+    assert reader.lookup(first)["visits"] == 1
+
+    # Only the manifest may be replaced, Windows refuses it for a mapped file
+    write(path, [(first, "Left"), (board(8, 0, 0, 2), "Up")], 300)
+    replaced = []
+    real_replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: (replaced.append(os.path.basename(dst)), real_replace(src, dst)))
+    assert statsdb.merge(path) >= 1
+    assert replaced == [statsdb.META_FILE]
+
+    # The reader keeps its mapping until it refreshes
+    assert reader.lookup(first)["visits"] == 1
+    reader.refresh()
+    stats = reader.lookup(first)
+    assert stats["visits"] == 2 and stats["moves"]["Left"] == (2, 200.0)
+    assert reader.lookup(board(8, 0, 0, 2))["visits"] == 1
+    reader.close()
+
+    # Shard files of old generations are gone once no reader maps them
+    statsdb.merge(path)
+    shards = [name for name in os.listdir(path) if name.endswith(".sts")]
+    assert len(shards) == len(set(name[:9] for name in shards))
+
+
+def test_records_written_during_a_merge_are_kept(tmp_path, monkeypatch):
+    path = str(tmp_path / "stats")
+    # Both in the same shard, so the late records land in a run the merge has read
+    first, second = board(2, 4, 0, 0), board(8, 8, 2, 0)
+    assert statsdb.shard_of(statsdb.canonical(first)[0], 16) == statsdb.shard_of(statsdb.canonical(second)[0], 16)
+    write(path, [(first, "Left")], 100)
+    late = statsdb.StatsWriter(path)
+    late.add(first, "Right", 10)
+    late.flush()
+    late.add(second, "Left", 50)
+
+    # The writer flushes while the merge is writing its shards, after the runs were read
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (late.flush(), real_fsync(fd)))
+    statsdb.merge(path)
+    monkeypatch.setattr(os, "fsync", real_fsync)
+    late.add(first, "Up", 300)
+    late.close()
+    statsdb.merge(path)
+
+    reader = statsdb.StatsDB(path)
+    assert reader.lookup(second)["visits"] == 1
+    assert reader.lookup(first)["visits"] == 3
+    reader.close()
+
+
+def test_merge_keeps_a_torn_record(tmp_path):
+    path = str(tmp_path / "stats")
+    write(path, [(board(2, 4, 0, 0), "Left")], 100)
+    run = [name for name in os.listdir(path) if ".run-" in name][0]
+    with open(os.path.join(path, run), "ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert statsdb.merge(path) == 1
+    with open(os.path.join(path, run + ".torn"), "rb") as f:
+        assert f.read() == b"\x01\x02\x03"
+    assert statsdb.merge(path) == 0